@@ -0,0 +1,255 @@
+"""
+Time the operations on synthetic addons of several sizes and store the results as JSON.
+
+    python -m benchmarks.run_benchmarks --scales 1,4 --output before.json
+    python -m benchmarks.run_benchmarks --scales 1,4 --output after.json --compare before.json
+
+Every operation runs in a fresh process on a fresh copy of the addon, so peak memory is per
+operation. Generated addons are cached, the generator is deterministic. No network or game
+install is needed, operations that need ffmpeg are reported as failed when it's missing.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from multiprocessing import get_context
+
+from utils.cache import get_cache_dir
+
+# Bump when the generated addon changes, so cached addons get generated again
+GENERATOR_VERSION = 1
+DEFAULT_SCALES = (1, 4)
+MB = 1024 * 1024
+
+
+def bench_clamp_vtf(folder, workdir):
+    from material_compression.resize_and_compress import resize_and_compress
+    return resize_and_compress(folder, 512)
+
+
+def bench_dxt(folder, workdir):
+    from material_compression.resize_and_compress import resize_and_compress
+    return resize_and_compress(folder, 1_000_000)
+
+
+def bench_remove_mipmaps(folder, workdir):
+    from material_compression.remove_mipmaps import remove_mipmaps
+    return remove_mipmaps(folder)
+
+
+def bench_clamp_png(folder, workdir):
+    from material_compression.resize_png import clamp_pngs
+    return clamp_pngs(folder, 256)
+
+
+def bench_wav_to_ogg(folder, workdir):
+    from sound_compression.wav_to_ogg import wav_to_ogg
+    return wav_to_ogg(folder)
+
+
+def bench_trim_audio(folder, workdir):
+    from sound_compression.trim_empty import trim_empty_audio
+    return trim_empty_audio(folder)
+
+
+def bench_unused_model_formats(folder, workdir):
+    from unused_files.modelformats import unused_model_formats
+    return unused_model_formats(folder, True)
+
+
+def bench_export_fastdl(folder, workdir):
+    from fastdl.export_fastdl import export_fastdl
+    return export_fastdl(folder, os.path.join(workdir, "fastdl"))
+
+
+def bench_pipeline(folder, workdir):
+    from pipeline.optimize_all import load_preset, run_pipeline
+    return run_pipeline(folder, load_preset("Textures only"))
+
+
+BENCHMARKS = {
+    "clamp_vtf": bench_clamp_vtf,
+    "dxt": bench_dxt,
+    "remove_mipmaps": bench_remove_mipmaps,
+    "clamp_png": bench_clamp_png,
+    "wav_to_ogg": bench_wav_to_ogg,
+    "trim_audio": bench_trim_audio,
+    "unused_model_formats": bench_unused_model_formats,
+    "export_fastdl": bench_export_fastdl,
+    "pipeline_textures": bench_pipeline,
+}
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process, None where it can't be measured."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / MB, 1)
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / MB if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _run_benchmark(name, template, verbose=False):
+    """Runs in a fresh worker process: copy the addon, run one operation and measure it."""
+    from utils import events, manifest, output_cache
+    from utils.events import EventBuffer, EventStats
+
+    # Every run has to do the full work: no cached outputs from earlier runs, nothing
+    # written to the user's cache and no files skipped as processed before
+    output_cache.set_max_size(0)
+    manifest.set_enabled(False)
+
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    folder = os.path.join(workdir, "addon")
+    shutil.copytree(template, folder)
+    buffer = EventBuffer()
+    error = None
+    result = None
+    try:
+        with open(os.devnull, "w") as devnull, events.capture(buffer):
+            with redirect_stdout(sys.stdout if verbose else devnull), redirect_stderr(sys.stderr if verbose else devnull):
+                start = time.perf_counter()
+                try:
+                    result = BENCHMARKS[name](folder, workdir)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = EventStats()
+    stats.add(buffer.drain())
+    return {
+        "operation": name,
+        "seconds": round(seconds, 4),
+        "files": stats.files,
+        "failed_files": stats.failed,
+        "mb": round(stats.bytes_before / MB, 3),
+        "files_per_second": round(stats.files / seconds, 2) if seconds else None,
+        "mb_per_second": round(stats.bytes_before / MB / seconds, 3) if seconds else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "result": list(result) if isinstance(result, tuple) else None,
+        "error": error,
+    }
+
+
+def prepare_addon(scale: int, seed: int, regenerate: bool = False) -> str:
+    """Generated addon for a scale, cached between runs."""
+    folder = get_cache_dir("benchmarks", f"v{GENERATOR_VERSION}-scale{scale}-seed{seed}")
+    marker = os.path.join(folder, ".complete")
+    if os.path.exists(marker) and not regenerate:
+        return folder
+    from benchmarks.synthetic_addon import generate_addon
+
+    shutil.rmtree(folder, ignore_errors=True)
+    print(f"Generating scale {scale} addon...")
+    start = time.time()
+    # In a worker too: on Linux the peak memory of a process carries over into the workers it starts
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        written = executor.submit(generate_addon, folder, scale, seed).result()
+    print(f"  {', '.join(f'{count} {kind}' for kind, count in written.items())} in {round(time.time() - start, 1)} seconds")
+    open(marker, "w").close()
+    return folder
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(operations, scales, repeat=1, seed=0, regenerate=False, verbose=False) -> dict:
+    results = []
+    for scale in scales:
+        template = prepare_addon(scale, seed, regenerate)
+        for name in operations:
+            runs = []
+            for _ in range(repeat):
+                # A worker per run keeps peak memory and imports from leaking between operations
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    runs.append(executor.submit(_run_benchmark, name, template, verbose).result())
+            best = min(runs, key=lambda run: run["seconds"])
+            best["scale"] = scale
+            best["runs"] = [run["seconds"] for run in runs]
+            results.append(best)
+            if best["error"]:
+                print(f"  {name:<22} scale {scale:<3} failed: {best['error']}")
+            else:
+                print(f"  {name:<22} scale {scale:<3} {best['seconds']:8.3f}s  {best['files_per_second']:8.1f} files/s  "
+                      f"{best['mb_per_second']:8.2f} MB/s  peak {best['peak_rss_mb']} MB")
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "generator_version": GENERATOR_VERSION,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict):
+    """Print the change in throughput per operation and scale, positive is faster."""
+    old_results = {(result["operation"], result["scale"]): result for result in old["results"]}
+    print("="*60)
+    print(f"Compared to {old['meta'].get('commit')} ({old['meta'].get('time')}):")
+    for result in new["results"]:
+        previous = old_results.get((result["operation"], result["scale"]))
+        if previous is None or result["error"] or previous["error"]:
+            continue
+        change = (previous["seconds"] / result["seconds"] - 1) * 100 if result["seconds"] else 0
+        print(f"  {result['operation']:<22} scale {result['scale']:<3} {previous['seconds']:8.3f}s → "
+              f"{result['seconds']:8.3f}s  ({change:+.1f}% throughput)")
+    print("="*60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the operations on synthetic addons.")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="Comma separated addon scales")
+    parser.add_argument("--operations", default=",".join(BENCHMARKS), help="Comma separated operations: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per operation, the fastest one is kept")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated addons")
+    parser.add_argument("--regenerate", action="store_true", help="Generate the addons again instead of using the cached ones")
+    parser.add_argument("--output", default=f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json", help="Where to write the results")
+    parser.add_argument("--compare", metavar="JSON", help="Earlier results to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the operations")
+    args = parser.parse_args(argv)
+
+    operations = [name.strip() for name in args.operations.split(",") if name.strip()]
+    unknown = [name for name in operations if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown operations: {', '.join(unknown)}")
+    scales = [int(scale) for scale in args.scales.split(",")]
+
+    report = run_benchmarks(operations, scales, args.repeat, args.seed, args.regenerate, args.verbose)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 1 if any(result["error"] for result in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import math
+import os
+import random
+import struct
+import wave
+
+from PIL import Image
+from sourcepp import vtfpp
+
+# Files generated at scale 1, every count is multiplied by the scale
+BASE_COUNTS = {
+    "vtf": 24,
+    "png": 12,
+    "wav": 12,
+    "model": 8,
+    "lua": 8,
+}
+
+VTF_SIZES = (64, 128, 256, 512, 1024, 2048)
+VTF_FORMATS = (vtfpp.ImageFormat.RGBA8888, vtfpp.ImageFormat.BGR888, vtfpp.ImageFormat.DXT1, vtfpp.ImageFormat.DXT5)
+MODEL_SUFFIXES = (".mdl", ".vvd", ".phy", ".dx90.vtx", ".dx80.vtx", ".sw.vtx", ".xbox.vtx")
+SAMPLE_RATE = 22050
+
+
+def _image(rng: random.Random, width: int, height: int, alpha: bool) -> Image.Image:
+    """Smooth gradients with a bit of noise, compresses like a real texture rather than pure noise."""
+    tile = Image.frombytes("RGB", (16, 16), rng.randbytes(16 * 16 * 3))
+    image = tile.resize((width, height), resample=Image.Resampling.BICUBIC).convert("RGBA")
+    if alpha:
+        mask = Image.linear_gradient("L").resize((width, height))
+        image.putalpha(mask)
+    return image
+
+
+def _write_vtf(path: str, rng: random.Random, size: int, image_format, mips: bool):
+    image = _image(rng, size, size, alpha=image_format in (vtfpp.ImageFormat.RGBA8888, vtfpp.ImageFormat.DXT5))
+    options = vtfpp.VTF.CreationOptions()
+    options.output_format = image_format
+    options.compute_mips = mips
+    vtf = vtfpp.VTF.create(image.tobytes(), vtfpp.ImageFormat.RGBA8888, size, size, options)
+    vtf.bake_to_file(path)
+
+
+def _chunk(chunk_id: bytes, data: bytes) -> bytes:
+    return chunk_id + struct.pack("<I", len(data)) + data + (b"\0" if len(data) % 2 else b"")
+
+
+def _write_wav(path: str, rng: random.Random, seconds: float, silence: float, kind: str):
+    """A tone followed by trailing silence. kind "loop" adds a smpl loop and "cue" a cue point, both are skipped by the converters."""
+    frequency = rng.choice((220, 330, 440, 660))
+    frames = bytearray()
+    for i in range(int(SAMPLE_RATE * seconds)):
+        frames += struct.pack("<h", int(12000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE)))
+    frames += bytes(2 * int(SAMPLE_RATE * silence))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(bytes(frames))
+
+    extra = b""
+    if kind == "loop":
+        # smpl header (9 fields) with one loop over the tone
+        extra = _chunk(b"smpl", struct.pack("<9I", 0, 0, 0, 60, 0, 0, 0, 1, 0)
+                       + struct.pack("<6I", 0, 0, 0, int(SAMPLE_RATE * seconds) - 1, 0, 0))
+    elif kind == "cue":
+        extra = _chunk(b"cue ", struct.pack("<I", 1) + struct.pack("<II4sIII", 1, 0, b"data", 0, 0, 0))
+    if extra:
+        with open(path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            f.write(extra)
+            riff_size = f.tell() - 8
+            f.seek(4)
+            f.write(struct.pack("<I", riff_size))
+
+
+def generate_addon(folder: str, scale: int = 1, seed: int = 0) -> dict:
+    """
+    Write a synthetic addon for benchmarks. The same scale and seed always give the same files.
+
+    Contains VTFs of assorted sizes and formats (with and without mipmaps) and their VMTs,
+    PNGs, WAVs with trailing silence (some looped or with cue points), stub model file sets
+    including the formats Garry's Mod doesn't load, and lua files referencing the assets.
+
+    Returns:
+        Number of files written per kind
+    """
+    rng = random.Random(seed)
+    counts = {kind: count * scale for kind, count in BASE_COUNTS.items()}
+    written = {}
+
+    materials = os.path.join(folder, "materials", "bench")
+    os.makedirs(materials, exist_ok=True)
+    textures = []
+    for i in range(counts["vtf"]):
+        name = f"tex_{i:04d}"
+        _write_vtf(os.path.join(materials, name + ".vtf"), rng, rng.choice(VTF_SIZES), rng.choice(VTF_FORMATS),
+                   mips=rng.random() < 0.5)
+        with open(os.path.join(materials, name + ".vmt"), "w", encoding="utf-8") as f:
+            f.write(f'"VertexLitGeneric"\n{{\n\t"$basetexture" "bench/{name}"\n}}\n')
+        textures.append(f"bench/{name}")
+    written["vtf"] = written["vmt"] = counts["vtf"]
+
+    images = os.path.join(folder, "materials", "bench", "ui")
+    os.makedirs(images, exist_ok=True)
+    for i in range(counts["png"]):
+        size = rng.choice(VTF_SIZES)
+        _image(rng, size, size, alpha=rng.random() < 0.5).save(os.path.join(images, f"icon_{i:04d}.png"))
+    written["png"] = counts["png"]
+
+    sounds_folder = os.path.join(folder, "sound", "bench")
+    os.makedirs(sounds_folder, exist_ok=True)
+    sounds = []
+    for i in range(counts["wav"]):
+        name = f"snd_{i:04d}.wav"
+        kind = rng.choice(("plain", "plain", "plain", "plain", "loop", "cue"))
+        _write_wav(os.path.join(sounds_folder, name), rng, rng.uniform(0.2, 1.5), rng.uniform(0.0, 1.0), kind)
+        sounds.append(f"bench/{name}")
+    written["wav"] = counts["wav"]
+
+    models = os.path.join(folder, "models", "bench")
+    os.makedirs(models, exist_ok=True)
+    model_paths = []
+    for i in range(counts["model"]):
+        name = f"model_{i:04d}"
+        for suffix in MODEL_SUFFIXES:
+            with open(os.path.join(models, name + suffix), "wb") as f:
+                # Stub files: the header ids of the real formats followed by filler
+                header = {".mdl": b"IDST", ".vvd": b"IDSV", ".phy": b"\x10\0\0\0"}.get(suffix, b"\x07\0\0\0")
+                f.write(header + rng.randbytes(rng.randint(2_000, 60_000)))
+        model_paths.append(f"models/bench/{name}.mdl")
+    written["model files"] = counts["model"] * len(MODEL_SUFFIXES)
+
+    lua = os.path.join(folder, "lua", "autorun")
+    os.makedirs(lua, exist_ok=True)
+    for i in range(counts["lua"]):
+        with open(os.path.join(lua, f"bench_{i:04d}.lua"), "w", encoding="utf-8") as f:
+            f.write(f"-- generated benchmark file {i}\n")
+            for sound in rng.sample(sounds, min(3, len(sounds))):
+                f.write(f'sound.Add({{ name = "bench.{i}", sound = "{sound}" }})\n')
+            for model in rng.sample(model_paths, min(2, len(model_paths))):
+                f.write(f'util.PrecacheModel("{model}")\n')
+            for texture in rng.sample(textures, min(2, len(textures))):
+                f.write(f'local mat = Material("{texture}")\n')
+    written["lua"] = counts["lua"]
+    return written
@@ -0,0 +1,471 @@
+"""
+Command line interface, for build pipelines and servers without a display. Doesn't import Qt.
+
+    python cli.py clamp-vtf path/to/addon --size 1024
+    python cli.py pipeline path/to/addon --preset Standard --game "C:/.../GarrysMod" --report report.json
+
+Folders can also be .gma files, they are extracted and packed back if anything changed.
+
+Exit codes: 0 done, 1 the operation failed, 2 invalid arguments, 3 done but some files failed,
+130 cancelled (Ctrl+C once cancels after the current file, twice aborts).
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import ExitStack, redirect_stdout
+
+from utils import events
+from utils import manifest, output_cache, tracing
+from utils.cancel import CancelToken, Cancelled
+from utils.compressed_size import CompressedSizer
+from utils.events import JsonLinesWriter, StatsSink
+from utils.formatting import format_size
+from utils.gma import run_on_gma
+from utils.mounts import MountSet
+from utils.tracing import Tracer
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_FILES_FAILED = 3
+EXIT_CANCELLED = 130
+
+
+def _mounts(args, folder=None):
+    if not args.game:
+        return None
+    return MountSet.from_gamefolder(args.game, legacy_addons=args.legacy_addons, exclude=folder)
+
+
+def _list_files(folder, extensions):
+    """Dry run for operations without a report mode: show the files they would process."""
+    from pipeline.optimize_all import FileIndex
+
+    files = FileIndex(folder).files(extensions)
+    total_size = 0
+    for path in files:
+        size = os.path.getsize(path)
+        total_size += size
+        print(f"Would process: {path} ({format_size(size)})")
+    print(f"{len(files)} files, {format_size(total_size)}")
+    return total_size, len(files)
+
+
+def _list_maps(map_files):
+    map_files = [map_file for map_file in map_files if map_file.lower().endswith(".bsp") and os.path.exists(map_file)]
+    total_size = 0
+    for map_file in map_files:
+        size = os.path.getsize(map_file)
+        total_size += size
+        print(f"Would process: {map_file} ({format_size(size)})")
+    return total_size, len(map_files)
+
+
+# ------------- Commands -------------
+# Folder commands get (args, folder, cancel_token), the folder is a .gma workspace for .gma inputs
+
+def cmd_unused_model_formats(args, folder, cancel_token):
+    from unused_files.modelformats import unused_model_formats
+    return unused_model_formats(folder, args.remove, cancel_token=cancel_token)
+
+
+def cmd_unused_content(args, folder, cancel_token):
+    from unused_files.content import unused_content
+    return unused_content(folder, args.remove, cancel_token=cancel_token)
+
+
+def cmd_remove_game_files(args, folder, cancel_token):
+    from unused_files.remove_game_files import remove_game_files
+    return remove_game_files(folder, _mounts(args, folder), args.remove, max_workers=args.workers,
+                             cancel_token=cancel_token)
+
+
+def cmd_duplicates(args, folder, cancel_token):
+    from unused_files.duplicates import duplicate_content
+    return duplicate_content(folder, args.remove, max_workers=args.workers, cancel_token=cancel_token)
+
+
+def cmd_shadowed(args, folder, cancel_token):
+    from unused_files.shadowed import shadowed_files
+    return shadowed_files(folder, args.remove, cancel_token=cancel_token)
+
+
+def cmd_clamp_vtf(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".vtf",))
+    from material_compression.resize_and_compress import resize_and_compress
+    return resize_and_compress(folder, args.size, cancel_token=cancel_token)
+
+
+def cmd_dxt(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".vtf",))
+    from material_compression.resize_and_compress import resize_and_compress
+    # A very large clamp only converts the format, like the GUI
+    return resize_and_compress(folder, 1_000_000, cancel_token=cancel_token)
+
+
+def cmd_remove_mipmaps(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".vtf",))
+    from material_compression.remove_mipmaps import remove_mipmaps
+    return remove_mipmaps(folder, cancel_token=cancel_token)
+
+
+def cmd_clamp_png(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".png",))
+    from material_compression.resize_png import clamp_pngs
+    return clamp_pngs(folder, args.size, cancel_token=cancel_token)
+
+
+def cmd_wav_to_ogg(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".wav",))
+    from sound_compression.wav_to_ogg import wav_to_ogg
+    return wav_to_ogg(folder, cancel_token=cancel_token)
+
+
+def cmd_wav_to_mp3(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".wav",))
+    from sound_compression.wav_to_mp3 import wav_to_mp3
+    return wav_to_mp3(folder, cancel_token=cancel_token)
+
+
+def cmd_mp3_to_ogg(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".mp3",))
+    from sound_compression.mp3_to_ogg import mp3_to_ogg
+    return mp3_to_ogg(folder, cancel_token=cancel_token)
+
+
+def cmd_trim_audio(args, folder, cancel_token):
+    if args.dry_run:
+        return _list_files(folder, (".wav", ".mp3", ".ogg"))
+    from sound_compression.trim_empty import trim_empty_audio
+    return trim_empty_audio(folder, args.silence_thresh, cancel_token=cancel_token)
+
+
+def cmd_export_fastdl(args, folder, cancel_token):
+    from fastdl.export_fastdl import export_fastdl
+    return export_fastdl(folder, args.output, max_workers=args.workers, cancel_token=cancel_token)
+
+
+def cmd_pipeline(args, folder, cancel_token):
+    from pipeline.optimize_all import needs_mounts, run_pipeline
+    recipe = args.recipe_steps
+    mounts = _mounts(args, folder) if needs_mounts(recipe) and not args.dry_run else None
+    return run_pipeline(folder, recipe, mounts, cancel_token=cancel_token, dry_run=args.dry_run)
+
+
+def cmd_watch(args, folder, cancel_token):
+    from pipeline.watch import watch_folder
+    return watch_folder(folder, args.recipe_steps, args.debounce, cancel_token=cancel_token)
+
+
+# Map commands get (args, cancel_token)
+
+def cmd_find_map_content(args, cancel_token):
+    if args.dry_run:
+        return _list_maps(args.maps)
+    from mapping.find_map_content import find_maps_content
+    return find_maps_content(args.content, MountSet.from_gamefolder(args.game), args.output, args.maps,
+                             hardlinks=args.hardlinks, max_workers=args.workers, cancel_token=cancel_token)
+
+
+def cmd_optimize_pakfile(args, cancel_token):
+    if args.dry_run:
+        return _list_maps(args.maps)
+    from mapping.optimize_pakfile import optimize_pakfile
+    mounts = _mounts(args)
+    saved = 0
+    changed = 0
+    for map_file in args.maps:
+        map_saved, map_changed = optimize_pakfile(map_file, mounts, args.size, args.trim_sounds,
+                                                  cancel_token=cancel_token)
+        saved += map_saved
+        changed += map_changed
+    return saved, changed
+
+
+def cmd_compress_lumps(args, cancel_token):
+    if args.dry_run:
+        return _list_maps(args.maps)
+    from mapping.compress_lumps import compress_bsp_lumps
+    return compress_bsp_lumps(args.maps, args.decompress, args.compress_pakfile, max_workers=args.workers,
+                              cancel_token=cancel_token)
+
+
+def cmd_presets(args, cancel_token):
+    from pipeline.optimize_all import STAGES, list_presets, load_preset
+    for name in list_presets():
+        steps = ", ".join(step["stage"] + "".join(f" {key}={value}" for key, value in step.items() if key != "stage")
+                          for step in load_preset(name))
+        print(f"{name}: {steps}")
+    print("Stages: " + ", ".join(name + "".join(f" [{option}={kind.__name__}]" for option, kind in (stage.options or {}).items())
+                                 for name, stage in STAGES.items()))
+    return 0, 0
+
+
+def _load_recipe(args, parser):
+    """Resolve --stages, --recipe or --preset into recipe steps, optionally saving them as a preset."""
+    from pipeline.optimize_all import load_preset, normalize_recipe, save_preset
+    try:
+        if args.stages:
+            steps = normalize_recipe([name.strip() for name in args.stages.split(",") if name.strip()])
+        elif args.recipe:
+            with open(args.recipe, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            steps = normalize_recipe(data["stages"] if isinstance(data, dict) else data)
+        else:
+            steps = load_preset(args.preset)
+        if args.save_preset:
+            print(f"Saved preset to {save_preset(args.save_preset, steps)}", file=sys.stderr)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+    if args.size is not None:
+        for step in steps:
+            if step["stage"] == "textures":
+                step["size"] = args.size
+    return steps
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Optimize Garry's Mod addons and maps without the GUI.")
+    parser.add_argument("--report", metavar="PATH", help="Write a JSON report to PATH, - for stdout (output then goes to stderr)")
+    parser.add_argument("--events", metavar="PATH", help="Write every per-file event as JSON lines to PATH")
+    parser.add_argument("--force", action="store_true",
+                        help="Process every file again, also the ones an earlier run already optimized with the same settings")
+    parser.add_argument("--output-cache-mb", type=int, default=None,
+                        help="Size cap of the cache of optimized outputs shared between addons, 0 turns it off (default 2048)")
+    parser.add_argument("--compressed-sizes", action="store_true",
+                        help="Also measure the compressed (download) size of every processed file before and after, "
+                             "for the report (compresses files that aren't cached yet)")
+    parser.add_argument("--trace", metavar="PATH", help="Time the hot paths, print a summary and write a Chrome trace to PATH")
+    parser.add_argument("--trace-memory", action="store_true", help="Also record tracemalloc peaks per stage (slower)")
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    def add_workers(sub):
+        sub.add_argument("--workers", type=int, default=None, help="Number of worker threads/processes (default: one per CPU)")
+        return sub
+
+    def add_folder_command(name, handler, help_text, folder_help="Addon folder or .gma", removes=False):
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.add_argument("folder", help=folder_help)
+        if removes:
+            # Like the GUI asking first, files are only removed when asked to
+            sub.add_argument("--remove", action="store_true", help="Remove the found files, without it they're only reported")
+        else:
+            sub.add_argument("--dry-run", action="store_true", help="Only report what would be changed")
+        sub.set_defaults(handler=handler, takes_folder=True)
+        return sub
+
+    def add_map_command(name, handler, help_text):
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.add_argument("--dry-run", action="store_true", help="Only report what would be changed")
+        sub.set_defaults(handler=handler, takes_folder=False)
+        return sub
+
+    def add_game(sub, required=False):
+        sub.add_argument("--game", required=required, help="Game folder (containing gmod.exe)")
+        sub.add_argument("--legacy-addons", action="store_true", help="Also count legacy addons of the game as mounted content")
+
+    add_folder_command("unused-model-formats", cmd_unused_model_formats, "Find (--remove: remove) model formats Garry's Mod never loads",
+                       removes=True)
+    add_folder_command("unused-content", cmd_unused_content,
+                       "Find (--remove: remove) content that isn't referenced anywhere (WIP, can find used files)", removes=True)
+    add_game(add_workers(add_folder_command("remove-game-files", cmd_remove_game_files,
+                                            "Find (--remove: remove) files the game already provides", removes=True)), required=True)
+    add_workers(add_folder_command("duplicates", cmd_duplicates, "Find (--remove: remove) identical copies shadowed across addons",
+                                   folder_help="garrysmod/addons folder", removes=True))
+    add_folder_command("shadowed", cmd_shadowed, "Find (--remove: remove) files shadowed by an addon that mounts earlier",
+                       folder_help="garrysmod/addons folder", removes=True)
+    add_folder_command("clamp-vtf", cmd_clamp_vtf, "Clamp VTF sizes and convert them to DXT").add_argument(
+        "--size", type=int, default=1024, help="Clamp size in pixels (default 1024)")
+    add_folder_command("dxt", cmd_dxt, "Convert VTFs to DXT without resizing")
+    add_folder_command("remove-mipmaps", cmd_remove_mipmaps, "Remove mipmaps from VTFs")
+    add_folder_command("clamp-png", cmd_clamp_png, "Clamp PNG sizes").add_argument(
+        "--size", type=int, default=512, help="Clamp size in pixels (default 512)")
+    add_folder_command("wav-to-ogg", cmd_wav_to_ogg, "Convert .wav to .ogg (skips looped/cued)")
+    add_folder_command("wav-to-mp3", cmd_wav_to_mp3, "Convert .wav to .mp3 (skips looped/cued)")
+    add_folder_command("mp3-to-ogg", cmd_mp3_to_ogg, "Convert .mp3 to .ogg")
+    add_folder_command("trim-audio", cmd_trim_audio, "Trim silence from the end of sounds").add_argument(
+        "--silence-thresh", type=int, default=-55, help="Silence threshold in dBFS (default -55)")
+    add_workers(add_folder_command("export-fastdl", cmd_export_fastdl, "Mirror client files into a FastDL folder as .bz2")).add_argument(
+        "output", help="FastDL output folder")
+
+    def add_recipe(sub):
+        recipe = sub.add_mutually_exclusive_group()
+        recipe.add_argument("--preset", default="Standard", help="Saved or built-in preset (default Standard)")
+        recipe.add_argument("--recipe", metavar="JSON", help="Recipe file, a list of steps or {\"stages\": [...]}")
+        recipe.add_argument("--stages", help="Comma separated stage names, eg textures,pngs,trim_audio")
+        sub.add_argument("--size", type=int, default=None, help="Override the VTF clamp size of the recipe")
+        sub.add_argument("--save-preset", metavar="NAME", help="Save the recipe as a preset before running it")
+
+    pipeline = add_folder_command("pipeline", cmd_pipeline, "Run a recipe of operations in one job")
+    add_recipe(pipeline)
+    add_game(pipeline)
+
+    watch = add_folder_command("watch", cmd_watch, "Run a recipe on new and changed files until Ctrl+C",
+                               folder_help="Addon folder")
+    add_recipe(watch)
+    watch.add_argument("--debounce", type=float, default=2.0,
+                       help="Seconds without changes before a batch of changed files is optimized (default 2)")
+
+    find = add_workers(add_map_command("find-map-content", cmd_find_map_content, "Copy the content used by maps into a new folder"))
+    find.add_argument("content", help="Folder with all content")
+    find.add_argument("output", help="Folder to copy the found content to")
+    find.add_argument("maps", nargs="+", help=".bsp files")
+    find.add_argument("--game", required=True, help="Game folder (containing gmod.exe)")
+    find.add_argument("--hardlinks", action="store_true", help="Hardlink files instead of copying them when possible")
+
+    pakfile = add_map_command("optimize-pakfile", cmd_optimize_pakfile, "Optimize the content embedded in maps")
+    pakfile.add_argument("maps", nargs="+", help=".bsp files")
+    pakfile.add_argument("--size", type=int, default=1024, help="Clamp size in pixels (default 1024)")
+    pakfile.add_argument("--trim-sounds", action="store_true", help="Trim silence from embedded sounds")
+    add_game(pakfile)
+
+    lumps = add_workers(add_map_command("compress-lumps", cmd_compress_lumps, "LZMA compress (or decompress) map lumps"))
+    lumps.add_argument("maps", nargs="+", help=".bsp files")
+    lumps.add_argument("--decompress", action="store_true", help="Decompress all lumps instead")
+    lumps.add_argument("--compress-pakfile", action="store_true", help="Also LZMA compress pakfile entries")
+
+    presets = subparsers.add_parser("presets", help="List pipeline presets and stages")
+    presets.set_defaults(handler=cmd_presets, takes_folder=False, dry_run=False)
+    return parser
+
+
+def _run(args, cancel_token):
+    if not args.takes_folder:
+        return args.handler(args, cancel_token)
+    if not os.path.isfile(args.folder):
+        return args.handler(args, args.folder, cancel_token)
+    workspace = tempfile.mkdtemp(prefix="gma_")
+    try:
+        return run_on_gma(args.folder, workspace, args.handler, args, workspace, cancel_token)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.takes_folder:
+        if not os.path.exists(args.folder):
+            parser.error(f"{args.folder} doesn't exist")
+        if os.path.isfile(args.folder) and not args.folder.lower().endswith(".gma"):
+            parser.error(f"{args.folder} is neither a folder nor a .gma")
+    if hasattr(args, "remove"):
+        args.dry_run = not args.remove
+    if getattr(args, "game", None) and not os.path.isdir(args.game):
+        parser.error(f"Game folder {args.game} doesn't exist")
+    if args.command in ("export-fastdl", "watch") and args.dry_run:
+        parser.error(f"{args.command} doesn't support --dry-run")
+    if args.command == "watch":
+        if not os.path.isdir(args.folder):
+            parser.error("watch needs a folder, not a .gma")
+        args.recipe_steps = _load_recipe(args, parser)
+    if args.command == "pipeline":
+        args.recipe_steps = _load_recipe(args, parser)
+        from pipeline.optimize_all import needs_mounts
+        if needs_mounts(args.recipe_steps) and not args.game and not args.dry_run:
+            parser.error("The recipe removes game files, --game is required")
+
+    manifest.set_enabled(not args.force)
+    if args.output_cache_mb is not None:
+        output_cache.set_max_size(args.output_cache_mb * 1024 * 1024)
+    cancel_token = CancelToken()
+
+    def on_interrupt(signum, frame):
+        if cancel_token.cancelled:
+            raise KeyboardInterrupt
+        cancel_token.cancel()
+        print("Cancelling after the current file, press Ctrl+C again to abort...", file=sys.stderr)
+
+    stats_sink = StatsSink(args.folder if args.takes_folder and os.path.isdir(args.folder) else None)
+    tracer = Tracer(memory=args.trace_memory) if args.trace else None
+    start_time = time.time()
+    result = None
+    error = None
+    status = "done"
+    with ExitStack() as stack:
+        if args.report == "-":
+            # Keep stdout clean for the report
+            stack.enter_context(redirect_stdout(sys.stderr))
+        stack.enter_context(events.capture(stats_sink))
+        if args.events:
+            events_file = stack.enter_context(open(args.events, "w", encoding="utf-8"))
+            stack.enter_context(events.capture(JsonLinesWriter(events_file)))
+        previous_handler = signal.signal(signal.SIGINT, on_interrupt)
+        stack.callback(signal.signal, signal.SIGINT, previous_handler)
+        if args.compressed_sizes:
+            events.set_compressed_sizes(stack.enter_context(CompressedSizer()))
+            stack.callback(events.set_compressed_sizes, None)
+        if tracer is not None:
+            stack.enter_context(tracing.tracing(tracer))
+            stack.enter_context(tracing.stage(args.command))
+        try:
+            result = _run(args, cancel_token)
+        except (Cancelled, KeyboardInterrupt):
+            status = "cancelled"
+        except Exception as e:
+            traceback.print_exc()
+            status = "failed"
+            error = str(e)
+    # Ctrl+C is how watch mode is stopped, not a cancelled run
+    if status == "done" and cancel_token.cancelled and args.command != "watch":
+        status = "cancelled"
+    if tracer is not None:
+        print(tracer.summary(), file=sys.stderr)
+        tracer.write_chrome_trace(args.trace)
+
+    stats = stats_sink.stats
+    if status == "cancelled":
+        exit_code = EXIT_CANCELLED
+    elif status == "failed":
+        exit_code = EXIT_FAILED
+    elif stats.failed:
+        exit_code = EXIT_FILES_FAILED
+    else:
+        exit_code = EXIT_OK
+
+    size, count = result if isinstance(result, tuple) and len(result) == 2 else (None, None)
+    if args.report:
+        report = {
+            "command": args.command,
+            "target": getattr(args, "folder", None) or getattr(args, "maps", None),
+            "dry_run": args.dry_run,
+            "status": status,
+            "exit_code": exit_code,
+            "error": error,
+            "size": size,
+            "count": count,
+            "duration": round(time.time() - start_time, 3),
+            "files": stats.files,
+            "failed_files": stats.failed,
+            "bytes_before": stats.bytes_before,
+            "bytes_after": stats.bytes_after,
+            # Only measured with --compressed-sizes
+            "compressed_files": stats.compressed_files,
+            "compressed_bytes_before": stats.compressed_before if args.compressed_sizes else None,
+            "compressed_bytes_after": stats.compressed_after if args.compressed_sizes else None,
+            "actions": stats.actions,
+        }
+        text = json.dumps(report, indent=2)
+        if args.report == "-":
+            print(text)
+        else:
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
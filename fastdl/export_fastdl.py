@@ -0,0 +1,156 @@
+import bz2
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import events
+from utils.addons import walk_files
+from utils.cancel import is_cancelled
+from utils.cache import write_atomic
+from utils.formatting import format_size
+from utils.hashing import CHUNK_SIZE, HashCache, hash_files
+
+MANIFEST_NAME = ".fastdl_manifest.json"
+
+# Files clients can download, everything else (lua, data, ...) stays on the server
+CLIENT_EXTENSIONS = (
+    ".vmt", ".vtf", ".png", ".jpg", ".jpeg",
+    ".mdl", ".vvd", ".vtx", ".phy", ".ani",
+    ".wav", ".mp3", ".ogg",
+    ".bsp", ".nav", ".ain",
+    ".pcf", ".ttf", ".otf", ".res",
+)
+
+
+def _compress_file(src_path: str, dest_path: str) -> int:
+    """bzip2 a file through a temporary file, returns the compressed size."""
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = dest_path + ".tmp"
+    compressor = bz2.BZ2Compressor(9)
+    with open(src_path, "rb") as src, open(tmp_path, "wb") as dest:
+        while chunk := src.read(CHUNK_SIZE):
+            dest.write(compressor.compress(chunk))
+        dest.write(compressor.flush())
+    os.replace(tmp_path, dest_path)
+    return os.path.getsize(dest_path)
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_fastdl(folder, fastdl_folder, progress_callback=None, max_workers=None, cancel_token=None):
+    """
+    Mirror the client-relevant files of a folder into a bzip2 compressed FastDL folder.
+
+    Files are compressed in parallel. A manifest in the FastDL folder records the content
+    hash each .bz2 was made from, so files that didn't change since the last export are
+    skipped and .bz2 files whose source is gone are removed.
+
+    Args:
+        folder: Path to the (optimized) addon folder
+        fastdl_folder: Path to the FastDL folder to write to
+        progress_callback: Optional callback(current, total) for progress updates
+        max_workers: Number of compression threads, defaults to the executor default
+        cancel_token: Optional CancelToken. Remaining files are skipped once it's cancelled, the
+            manifest still records the files compressed so far.
+
+    Returns:
+        (total compressed bytes, files compressed this run)
+    """
+    start_time = time.time()
+    manifest_path = os.path.join(fastdl_folder, MANIFEST_NAME)
+    os.makedirs(fastdl_folder, exist_ok=True)
+    manifest = _load_manifest(manifest_path)
+
+    sources = {}
+    raw_size = 0
+    for rel_path, stat in walk_files(folder):
+        if rel_path.lower().endswith(CLIENT_EXTENSIONS):
+            sources[rel_path] = os.path.join(folder, rel_path)
+            raw_size += stat.st_size
+
+    print(f"Found {len(sources)} client files, checking for changes...")
+    with HashCache() as cache:
+        digests = hash_files(sources.values(), cache, max_workers, cancel_token=cancel_token)
+
+    to_compress = []
+    for rel_path, src_path in sources.items():
+        digest = digests.get(src_path)
+        if digest is None:
+            continue
+        entry = manifest.get(rel_path)
+        dest_path = os.path.join(fastdl_folder, rel_path + ".bz2")
+        if entry and entry.get("hash") == digest and os.path.exists(dest_path):
+            continue
+        to_compress.append((rel_path, src_path, dest_path, digest))
+
+    # Remove .bz2 files of sources that no longer exist
+    stale_count = 0
+    stale_dirs = set()
+    for rel_path in [rel_path for rel_path in manifest if rel_path not in sources]:
+        dest_path = os.path.join(fastdl_folder, rel_path + ".bz2")
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+            stale_dirs.add(os.path.dirname(dest_path))
+            print(f"Removed stale: {rel_path}.bz2")
+        del manifest[rel_path]
+        stale_count += 1
+
+    print(f"Compressing {len(to_compress)} files ({len(sources) - len(to_compress)} unchanged)...")
+    total = len(to_compress)
+    compressed_count = 0
+
+    def compress(item):
+        rel_path, src_path, dest_path, _ = item
+        if is_cancelled(cancel_token):
+            return None
+        try:
+            start = time.perf_counter()
+            size = _compress_file(src_path, dest_path)
+            # Reported on the .bz2, the source folder itself doesn't change
+            events.file_finished(dest_path, events.COMPRESSED, os.path.getsize(src_path), size,
+                                 time.perf_counter() - start)
+            return size
+        except OSError as e:
+            print(f"Failed to compress {rel_path}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for idx, (item, size) in enumerate(zip(to_compress, executor.map(compress, to_compress)), 1):
+            if size is not None:
+                rel_path, _, _, digest = item
+                manifest[rel_path] = {"hash": digest, "size": size}
+                compressed_count += 1
+            if progress_callback:
+                progress_callback(idx, total)
+
+    write_atomic(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+
+    # Remove directories the stale files left empty, other empty directories in the output aren't ours
+    root = os.path.abspath(fastdl_folder)
+    for dir_path in stale_dirs:
+        dir_path = os.path.abspath(dir_path)
+        while dir_path != root and dir_path.startswith(root + os.sep):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                # Not empty (or already gone with a deeper one)
+                break
+            dir_path = os.path.dirname(dir_path)
+
+    compressed_size = sum(entry["size"] for entry in manifest.values())
+    print("="*60)
+    if is_cancelled(cancel_token):
+        print(f"Cancelled, skipped {len(to_compress) - compressed_count} files. Export again to finish.")
+    print(f"Compressed {compressed_count} files, removed {stale_count} stale files.")
+    print(f"Raw size: {format_size(raw_size)}")
+    print(f"FastDL download size (bz2): {format_size(compressed_size)}")
+    print(f"Time taken: {round(time.time() - start_time, 2)} seconds")
+    print("="*60)
+    return compressed_size, compressed_count
@@ -1,41 +1,80 @@
+import importlib
 import os
 import sys
-from contextlib import contextmanager
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from functools import partial
 from io import StringIO
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
 from utils.formatting import format_size
-from unused_files.modelformats import unused_model_formats
-from unused_files.content import unused_content
-from unused_files.remove_game_files import remove_game_files
-from material_compression.resize_and_compress import resize_and_compress
-from material_compression.resize_png import clamp_pngs
-from material_compression.remove_mipmaps import remove_mipmaps
-from sound_compression.wav_to_mp3 import wav_to_mp3
-from sound_compression.wav_to_ogg import wav_to_ogg
-from sound_compression.mp3_to_ogg import mp3_to_ogg
-from sound_compression.trim_empty import trim_empty_audio
-from mapping.find_map_content import find_map_content
-
-
-class SignalStream(QtCore.QObject):
-    text_emitted = QtCore.Signal(str)
-
-    def write(self, text: str):
-        if text:
-            self.text_emitted.emit(str(text))
-
-    def flush(self):
-        pass
+from pipeline.optimize_all import STAGES, delete_preset, list_presets, load_preset, needs_mounts, save_preset
+from utils.gma import run_on_gma
+from utils.addons import walk_files
+from utils.compressed_size import CompressedSizer, estimate_download_size
+from utils import events
+from utils.events import EventBuffer, EventStats
+from utils.cancel import CancelToken, Cancelled
+from utils.logbuffer import LogBuffer
+from utils import tracing
+from utils.tracing import Tracer
+from utils.cache import get_cache_dir
+from utils import manifest
+
+# Lines kept in the log widget, the full log can be written to a file
+MAX_LOG_LINES = 5000
+# How often buffered log output is moved into the log widget
+LOG_DRAIN_INTERVAL_MS = 100
+# How often the folder size walk reports its running total
+SIZE_PARTIAL_INTERVAL = 0.1
+
+# Operations (and their heavy dependencies like srctools, sourcepp, pydub and PIL) are imported
+# when an action first runs so the window shows quickly. Once it's up they're imported in the
+# background, so the first action doesn't have to wait for them either.
+PREWARM_IMPORTS = True
+PREWARM_DELAY_MS = 500
+OPERATION_MODULES = (
+    "utils.mounts",
+    "unused_files.modelformats",
+    "unused_files.remove_game_files",
+    "material_compression.resize_and_compress",
+    "material_compression.resize_png",
+    "material_compression.remove_mipmaps",
+    "sound_compression.wav_to_ogg",
+    "sound_compression.wav_to_mp3",
+    "sound_compression.mp3_to_ogg",
+    "sound_compression.trim_empty",
+    "unused_files.content",
+    "unused_files.duplicates",
+    "unused_files.shadowed",
+    "mapping.find_map_content",
+    "mapping.optimize_pakfile",
+    "mapping.compress_lumps",
+    "fastdl.export_fastdl",
+)
+
+
+def prewarm_imports():
+    """Import the operation modules in a background thread."""
+    def run():
+        for name in OPERATION_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                # The action that needs it reports the error when it runs
+                pass
+
+    threading.Thread(target=run, name="prewarm-imports", daemon=True).start()
 
 
 @contextmanager
-def redirect_stdout_stderr(callback):
-    """Temporarily redirect stdout/stderr to a Qt signal callback."""
+def redirect_stdout_stderr(stream):
+    """Temporarily redirect stdout/stderr to a stream, eg a LogBuffer the UI drains."""
     old_out, old_err = sys.stdout, sys.stderr
-    stream = SignalStream()
-    stream.text_emitted.connect(callback)
     sys.stdout = stream
     sys.stderr = stream
     try:
@@ -47,24 +86,55 @@ def redirect_stdout_stderr(callback):
 
 class TaskWorker(QtCore.QObject):
     started = QtCore.Signal(str)
-    log = QtCore.Signal(str)
     progress = QtCore.Signal(int, int)
     finished = QtCore.Signal(str)
     failed = QtCore.Signal(str)
 
-    def __init__(self, fn, *args, description: str = "Working...", **kwargs):
+    def __init__(self, fn, *args, description: str = "Working...", log_buffer: LogBuffer | None = None,
+                 event_buffer: EventBuffer | None = None, cancel_token: CancelToken | None = None,
+                 tracer: Tracer | None = None, **kwargs):
         super().__init__()
+        self.tracer = tracer
+        self.log_buffer = log_buffer or LogBuffer()
+        self.event_buffer = event_buffer or EventBuffer()
+        self.cancel_token = cancel_token or CancelToken()
         self.fn = fn
         self.args = args
         self.kwargs = kwargs
         self.description = description
 
+    def write_trace(self):
+        """Log the time spent per span and save the trace for chrome://tracing or Perfetto."""
+        if self.tracer is None:
+            return
+        print("="*60)
+        print(self.tracer.summary())
+        path = os.path.join(get_cache_dir("traces"), f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+        try:
+            self.tracer.write_chrome_trace(path)
+            print(f"Trace written to {path}")
+        except OSError as e:
+            print(f"Couldn't write trace: {e}")
+        print("="*60)
+
     @QtCore.Slot()
     def run(self):
         self.started.emit(self.description)
         try:
-            with redirect_stdout_stderr(self.log.emit):
-                result = self.fn(*self.args, **self.kwargs)
+            with redirect_stdout_stderr(self.log_buffer):
+                try:
+                    with events.capture(self.event_buffer), \
+                            tracing.tracing(self.tracer) if self.tracer else nullcontext(), \
+                            tracing.stage(self.description):
+                        result = self.fn(*self.args, **self.kwargs)
+                except Cancelled:
+                    self.finished.emit("Cancelled. Files that were already processed keep their changes.")
+                    return
+                finally:
+                    self.write_trace()
+                if self.cancel_token.cancelled:
+                    self.finished.emit("Cancelled. Files that were already processed keep their changes.")
+                    return
             msg = "Done."
             # If the function returned something meaningful, include it.
             if isinstance(result, tuple):
@@ -79,6 +149,166 @@ class TaskWorker(QtCore.QObject):
             self.failed.emit(f"Error: {e}")
 
 
+class FolderSizeWorker(QtCore.QObject):
+    """Sums up the size of a folder in the background, reporting running totals on the way."""
+    partial = QtCore.Signal(str, object)
+    finished = QtCore.Signal(str, object)
+
+    def __init__(self, folder: str):
+        super().__init__()
+        self.folder = folder
+        self.aborted = False
+
+    @QtCore.Slot()
+    def run(self):
+        if os.path.isfile(self.folder):
+            self.finished.emit(self.folder, os.path.getsize(self.folder))
+            return
+        total_size = 0
+        last_report = time.monotonic()
+        for _, stat in walk_files(self.folder):
+            if self.aborted:
+                return
+            total_size += stat.st_size
+            now = time.monotonic()
+            if now - last_report >= SIZE_PARTIAL_INTERVAL:
+                last_report = now
+                self.partial.emit(self.folder, total_size)
+        self.finished.emit(self.folder, total_size)
+
+
+class DownloadSizeWorker(QtCore.QObject):
+    """Estimates the compressed download size of a folder in the background."""
+    finished = QtCore.Signal(str, object, object)
+
+    def __init__(self, folder: str):
+        super().__init__()
+        self.folder = folder
+        # Checked between files, an aborted estimate finishes with no sizes
+        self.abort_token = CancelToken()
+
+    def abort(self):
+        self.abort_token.cancel()
+
+    @QtCore.Slot()
+    def run(self):
+        try:
+            raw, compressed = estimate_download_size(self.folder, cancel_token=self.abort_token)
+        except Exception:
+            raw, compressed = None, None
+        self.finished.emit(self.folder, raw, compressed)
+
+
+class PipelineDialog(QtWidgets.QDialog):
+    """Pick, reorder and save the stages of an optimize-all recipe."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Optimize all")
+        layout = QtWidgets.QVBoxLayout(self)
+
+        preset_row = QtWidgets.QHBoxLayout()
+        preset_row.addWidget(QtWidgets.QLabel("Preset:"))
+        self.preset_combo = QtWidgets.QComboBox()
+        self.preset_combo.currentTextChanged.connect(self.load_preset)
+        preset_row.addWidget(self.preset_combo, 1)
+        save_btn = QtWidgets.QPushButton("Save as…")
+        save_btn.clicked.connect(self.on_save)
+        preset_row.addWidget(save_btn)
+        delete_btn = QtWidgets.QPushButton("Delete")
+        delete_btn.clicked.connect(self.on_delete)
+        preset_row.addWidget(delete_btn)
+        layout.addLayout(preset_row)
+
+        layout.addWidget(QtWidgets.QLabel("Checked stages run from top to bottom, drag to reorder:"))
+        self.stage_list = QtWidgets.QListWidget()
+        self.stage_list.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
+        layout.addWidget(self.stage_list, 1)
+
+        sizes = QtWidgets.QFormLayout()
+        self.vtf_size = QtWidgets.QSpinBox()
+        self.vtf_size.setRange(1, 1_000_000)
+        sizes.addRow("VTF clamp size (pixels)", self.vtf_size)
+        self.png_size = QtWidgets.QSpinBox()
+        self.png_size.setRange(1, 1_000_000)
+        sizes.addRow("PNG clamp size (pixels)", self.png_size)
+        layout.addLayout(sizes)
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttons.button(QtWidgets.QDialogButtonBox.Ok).setText("Run")
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.refresh_presets()
+
+    def refresh_presets(self, current: str | None = None):
+        self.preset_combo.blockSignals(True)
+        self.preset_combo.clear()
+        self.preset_combo.addItems(list_presets())
+        if current:
+            self.preset_combo.setCurrentText(current)
+        self.preset_combo.blockSignals(False)
+        self.load_preset(self.preset_combo.currentText())
+
+    def load_preset(self, name: str):
+        if not name:
+            return
+        try:
+            recipe = load_preset(name)
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, "Invalid preset", str(e))
+            return
+        self.vtf_size.setValue(1024)
+        self.png_size.setValue(512)
+        self.stage_list.clear()
+        for step in recipe:
+            if step["stage"] == "textures":
+                self.vtf_size.setValue(int(step.get("size", 1024)))
+            elif step["stage"] == "pngs":
+                self.png_size.setValue(int(step.get("size", 512)))
+        used = [step["stage"] for step in recipe]
+        for name in used + [name for name in STAGES if name not in used]:
+            item = QtWidgets.QListWidgetItem(STAGES[name].label)
+            item.setData(QtCore.Qt.UserRole, name)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked if name in used else QtCore.Qt.Unchecked)
+            self.stage_list.addItem(item)
+
+    def recipe(self) -> list[dict]:
+        steps = []
+        for row in range(self.stage_list.count()):
+            item = self.stage_list.item(row)
+            if item.checkState() != QtCore.Qt.Checked:
+                continue
+            step = {"stage": item.data(QtCore.Qt.UserRole)}
+            if step["stage"] == "textures":
+                step["size"] = self.vtf_size.value()
+            elif step["stage"] == "pngs":
+                step["size"] = self.png_size.value()
+            steps.append(step)
+        return steps
+
+    def on_save(self):
+        name, ok = QtWidgets.QInputDialog.getText(self, "Save preset", "Preset name:")
+        if not ok or not name.strip():
+            return
+        try:
+            save_preset(name.strip(), self.recipe())
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Can't save preset", str(e))
+            return
+        self.refresh_presets(name.strip())
+
+    def on_delete(self):
+        try:
+            delete_preset(self.preset_combo.currentText())
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Can't delete preset", str(e))
+            return
+        self.refresh_presets()
+
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -94,6 +324,30 @@ class MainWindow(QtWidgets.QMainWindow):
         self.worker: TaskWorker | None = None
         self.initial_folder_size: int = 0
         self.current_folder_size: int = 0
+        self.initial_download_size: int | None = None
+        self.current_download_size: int | None = None
+        self.size_thread: QtCore.QThread | None = None
+        self.size_worker: DownloadSizeWorker | None = None
+        # Aborted estimates winding down, referenced until their thread is done
+        self.retired_size_threads: set = set()
+        self.folder_size_thread: QtCore.QThread | None = None
+        self.folder_size_worker: FolderSizeWorker | None = None
+        self.folder_size_pending = False
+        # Folder the sizes above belong to, kept up to date from the events of each task
+        self.size_folder: str | None = None
+        # game folder -> MountSet
+        self.mount_sets = {}
+        # Task output is buffered here and moved into the log widget in batches by a timer
+        self.log_buffer = LogBuffer()
+        # Per-file results of the running task, drained with the log to show rates and an ETA
+        self.event_buffer = EventBuffer()
+        self.task_stats: EventStats | None = None
+        self.task_sizer: CompressedSizer | None = None
+        self.task_progress: tuple[int, int] = (0, 0)
+        # Operations check this between files, the Cancel button sets it
+        self.cancel_token = CancelToken()
+        # (.gma path, folder it gets extracted to) for the next task when a .gma is selected
+        self.pending_gma: tuple[str, str] | None = None
 
         central = QtWidgets.QWidget()
         self.setCentralWidget(central)
@@ -106,9 +360,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.folder_edit.setPlaceholderText("Absolute path to folder…")
         browse_btn = QtWidgets.QPushButton("Browse…")
         browse_btn.clicked.connect(self.choose_folder)
+        browse_gma_btn = QtWidgets.QPushButton("Open .gma…")
+        browse_gma_btn.setToolTip("Work on a .gma addon directly. It gets extracted for each task and packed back afterwards if anything changed.")
+        browse_gma_btn.clicked.connect(self.choose_gma)
         folder_row.addWidget(QtWidgets.QLabel("Content folder:"))
         folder_row.addWidget(self.folder_edit, 1)
         folder_row.addWidget(browse_btn)
+        folder_row.addWidget(browse_gma_btn)
         main_layout.addLayout(folder_row)
 
         # Folder size counter
@@ -144,6 +402,18 @@ class MainWindow(QtWidgets.QMainWindow):
             grid.addWidget(btn, row // 2, row % 2)
             return btn
 
+        # Pipeline Group
+        pipeline_group = QtWidgets.QGroupBox("Pipeline")
+        pipeline_grid = QtWidgets.QGridLayout()
+        pipeline_grid.setHorizontalSpacing(12)
+        pipeline_grid.setVerticalSpacing(8)
+        add_button(pipeline_grid, 0, "Optimize all (recipe)", self.on_optimize_all, recommended=True,
+                   tooltip="Run several operations in one go, eg remove unused model formats, game files, then compress textures and sounds.\nTexture and audio stages run in parallel. Recipes can be saved as presets.")
+        add_button(pipeline_grid, 1, "Watch folder (recipe)", self.on_watch_folder,
+                   tooltip="Keep watching the folder and run a recipe on new and changed files as they are added.\nOnly the stages that work on single files run, sound references are only rewritten in the lua files that mention them.\nCancel to stop watching.")
+        pipeline_group.setLayout(pipeline_grid)
+        actions_layout.addWidget(pipeline_group)
+
         # Textures Materials Group
         textures_group = QtWidgets.QGroupBox("Textures Materials")
         textures_grid = QtWidgets.QGridLayout()
@@ -175,6 +445,10 @@ class MainWindow(QtWidgets.QMainWindow):
                    tooltip="Remove files that are already provided by base GMod.\nCan reduce size significantly for addons that include EP1/EP2/CSS content.")
         add_button(cleanup_grid, 3, "Find and copy content used by .bsp", self.on_find_map_content,
                    tooltip="Extract all content referenced by a BSP map file and copy it to a new folder for easy map packing.")
+        add_button(cleanup_grid, 4, "Duplicate content across addons", self.on_duplicate_content,
+                   tooltip="Select your garrysmod/addons folder.\nFinds files with identical content in multiple addons and reports the duplicated size per addon pair.\nCan remove copies that are shadowed by an identical file at the same path.")
+        add_button(cleanup_grid, 5, "Shadowed files across addons", self.on_shadowed_files,
+                   tooltip="Select your garrysmod/addons folder.\nFinds files that another addon already provides at the same path. Only the addon that mounts first (alphabetically) is used, the other copies are dead weight.")
         cleanup_group.setLayout(cleanup_grid)
         actions_layout.addWidget(cleanup_group)
 
@@ -194,6 +468,28 @@ class MainWindow(QtWidgets.QMainWindow):
         audio_group.setLayout(audio_grid)
         actions_layout.addWidget(audio_group)
 
+        # Maps Group
+        maps_group = QtWidgets.QGroupBox("Maps")
+        maps_grid = QtWidgets.QGridLayout()
+        maps_grid.setHorizontalSpacing(12)
+        maps_grid.setVerticalSpacing(8)
+        add_button(maps_grid, 0, "Optimize .bsp pakfile", self.on_optimize_pakfile,
+                   tooltip="Optimize content embedded in .bsp maps.\nEmbedded VTFs/PNGs are converted to DXT and clamped, sounds can be trimmed and files already provided by the game are dropped.\nThe selected maps are modified in place.")
+        add_button(maps_grid, 1, "Compress .bsp lumps (LZMA)", self.on_compress_lumps,
+                   tooltip="LZMA compress the lumps of .bsp maps to make them smaller to download.\nCan also decompress them again, for maps that have to stay editable.\nEvery map is checked to load correctly before it replaces the original.")
+        maps_group.setLayout(maps_grid)
+        actions_layout.addWidget(maps_group)
+
+        # Distribution Group
+        distribution_group = QtWidgets.QGroupBox("Distribution")
+        distribution_grid = QtWidgets.QGridLayout()
+        distribution_grid.setHorizontalSpacing(12)
+        distribution_grid.setVerticalSpacing(8)
+        add_button(distribution_grid, 0, "Export FastDL (bzip2)", self.on_export_fastdl,
+                   tooltip="Mirror client files (materials, models, sounds, maps...) into a FastDL folder as .bz2 files.\nUnchanged files are skipped on later exports and files that no longer exist are removed.")
+        distribution_group.setLayout(distribution_grid)
+        actions_layout.addWidget(distribution_group)
+
         main_layout.addWidget(actions_container)
 
         # Progress + Log
@@ -202,13 +498,47 @@ class MainWindow(QtWidgets.QMainWindow):
         self.progress.setRange(0, 0)  # indeterminate
         self.progress.setVisible(False)
         progress_row.addWidget(self.progress)
+        self.stats_label = QtWidgets.QLabel()
+        self.stats_label.setVisible(False)
+        progress_row.addWidget(self.stats_label)
+        self.cancel_btn = QtWidgets.QPushButton("Cancel")
+        self.cancel_btn.setToolTip("Stop the running task after the file it's working on.\nFiles that were already processed keep their changes.")
+        self.cancel_btn.clicked.connect(self.on_cancel_task)
+        self.cancel_btn.setVisible(False)
+        progress_row.addWidget(self.cancel_btn)
+        self.log_file_check = QtWidgets.QCheckBox("Write full log to file")
+        self.log_file_check.setToolTip(f"The log below only keeps the last {MAX_LOG_LINES} lines.\nWrite the complete output of every task to a file as well.")
+        self.log_file_check.toggled.connect(self.on_log_file_toggled)
+        progress_row.addWidget(self.log_file_check)
+        self.skip_processed_check = QtWidgets.QCheckBox("Skip files optimized before")
+        self.skip_processed_check.setChecked(True)
+        self.skip_processed_check.setToolTip("Texture, PNG, mipmap and trim operations remember the files they already processed with the same settings.\nUnchanged files are skipped on the next run, so interrupted runs resume where they stopped.\nUntick to process every file again.")
+        progress_row.addWidget(self.skip_processed_check)
+        self.compressed_sizes_check = QtWidgets.QCheckBox("Measure download size of processed files")
+        self.compressed_sizes_check.setChecked(True)
+        self.compressed_sizes_check.setToolTip("Report how much smaller the processed files got after LZMA compression (what clients download), next to the size on disk.\nFiles the download size estimate already measured are looked up, others are compressed once.")
+        progress_row.addWidget(self.compressed_sizes_check)
+        self.trace_check = QtWidgets.QCheckBox("Trace tasks")
+        self.trace_check.setToolTip("Time the hot paths (texture decode/encode, audio load/export, walking folders...) of every task.\nA summary is shown in the log and a Chrome trace is saved for chrome://tracing or ui.perfetto.dev.")
+        progress_row.addWidget(self.trace_check)
+        self.trace_memory_check = QtWidgets.QCheckBox("with memory peaks")
+        self.trace_memory_check.setToolTip("Also record the peak Python memory of each task and pipeline stage.\nMakes tasks noticeably slower.")
+        self.trace_memory_check.setEnabled(False)
+        self.trace_check.toggled.connect(self.trace_memory_check.setEnabled)
+        progress_row.addWidget(self.trace_memory_check)
         main_layout.addLayout(progress_row)
 
         self.log = QtWidgets.QPlainTextEdit()
         self.log.setReadOnly(True)
+        self.log.setMaximumBlockCount(MAX_LOG_LINES)
         self.log.setPlaceholderText("Status and output will appear here…")
         main_layout.addWidget(self.log, 1)
 
+        self.log_timer = QtCore.QTimer(self)
+        self.log_timer.setInterval(LOG_DRAIN_INTERVAL_MS)
+        self.log_timer.timeout.connect(self.drain_output)
+        self.log_timer.start()
+
         # A little nicer default look
         QtWidgets.QApplication.setStyle("Fusion")
         self.apply_dark_palette()
@@ -244,6 +574,12 @@ class MainWindow(QtWidgets.QMainWindow):
         if not folder or not os.path.exists(folder):
             QtWidgets.QMessageBox.warning(self, "Folder missing", "Please choose a valid content folder first.")
             return None
+        if os.path.isfile(folder) and folder.lower().endswith(".gma"):
+            # The task runs on the extracted contents, start_task takes care of extracting and packing
+            workspace = os.path.join(tempfile.gettempdir(), f"gma_{uuid.uuid4().hex}")
+            self.pending_gma = (folder, workspace)
+            return workspace
+        self.pending_gma = None
         return folder
 
     def choose_folder(self):
@@ -252,6 +588,12 @@ class MainWindow(QtWidgets.QMainWindow):
             self.folder_edit.setText(folder)
             self.calculate_initial_folder_size(folder)
 
+    def choose_gma(self):
+        path = self.ask_file("Select .gma addon", "GMA files (*.gma)")
+        if path:
+            self.folder_edit.setText(path)
+            self.calculate_initial_folder_size(path)
+
     def ask_int(self, title: str, label: str, default: int = 1024) -> int | None:
         value, ok = QtWidgets.QInputDialog.getInt(self, title, label, value=default, minValue=1, maxValue=10_000_000, step=1)
         return value if ok else None
@@ -264,10 +606,35 @@ class MainWindow(QtWidgets.QMainWindow):
         path, _ = QtWidgets.QFileDialog.getOpenFileName(self, title, filter=filter_str)
         return path or None
 
+    def ask_files(self, title: str, filter_str: str) -> list[str]:
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(self, title, filter=filter_str)
+        return paths
+
     def ask_directory(self, title: str) -> str | None:
         path = QtWidgets.QFileDialog.getExistingDirectory(self, title)
         return path or None
 
+    def ask_mount_set(self, gamefolder: str, exclude: str | None = None):
+        """
+        Ask which mounted content to use for a game folder, games from mount.cfg are always included.
+
+        Returns a function that builds the MountSet, call it from the task: finding the VPKs
+        walks the whole game folder, which would freeze the window.
+        """
+        from utils.mounts import MountSet
+        legacy = self.ask_yes_no("Legacy addons?", "Also count files in legacy addon folders (garrysmod/addons) as mounted game content?")
+
+        def load():
+            if legacy:
+                # Legacy addons change between tasks, so they're indexed again every time
+                return MountSet.from_gamefolder(gamefolder, legacy_addons=True, exclude=exclude)
+            # Reuse the index between tasks so the VPKs are only scanned once
+            if gamefolder not in self.mount_sets:
+                self.mount_sets[gamefolder] = MountSet.from_gamefolder(gamefolder)
+            return self.mount_sets[gamefolder]
+
+        return load
+
     def start_task(self, description: str, fn, *args, determinate: bool = False, **kwargs):
         if self.thread is not None:
             QtWidgets.QMessageBox.information(self, "Busy", "A task is already running. Please wait for it to finish.")
@@ -279,14 +646,31 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             self.progress.setRange(0, 0)
         self.log_append(f"Starting: {description}\n")
+        manifest.set_enabled(self.skip_processed_check.isChecked())
+        self.event_buffer.drain()
+        self.task_stats = EventStats(root=self.current_folder() or None)
+        self.task_sizer = CompressedSizer() if self.compressed_sizes_check.isChecked() else None
+        events.set_compressed_sizes(self.task_sizer)
+        self.task_progress = (0, 0)
+        self.stats_label.setText("")
+        self.stats_label.setVisible(True)
+        self.cancel_token = CancelToken()
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setVisible(True)
+
+        if self.pending_gma is not None:
+            gma_path, workspace = self.pending_gma
+            self.pending_gma = None
+            fn = partial(run_on_gma, gma_path, workspace, fn)
 
         self.thread = QtCore.QThread()
-        self.worker = TaskWorker(fn, *args, description=description, **kwargs)
+        tracer = Tracer(memory=self.trace_memory_check.isChecked()) if self.trace_check.isChecked() else None
+        self.worker = TaskWorker(fn, *args, description=description, log_buffer=self.log_buffer,
+                                 event_buffer=self.event_buffer, cancel_token=self.cancel_token, tracer=tracer, **kwargs)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
         self.worker.started.connect(lambda msg: None)
-        self.worker.log.connect(self.log_append)
         self.worker.progress.connect(self.on_progress_update)
         self.worker.finished.connect(self.on_task_finished)
         self.worker.failed.connect(self.on_task_failed)
@@ -299,10 +683,24 @@ class MainWindow(QtWidgets.QMainWindow):
     def cleanup_thread(self):
         self.thread = None
         self.worker = None
+        events.set_compressed_sizes(None)
+        if self.task_sizer is not None:
+            self.task_sizer.close()
+            self.task_sizer = None
         self.progress.setVisible(False)
+        self.stats_label.setVisible(False)
+        self.cancel_btn.setVisible(False)
+
+    def on_cancel_task(self):
+        if self.thread is None:
+            return
+        self.cancel_token.cancel()
+        self.cancel_btn.setEnabled(False)
+        self.log_append("Cancelling, finishing the current file...\n")
 
     def on_progress_update(self, current: int, total: int):
         """Update progress bar with current/total values"""
+        self.task_progress = (current, total)
         if total > 0:
             self.progress.setRange(0, total)
             self.progress.setValue(current)
@@ -311,50 +709,171 @@ class MainWindow(QtWidgets.QMainWindow):
             self.progress.setRange(0, 0)
 
     def on_task_finished(self, msg: str):
+        self.log_task_stats()
         self.log_append(msg + "\n")
         self.update_folder_size()
 
     def on_task_failed(self, msg: str):
+        self.log_task_stats()
         self.log_append(msg + "\n")
         self.update_folder_size()
         QtWidgets.QMessageBox.critical(self, "Task failed", msg)
 
     def log_append(self, text: str):
+        # Goes through the buffer too, so it stays in order with the task output
+        self.log_buffer.write(text)
+
+    def drain_output(self):
+        self.drain_events()
+        self.drain_log()
+
+    def drain_events(self):
+        if self.task_stats is None:
+            return
+        self.task_stats.add(self.event_buffer.drain())
+        if self.thread is None:
+            return
+        stats = self.task_stats
+        parts = []
+        if stats.files:
+            parts.append(f"{stats.files} files, {stats.files_per_second:.1f} files/s, {format_size(stats.bytes_per_second)}/s")
+        eta = stats.eta(*self.task_progress)
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            parts.append(f"ETA {minutes}:{seconds:02d}")
+        self.stats_label.setText(" · ".join(parts))
+
+    def log_task_stats(self):
+        self.drain_events()
+        stats = self.task_stats
+        if stats is None or not stats.files:
+            return
+        actions = ", ".join(f"{action or 'processed'}: {count}" for action, count in sorted(stats.actions.items()))
+        self.log_append(f"Processed {stats.files} files in {round(stats.elapsed, 2)} seconds "
+                        f"({stats.files_per_second:.1f} files/s, {format_size(stats.bytes_per_second)}/s). {actions}\n")
+        self.log_append(f"Size of the processed files: {format_size(stats.bytes_before)} → {format_size(stats.bytes_after)}")
+        if stats.compressed_files:
+            self.log_append(f", download size (LZMA) of {stats.compressed_files} of them: "
+                            f"{format_size(stats.compressed_before)} → {format_size(stats.compressed_after)}")
+        self.log_append("\n")
+
+    def drain_log(self):
+        text = self.log_buffer.drain()
+        if not text:
+            return
         self.log.moveCursor(QtGui.QTextCursor.End)
         self.log.insertPlainText(text)
         self.log.moveCursor(QtGui.QTextCursor.End)
 
-    def calculate_folder_size(self, folder: str) -> int:
-        """Calculate total size of all files in folder"""
-        total_size = 0
+    def on_log_file_toggled(self, checked: bool):
+        if not checked:
+            self.log_buffer.spill_to(None)
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Write full log to", "optimization_log.txt", "Text files (*.txt)")
+        if not path:
+            self.log_file_check.setChecked(False)
+            return
         try:
-            for root, _, files in os.walk(folder):
-                for filename in files:
-                    file_path = os.path.join(root, filename)
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except (OSError, FileNotFoundError):
-                        pass
-        except Exception as e:
-            print(f"Error calculating folder size: {e}")
-        return total_size
+            self.log_buffer.spill_to(path)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, "Can't write log file", str(e))
+            self.log_file_check.setChecked(False)
+            return
+        self.log_append(f"Writing full log to: {path}\n")
 
     def calculate_initial_folder_size(self, folder: str):
-        """Calculate and store initial folder size"""
+        """Calculate the initial folder size in the background, the label shows the running total"""
         self.size_label.setText("Calculating folder size...")
-        QtWidgets.QApplication.processEvents()
-        
-        size = self.calculate_folder_size(folder)
+        self.size_folder = folder
+        self.initial_folder_size = 0
+        self.current_folder_size = 0
+        self.initial_download_size = None
+        self.current_download_size = None
+        self.folder_size_pending = True
+        if self.folder_size_thread is not None:
+            self.folder_size_worker.aborted = True
+            self.folder_size_thread.quit()
+            self.folder_size_thread.wait()
+        self.folder_size_thread = QtCore.QThread()
+        self.folder_size_worker = FolderSizeWorker(folder)
+        self.folder_size_worker.moveToThread(self.folder_size_thread)
+        self.folder_size_thread.started.connect(self.folder_size_worker.run)
+        self.folder_size_worker.partial.connect(self.on_folder_size_partial)
+        self.folder_size_worker.finished.connect(self.on_folder_size_calculated)
+        self.folder_size_worker.finished.connect(self.folder_size_thread.quit)
+        self.folder_size_thread.start()
+
+    def on_folder_size_partial(self, folder: str, size):
+        if folder != self.size_folder:
+            return
+        self.size_label.setText(f"Calculating folder size... {format_size(size)} so far")
+
+    def on_folder_size_calculated(self, folder: str, size):
+        if folder != self.size_folder:
+            return
+        self.folder_size_pending = False
         self.initial_folder_size = size
         self.current_folder_size = size
         self.update_size_label()
+        self.start_download_size_estimate(folder)
+
+    def start_download_size_estimate(self, folder: str):
+        """
+        Compress the folder's files in the background to estimate the download size. Only one
+        estimate runs at a time, starting another aborts the running one without waiting for it.
+        """
+        if self.size_thread is not None:
+            self.size_worker.abort()
+            self.retired_size_threads.add(self.size_thread)
+        thread = QtCore.QThread()
+        worker = DownloadSizeWorker(folder)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self.on_download_size_estimated)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(lambda: self.on_size_thread_finished(thread))
+        self.size_thread = thread
+        self.size_worker = worker
+        thread.start()
+
+    def on_size_thread_finished(self, thread: QtCore.QThread):
+        self.retired_size_threads.discard(thread)
+        if thread is self.size_thread:
+            self.size_thread = None
+            self.size_worker = None
+
+    def on_download_size_estimated(self, folder: str, raw, compressed):
+        if folder != self.current_folder() or compressed is None:
+            return
+        if self.initial_download_size is None:
+            self.initial_download_size = compressed
+        elif self.current_download_size is not None and compressed != self.current_download_size:
+            self.log_append(f"Download size (LZMA): {format_size(self.current_download_size)} → {format_size(compressed)}\n")
+        self.current_download_size = compressed
+        self.update_size_label()
 
     def update_folder_size(self):
-        """Recalculate current folder size after an operation"""
+        """Update the current folder size after an operation from the files it reported as changed"""
         folder = self.current_folder()
-        if folder and os.path.exists(folder):
-            self.current_folder_size = self.calculate_folder_size(folder)
-            self.update_size_label()
+        if not folder or not os.path.exists(folder):
+            return
+        if folder != self.size_folder:
+            # A folder that was typed in, it was never measured
+            self.calculate_initial_folder_size(folder)
+            return
+        if self.folder_size_pending:
+            # Still walking, the walk picks up the changes
+            return
+        if os.path.isfile(folder):
+            # .gma, the task ran on an extracted copy
+            self.current_folder_size = os.path.getsize(folder)
+        elif self.task_stats is not None:
+            self.current_folder_size += self.task_stats.size_delta
+        self.update_size_label()
+        # The background estimator measures the result, tasks never compress the folder themselves
+        self.start_download_size_estimate(folder)
 
     def update_size_label(self):
         """Update the size label with initial and current sizes"""
@@ -364,9 +883,19 @@ class MainWindow(QtWidgets.QMainWindow):
         
         initial_str = format_size(self.initial_folder_size)
         current_str = format_size(self.current_folder_size)
+
+        if self.initial_download_size is None:
+            download_str = " · Download size: <span style='color: #888;'>estimating…</span>"
+        elif self.initial_download_size == self.current_download_size:
+            download_str = f" · Download size: ≈{format_size(self.current_download_size)}"
+        else:
+            download_str = (
+                f" · Download size: <span style='color: #888;'>≈{format_size(self.initial_download_size)}</span> → "
+                f"<b>≈{format_size(self.current_download_size)}</b>"
+            )
         
         if self.initial_folder_size == self.current_folder_size:
-            self.size_label.setText(f"Folder size: {current_str}")
+            self.size_label.setText(f"Folder size: {current_str}{download_str}")
         else:
             diff = self.initial_folder_size - self.current_folder_size
             diff_str = format_size(diff)
@@ -378,6 +907,7 @@ class MainWindow(QtWidgets.QMainWindow):
                     f"Folder size: <span style='color: #888;'>{initial_str}</span> → "
                     f"<b>{current_str}</b> "
                     f"<span style='color: #4CAF50;'>(−{diff_str}, −{percentage:.2f}%)</span>"
+                    f"{download_str}"
                 )
             else:
                 # Size increased (shouldn't happen normally)
@@ -385,6 +915,7 @@ class MainWindow(QtWidgets.QMainWindow):
                     f"Folder size: <span style='color: #888;'>{initial_str}</span> → "
                     f"<b>{current_str}</b> "
                     f"<span style='color: #f44336;'>(+{format_size(-diff)})</span>"
+                    f"{download_str}"
                 )
         
         self.size_label.setTextFormat(QtCore.Qt.RichText)
@@ -397,7 +928,8 @@ class MainWindow(QtWidgets.QMainWindow):
         remove = self.ask_yes_no("Remove models?", "Do you want to remove the unused model formats?")
 
         def task():
-            size, count = unused_model_formats(folder, remove, progress_callback=self.worker.progress.emit)
+            from unused_files.modelformats import unused_model_formats
+            size, count = unused_model_formats(folder, remove, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
             print((f"Removed {count} unused model formats, saving {format_size(size)}") if remove else (f"Found {count} unused model formats, taking up {format_size(size)}"))
             return size, count
 
@@ -410,7 +942,8 @@ class MainWindow(QtWidgets.QMainWindow):
         remove = self.ask_yes_no("Remove files?", "Do you want to remove the found unused files? This isn't 100% and can remove used files!")
 
         def task():
-            size, count = unused_content(folder, remove)
+            from unused_files.content import unused_content
+            size, count = unused_content(folder, remove, cancel_token=self.cancel_token)
             print((f"Removed {count} unused files, saving {format_size(size)}") if remove else (f"Found {count} unused files, taking up {format_size(size)}"))
             return size, count
 
@@ -426,7 +959,37 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "Invalid game folder", "The selected folder doesn't contain gmod.exe")
             return
 
-        self.start_task("Remove files already in game", remove_game_files, folder, gamefolder, remove)
+        load_mounts = self.ask_mount_set(gamefolder, exclude=folder)
+
+        def task():
+            from unused_files.remove_game_files import remove_game_files
+            return remove_game_files(folder, load_mounts(), remove, cancel_token=self.cancel_token)
+
+        self.start_task("Remove files already in game", task)
+
+    def on_duplicate_content(self):
+        folder = self.ensure_folder()
+        if not folder:
+            return
+        remove = self.ask_yes_no("Remove duplicates?", "Do you want to remove redundant copies? Only copies at the same path as an identical file in an addon that mounts earlier are removed.")
+
+        def task():
+            from unused_files.duplicates import duplicate_content
+            return duplicate_content(folder, remove, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+
+        self.start_task("Duplicate content across addons", task, determinate=True)
+
+    def on_shadowed_files(self):
+        folder = self.ensure_folder()
+        if not folder:
+            return
+        remove = self.ask_yes_no("Remove shadowed files?", "Do you want to remove files that are shadowed by the same path in an addon that mounts earlier?")
+
+        def task():
+            from unused_files.shadowed import shadowed_files
+            return shadowed_files(folder, remove, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+
+        self.start_task("Shadowed files across addons", task, determinate=True)
 
     def on_clamp_vtf(self):
         folder = self.ensure_folder()
@@ -437,7 +1000,8 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         def task():
-            return resize_and_compress(folder, int(size), progress_callback=self.worker.progress.emit)
+            from material_compression.resize_and_compress import resize_and_compress
+            return resize_and_compress(folder, int(size), progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task("Clamp VTF file sizes", task, determinate=True)
 
@@ -448,7 +1012,8 @@ class MainWindow(QtWidgets.QMainWindow):
         # Use a very large clamp to force DXT path
         
         def task():
-            return resize_and_compress(folder, 1_000_000, progress_callback=self.worker.progress.emit)
+            from material_compression.resize_and_compress import resize_and_compress
+            return resize_and_compress(folder, 1_000_000, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task("Use DXT for VTFs", task, determinate=True)
 
@@ -458,7 +1023,8 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         def task():
-            return remove_mipmaps(folder, progress_callback=self.worker.progress.emit)
+            from material_compression.remove_mipmaps import remove_mipmaps
+            return remove_mipmaps(folder, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task("Remove mipmaps", task, determinate=True)
 
@@ -471,7 +1037,8 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         def task():
-            return clamp_pngs(folder, int(size), progress_callback=self.worker.progress.emit)
+            from material_compression.resize_png import clamp_pngs
+            return clamp_pngs(folder, int(size), progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task("Clamp PNG file sizes", task, determinate=True)
 
@@ -481,7 +1048,8 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         def task():
-            return wav_to_mp3(folder, progress_callback=self.worker.progress.emit)
+            from sound_compression.wav_to_mp3 import wav_to_mp3
+            return wav_to_mp3(folder, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task(".wav to .mp3", task, determinate=True)
 
@@ -491,7 +1059,8 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         def task():
-            return wav_to_ogg(folder, progress_callback=self.worker.progress.emit)
+            from sound_compression.wav_to_ogg import wav_to_ogg
+            return wav_to_ogg(folder, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task(".wav to .ogg", task, determinate=True)
 
@@ -499,7 +1068,12 @@ class MainWindow(QtWidgets.QMainWindow):
         folder = self.ensure_folder()
         if not folder:
             return
-        self.start_task(".mp3 to .ogg", mp3_to_ogg, folder)
+
+        def task():
+            from sound_compression.mp3_to_ogg import mp3_to_ogg
+            return mp3_to_ogg(folder, cancel_token=self.cancel_token)
+
+        self.start_task(".mp3 to .ogg", task)
 
     def on_trim_empty_audio(self):
         folder = self.ensure_folder()
@@ -507,10 +1081,54 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         
         def task():
-            return trim_empty_audio(folder, progress_callback=self.worker.progress.emit)
+            from sound_compression.trim_empty import trim_empty_audio
+            return trim_empty_audio(folder, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
         
         self.start_task("Trim empty audio", task, determinate=True)
 
+    def on_optimize_all(self):
+        folder = self.ensure_folder()
+        if not folder:
+            return
+        dialog = PipelineDialog(self)
+        if dialog.exec() != QtWidgets.QDialog.Accepted:
+            return
+        recipe = dialog.recipe()
+        if not recipe:
+            return
+
+        load_mounts = None
+        if needs_mounts(recipe):
+            gamefolder = self.ask_directory("Absolute path to game folder (eg C:/Program Files (x86)/Steam/steamapps/common/GarrysMod)")
+            if not gamefolder or not os.path.exists(os.path.join(gamefolder, "gmod.exe")):
+                QtWidgets.QMessageBox.warning(self, "Invalid game folder", "The selected folder doesn't contain gmod.exe")
+                return
+            load_mounts = self.ask_mount_set(gamefolder, exclude=folder)
+
+        def task():
+            from pipeline.optimize_all import run_pipeline
+            mounts = load_mounts() if load_mounts else None
+            return run_pipeline(folder, recipe, mounts, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+
+        self.start_task("Optimize all", task, determinate=True)
+
+    def on_watch_folder(self):
+        folder = self.ensure_folder()
+        if not folder:
+            return
+        dialog = PipelineDialog(self)
+        if dialog.exec() != QtWidgets.QDialog.Accepted:
+            return
+        recipe = dialog.recipe()
+        if not recipe:
+            return
+
+        def task():
+            from pipeline.watch import watch_folder
+            return watch_folder(folder, recipe, cancel_token=self.cancel_token)
+
+        self.start_task("Watch folder", task)
+
     def on_find_map_content(self):
         folder = self.ensure_folder()
         if not folder:
@@ -520,8 +1138,8 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "Invalid game folder", "The selected folder doesn't contain gmod.exe")
             return
 
-        map_file = self.ask_file("Select .bsp map file", "BSP files (*.bsp)")
-        if not map_file or not map_file.endswith(".bsp"):
+        map_files = [path for path in self.ask_files("Select .bsp map file(s)", "BSP files (*.bsp)") if path.endswith(".bsp")]
+        if not map_files:
             QtWidgets.QMessageBox.warning(self, "Invalid map file", "Please select a valid .bsp file.")
             return
         dest_folder = self.ask_directory("Folder to copy found content to (will be created if it doesn't exist)")
@@ -529,7 +1147,90 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "Invalid destination", "Please select a destination folder.")
             return
         os.makedirs(dest_folder, exist_ok=True)
-        self.start_task("Find/copy content used by map", find_map_content, folder, gamefolder, dest_folder, map_file)
+        load_mounts = self.ask_mount_set(gamefolder, exclude=folder)
+        hardlinks = self.ask_yes_no("Hardlink files?", "Hardlink files instead of copying them when possible?\nThis is much faster on the same drive, but editing the copied files later also edits the originals.")
+        if len(map_files) == 1:
+            def task():
+                from mapping.find_map_content import find_map_content
+                return find_map_content(folder, load_mounts(), dest_folder, map_files[0], hardlinks=hardlinks,
+                                        cancel_token=self.cancel_token)
+
+            self.start_task("Find/copy content used by map", task)
+            return
+
+        def task():
+            from mapping.find_map_content import find_maps_content
+            return find_maps_content(folder, load_mounts(), dest_folder, map_files, hardlinks=hardlinks,
+                                     progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+
+        self.start_task(f"Find/copy content used by {len(map_files)} maps", task, determinate=True)
+
+    def on_optimize_pakfile(self):
+        map_files = [path for path in self.ask_files("Select .bsp map file(s)", "BSP files (*.bsp)") if path.endswith(".bsp")]
+        if not map_files:
+            QtWidgets.QMessageBox.warning(self, "Invalid map file", "Please select a valid .bsp file.")
+            return
+        size = self.ask_int("Clamp embedded textures", "Clamp size (pixels)", default=1024)
+        if size is None:
+            return
+        load_mounts = None
+        if self.ask_yes_no("Drop game files?", "Drop embedded files that are already provided by the game?"):
+            gamefolder = self.ask_directory("Absolute path to game folder (eg C:/Program Files (x86)/Steam/steamapps/common/GarrysMod)")
+            if not gamefolder or not os.path.exists(os.path.join(gamefolder, "gmod.exe")):
+                QtWidgets.QMessageBox.warning(self, "Invalid game folder", "The selected folder doesn't contain gmod.exe")
+                return
+            load_mounts = self.ask_mount_set(gamefolder)
+        trim_sounds = self.ask_yes_no("Trim sounds?", "Trim silence from the end of embedded sounds?")
+
+        def task():
+            from mapping.optimize_pakfile import optimize_pakfile
+            mounts = load_mounts() if load_mounts else None
+            saved = 0
+            count = 0
+            for map_file in map_files:
+                self.cancel_token.check()
+                map_saved, map_count = optimize_pakfile(map_file, mounts, int(size), trim_sounds,
+                                                        progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+                saved += map_saved
+                count += map_count
+            return saved, count
+
+        # Runs on the selected maps, not on the content folder
+        self.pending_gma = None
+        self.start_task("Optimize .bsp pakfile", task, determinate=True)
+
+    def on_compress_lumps(self):
+        map_files = [path for path in self.ask_files("Select .bsp map file(s)", "BSP files (*.bsp)") if path.endswith(".bsp")]
+        if not map_files:
+            QtWidgets.QMessageBox.warning(self, "Invalid map file", "Please select a valid .bsp file.")
+            return
+        decompress = self.ask_yes_no("Decompress?", "Decompress the maps instead?\nChoose No to compress them.")
+        compress_pakfile = False
+        if not decompress:
+            compress_pakfile = self.ask_yes_no("Compress pakfile?", "Also LZMA compress the files embedded in the pakfile?\nOnly do this if the game supports LZMA compressed pakfile entries.")
+
+        def task():
+            from mapping.compress_lumps import compress_bsp_lumps
+            return compress_bsp_lumps(map_files, decompress, compress_pakfile, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+
+        # Runs on the selected maps, not on the content folder
+        self.pending_gma = None
+        self.start_task("Decompress .bsp lumps" if decompress else "Compress .bsp lumps", task, determinate=True)
+
+    def on_export_fastdl(self):
+        folder = self.ensure_folder()
+        if not folder:
+            return
+        fastdl_folder = self.ask_directory("FastDL folder to export to (will be created if it doesn't exist)")
+        if not fastdl_folder:
+            QtWidgets.QMessageBox.warning(self, "Invalid destination", "Please select a FastDL folder.")
+            return
+
+        def task():
+            from fastdl.export_fastdl import export_fastdl
+            return export_fastdl(folder, fastdl_folder, progress_callback=self.worker.progress.emit, cancel_token=self.cancel_token)
+
+        self.start_task("Export FastDL", task, determinate=True)
 
     def on_resave_vtf(self):
         folder = self.ensure_folder()
@@ -539,6 +1240,7 @@ class MainWindow(QtWidgets.QMainWindow):
         def task():
             count = 0
             for root, _, files in os.walk(folder):
+                self.cancel_token.check()
                 for filename in files:
                     if filename.lower().endswith(".vtf"):
                         file_path = os.path.join(root, filename)
@@ -567,6 +1269,8 @@ def main():
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    if PREWARM_IMPORTS:
+        QtCore.QTimer.singleShot(PREWARM_DELAY_MS, prewarm_imports)
     sys.exit(app.exec())
 
 
@@ -0,0 +1,173 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from zipfile import ZIP_LZMA, ZIP_STORED, ZipFile, ZipInfo
+
+from srctools.bsp import BSP, BSP_LUMPS
+
+from utils import events
+from utils.cancel import is_cancelled
+from utils.formatting import format_size
+
+# Compressing tiny lumps costs more in LZMA headers than it saves
+MIN_LUMP_SIZE = 4096
+
+# The pakfile can't be LZMA compressed as a lump, only its entries can. The game lump is just
+# a directory, its sub-lumps are compressed individually.
+SKIPPED_LUMPS = (BSP_LUMPS.PAKFILE, BSP_LUMPS.GAME_LUMP)
+
+
+def _repack_pakfile(bsp: BSP, compress_type: int) -> int:
+    """Rewrite the pakfile with every entry using compress_type, returns how many entries changed."""
+    pakfile = bsp.pakfile
+    infos = [info for info in pakfile.infolist() if info.compress_type != compress_type]
+    if not infos:
+        return 0
+    new_pakfile = ZipFile(BytesIO(), mode="a")
+    new_pakfile.filename = pakfile.filename
+    for info in pakfile.infolist():
+        new_info = ZipInfo(info.filename, info.date_time)
+        new_info.compress_type = compress_type
+        new_info.external_attr = info.external_attr
+        new_pakfile.writestr(new_info, pakfile.read(info.filename))
+    bsp.pakfile = new_pakfile
+    return len(infos)
+
+
+def _verify(tmp_path: str, lumps: dict, game_lumps: dict, pak_names: list | None):
+    """Re-open the written BSP and check every lump decompresses to the original data."""
+    bsp = BSP(tmp_path)
+    for lump_type, data in lumps.items():
+        if bsp.lumps[lump_type].data != data:
+            raise ValueError(f"Lump {lump_type.name} doesn't match after writing")
+    for lump_id, data in game_lumps.items():
+        if bsp.game_lumps[lump_id].data != data:
+            raise ValueError(f"Game lump {lump_id!r} doesn't match after writing")
+    if pak_names is not None:
+        pakfile = bsp.pakfile
+        if pakfile.namelist() != pak_names or pakfile.testzip() is not None:
+            raise ValueError("Pakfile doesn't match after writing")
+
+
+def process_bsp(bsp_path: str, decompress: bool = False, compress_pakfile: bool = False) -> dict:
+    """
+    Compress (or decompress) the lumps of a single BSP in place.
+
+    The result is written next to the map first and only replaces it once it re-opens with
+    identical lump data. Runs in a worker process, so it reports through the returned dict
+    instead of printing.
+    """
+    start_time = time.time()
+    result = {"path": bsp_path, "old_size": os.path.getsize(bsp_path), "new_size": None, "changed": 0, "error": None,
+              "duration": 0.0}
+    try:
+        bsp = BSP(bsp_path)
+        changed = 0
+        for lump_type, lump in bsp.lumps.items():
+            if lump_type in SKIPPED_LUMPS:
+                continue
+            compress = not decompress and (lump.is_compressed or len(lump.data) >= MIN_LUMP_SIZE)
+            if lump.is_compressed != compress:
+                lump.is_compressed = compress
+                changed += 1
+        for game_lump in bsp.game_lumps.values():
+            compress = not decompress and (game_lump.is_compressed or len(game_lump.data) >= MIN_LUMP_SIZE)
+            if game_lump.is_compressed != compress:
+                game_lump.is_compressed = compress
+                changed += 1
+
+        pak_names = None
+        if decompress or compress_pakfile:
+            changed += _repack_pakfile(bsp, ZIP_STORED if decompress else ZIP_LZMA)
+            pak_names = bsp.pakfile.namelist()
+
+        if not changed:
+            result["new_size"] = result["old_size"]
+            result["duration"] = time.time() - start_time
+            return result
+
+        lumps = {lump_type: lump.data for lump_type, lump in bsp.lumps.items() if lump_type not in SKIPPED_LUMPS}
+        game_lumps = {lump_id: game_lump.data for lump_id, game_lump in bsp.game_lumps.items()}
+        tmp_path = bsp_path + ".tmp"
+        try:
+            bsp.save(tmp_path)
+            _verify(tmp_path, lumps, game_lumps, pak_names)
+            os.replace(tmp_path, bsp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        result["changed"] = changed
+        result["new_size"] = os.path.getsize(bsp_path)
+    except Exception as e:
+        result["error"] = str(e)
+    result["duration"] = time.time() - start_time
+    return result
+
+
+def compress_bsp_lumps(map_files: list[str], decompress: bool = False, compress_pakfile: bool = False,
+                       max_workers: int | None = None, progress_callback=None, cancel_token=None):
+    """
+    LZMA compress the lumps of one or many BSPs, or decompress them again.
+
+    Source 2013 branch games read LZMA compressed lumps, which makes maps considerably smaller
+    to download. Maps that have to stay editable (eg decompiled or opened in Hammer++) should
+    be decompressed first. Maps are processed on a process pool, LZMA is CPU bound.
+
+    Args:
+        map_files: Paths to the .bsp map files
+        decompress: Decompress all lumps and pakfile entries instead
+        compress_pakfile: Also LZMA compress the entries of the pakfile. Only for games that support it.
+        max_workers: Number of worker processes, defaults to the executor default
+        progress_callback: Optional callback(current, total) for progress updates
+        cancel_token: Optional CancelToken. Once it's cancelled maps that haven't started are skipped,
+            maps that are being processed are finished.
+
+    Returns:
+        (bytes saved, maps changed)
+    """
+    start_time = time.time()
+    map_files = [map_file for map_file in map_files if map_file.lower().endswith(".bsp") and os.path.exists(map_file)]
+    print(f"{'Decompressing' if decompress else 'Compressing'} lumps of {len(map_files)} maps...")
+
+    old_total = 0
+    new_total = 0
+    changed_count = 0
+    total = len(map_files)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process_bsp, map_file, decompress, compress_pakfile) for map_file in map_files]
+        for idx, future in enumerate(as_completed(futures), 1):
+            if is_cancelled(cancel_token):
+                for pending in futures:
+                    pending.cancel()
+            if future.cancelled():
+                continue
+            result = future.result()
+            name = os.path.basename(result["path"])
+            if result["error"] is not None:
+                print(f"✗ {name} - {result['error']}, left untouched")
+                events.file_finished(result["path"], events.FAILED, result["old_size"], result["old_size"],
+                                     result["duration"], result["error"])
+                if progress_callback:
+                    progress_callback(idx, total)
+                continue
+            action = ("decompressed" if decompress else events.COMPRESSED) if result["changed"] else events.SKIPPED
+            events.file_finished(result["path"], action, result["old_size"], result["new_size"], result["duration"])
+            if result["changed"]:
+                changed_count += 1
+                old_total += result["old_size"]
+                new_total += result["new_size"]
+                print(f"✓ {name} - {format_size(result['old_size'])} → {format_size(result['new_size'])} "
+                      f"({result['changed']} lumps/entries changed)")
+            else:
+                print(f"{name} - nothing to change")
+            if progress_callback:
+                progress_callback(idx, total)
+
+    print("="*60)
+    print(f"Changed {changed_count} of {total} maps.")
+    if changed_count:
+        print(f"Total size: {format_size(old_total)} → {format_size(new_total)}")
+    print(f"Time taken: {round(time.time() - start_time, 2)} seconds")
+    print("="*60)
+    return old_total - new_total, changed_count
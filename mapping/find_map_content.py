@@ -1,45 +1,133 @@
-import shutil
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from srctools.bsp import BSP
 from srctools.filesys import FileSystemChain, RawFileSystem
 from srctools.packlist import PackList
-from utils.vpk import get_vpk_files
+from utils import tracing
+from utils.cache import write_atomic
+from utils.cancel import check, is_cancelled
+from utils.filesystem import MountedFileSystem
+from utils.fastcopy import copy_files
+from utils.mounts import MountSet
 
-def get_required_files_from_bsp(content_folder: str, bsp_path: str):
-    """Return a list of all resource files needed for a given BSP map."""
+def build_content_filesystem(content_folder: str, mounts: MountSet | None = None) -> FileSystemChain:
+    """Filesystem with the loose content folder first and the mounted game content after it."""
+    fsys = FileSystemChain()
+    fsys.add_sys(RawFileSystem(content_folder))
+    if mounts is not None:
+        fsys.add_sys(MountedFileSystem(mounts))
+    return fsys
+
+def get_required_files_from_bsp(content_folder: str, bsp_path: str, mounts: MountSet | None = None,
+                                fsys: FileSystemChain | None = None):
+    """
+    Return a list of all resource files needed for a given BSP map.
+
+    If mounted game content is given it's chained after the content folder, so
+    dependencies (textures used by models, materials included by patch materials,
+    etc.) can be resolved for files that live in the game's VPKs too. An existing
+    filesystem from build_content_filesystem can be passed to share it between maps.
+    """
     # 1. Open the BSP
     print(f"Loading BSP file: {bsp_path}")
-    bsp = BSP(bsp_path)
+    with tracing.span("bsp.load"):
+        bsp = BSP(bsp_path)
     print("BSP loaded successfully.")
     
     # 2. Set up the filesystem
-    fsys = FileSystemChain([])
-    fsys.add_sys(RawFileSystem(content_folder))
+    if fsys is None:
+        fsys = build_content_filesystem(content_folder, mounts)
     
     # 3. Create a PackList
     pack = PackList(fsys)
     
     # 4. Automatically gather all resources used by the BSP
     print("Gathering resources from BSP...")
-    pack.pack_from_bsp(bsp)
+    with tracing.span("packlist.from_bsp"):
+        pack.pack_from_bsp(bsp)
     print("Resources gathered.")
 
-    # 5. Evaluate dependencies (textures used by models, etc.), would need a VPK filesystem to do this properly
-    # print("Evaluating dependencies...")
-    # pack.eval_dependencies()
-    # print("Dependencies evaluated.")
+    # 5. Evaluate dependencies (textures used by models, etc.), needs the mounted VPKs to do this properly
+    if mounts is not None:
+        print("Evaluating dependencies...")
+        # Parses the MDLs, VMTs etc. the map uses
+        with tracing.span("packlist.dependencies"):
+            pack.eval_dependencies()
+        print("Dependencies evaluated.")
     
     # 5. Return all filenames
     return list(pack.filenames())
 
-def find_map_content(all_content_folder: str, gamefolder:str, new_content_folder: str, map_file: str):
+def normalize_required_path(file_rel_path: str, map_base: str) -> str:
+    """Map a path from the PackList to where the file is actually stored in the content folder."""
+    # Normalize the relative path to use correct separators
+    norm_rel_path = os.path.normpath(file_rel_path)
+
+    # Fix lightmapped materials "materials\nature\water_wasteland002c_-7431_10685_225.vmt" -> "materials\nature\water_wasteland002c.vmt"
+    if "_-" in norm_rel_path:
+        parts = norm_rel_path.split("_-", 1)
+        if parts[1].endswith(".vmt"):
+            norm_rel_path = parts[0] + ".vmt"
+        if parts[1].endswith(".vtf"):
+            norm_rel_path = parts[0] + ".vtf"
+
+    # Fix decals path, files starting with /decals/ are always stored in materials/decals/
+    if norm_rel_path.startswith(os.path.normpath("decals/")):
+        norm_rel_path = os.path.normpath("materials/" + norm_rel_path)
+
+    # Generalize: remove 'maps/<mapname>/' from any path segment
+    maps_segment = os.path.normpath(f"maps/{map_base}/")
+    if maps_segment in norm_rel_path:
+        parts = norm_rel_path.split(maps_segment, 1)
+        norm_rel_path = os.path.normpath(parts[0] + parts[1])
+
+    return norm_rel_path
+
+def collect_content(required_files, map_base: str, vpk_files, all_content_folder: str, new_content_folder: str):
+    """
+    Work out which required files need to be copied for a map.
+
+    Returns:
+        (dict of destination path -> source path, sorted relative paths the map needs, missing relative paths)
+    """
+    to_copy = {}
+    needed = set()
+    missing = set()
+    for file_rel_path in required_files:
+        norm_rel_path = normalize_required_path(file_rel_path, map_base)
+
+        if norm_rel_path in vpk_files:
+            continue
+
+        src_path = os.path.normpath(os.path.join(all_content_folder, norm_rel_path))
+        dest_path = os.path.normpath(os.path.join(new_content_folder, norm_rel_path))
+
+        if os.path.exists(src_path):
+            to_copy[dest_path] = src_path
+            needed.add(norm_rel_path.replace("\\", "/"))
+        else:
+            missing.add(norm_rel_path.replace("\\", "/"))
+    return to_copy, sorted(needed), sorted(missing)
+
+def find_map_content(all_content_folder: str, gamefolder:str, new_content_folder: str, map_file: str,
+                     hardlinks: bool = False, max_workers: int | None = None, cancel_token=None):
     """
     Find and copy all content used by a Source engine map file.
+
+    Files that are already up to date in the destination are skipped, the rest is
+    reflinked or hardlinked when the filesystem supports it, or copied, on a thread pool.
     
     Args:
         all_content_folder: Path to folder containing all content (materials, models, sounds, etc.)
+        gamefolder: Path to the game folder containing VPK files, or a MountSet of mounted content
         new_content_folder: Path to folder where found content should be copied
         map_file: Path to the .bsp map file to analyze
+        hardlinks: Hardlink files instead of copying them when possible. Editing a hardlinked
+            file also edits the original in the content folder.
+        max_workers: Number of copy threads, defaults to the executor default
+        cancel_token: Optional CancelToken, raises Cancelled once it's cancelled. Files copied so far are complete.
     """
     print(f"Finding content for map: {map_file}")
     print("="*60)
@@ -57,50 +145,108 @@ def find_map_content(all_content_folder: str, gamefolder:str, new_content_folder
         return
         
     print("Analyzing map file for used content...")
-    required_files = get_required_files_from_bsp(all_content_folder, map_file)
+    mounts = gamefolder if isinstance(gamefolder, MountSet) else MountSet.from_gamefolder(gamefolder)
+    required_files = get_required_files_from_bsp(all_content_folder, map_file, mounts)
     print(f"Total files needed: {len(required_files)}")
+    check(cancel_token)
     
-    # Get all files from VPK archives in the game folder
-    vpk_files = get_vpk_files(gamefolder)
+    # Get all files from the mounted game content, these don't need to be copied
+    vpk_files = mounts.build()
 
-    # Copy the required files to the new content folder
-    total_size = 0
+    # Collect the required files that need to be in the new content folder
     map_base = os.path.splitext(os.path.basename(map_file))[0]
-    for file_rel_path in required_files:
-        # Normalize the relative path to use correct separators
-        norm_rel_path = os.path.normpath(file_rel_path)
-
-        # Fix lightmapped materials "materials\nature\water_wasteland002c_-7431_10685_225.vmt" -> "materials\nature\water_wasteland002c.vmt"
-        if "_-" in norm_rel_path:
-            parts = norm_rel_path.split("_-", 1)
-            if parts[1].endswith(".vmt"):
-                norm_rel_path = parts[0] + ".vmt"
-            if parts[1].endswith(".vtf"):
-                norm_rel_path = parts[0] + ".vtf"
-
-        # Fix decals path, files starting with /decals/ are always stored in materials/decals/
-        if norm_rel_path.startswith(os.path.normpath("decals/")):
-            norm_rel_path = os.path.normpath("materials/" + norm_rel_path)
-
-        # Generalize: remove 'maps/<mapname>/' from any path segment
-        maps_segment = os.path.normpath(f"maps/{map_base}/")
-        if maps_segment in norm_rel_path:
-            parts = norm_rel_path.split(maps_segment, 1)
-            norm_rel_path = os.path.normpath(parts[0] + parts[1])
+    to_copy, _, missing = collect_content(required_files, map_base, vpk_files, all_content_folder, new_content_folder)
+    for norm_rel_path in missing:
+        print(f"Warning: Required file not found: {norm_rel_path}")
+    total_size = sum(os.path.getsize(src_path) for src_path in to_copy.values())
 
-        if norm_rel_path in vpk_files:
-            continue
+    # Copy them, skipping files that are already up to date
+    results = copy_files(((src, dest) for dest, src in to_copy.items()), hardlinks, max_workers, cancel_token=cancel_token)
+    
+    print("="*60)
+    print(f"Content copying complete. Total size: {total_size / (1024*1024):.2f} MB Total files: {len(to_copy)}")
+    print(f"Up to date: {results['skipped']}, reflinked: {results['reflinked']}, hardlinked: {results['linked']}, "
+          f"copied: {results['copied']}, failed: {results['failed']}")
+    print(f"Files copied to: {new_content_folder}")
+    return total_size, len(to_copy)
 
-        src_path = os.path.normpath(os.path.join(all_content_folder, norm_rel_path))
-        dest_path = os.path.normpath(os.path.join(new_content_folder, norm_rel_path))
+def find_maps_content(all_content_folder: str, gamefolder, new_content_folder: str, map_files: list[str],
+                      hardlinks: bool = False, max_workers: int | None = None, progress_callback=None,
+                      manifest_path: str | None = None, cancel_token=None):
+    """
+    Find and copy the content used by many maps (eg a map rotation) into one content pack.
 
-        if os.path.exists(src_path):
-            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-            shutil.copy2(src_path, dest_path)
-            total_size += os.path.getsize(dest_path)
-        else:
-            print(f"Warning: Required file not found: {norm_rel_path}")
-    
+    All maps share one mounted content index and one content filesystem and are analyzed
+    in parallel. The union of their content is copied once, and a manifest records what
+    each map needs.
+
+    Args:
+        all_content_folder: Path to folder containing all content (materials, models, sounds, etc.)
+        gamefolder: Path to the game folder containing VPK files, or a MountSet of mounted content
+        new_content_folder: Path to folder where found content should be copied
+        map_files: Paths to the .bsp map files to analyze
+        hardlinks: Hardlink files instead of copying them when possible
+        max_workers: Number of analysis and copy threads, defaults to the executor default
+        progress_callback: Optional callback(current, total) for progress updates
+        manifest_path: Where to write the per-map manifest (JSON), defaults to
+            "<new_content_folder>_manifest.json" next to the content folder
+        cancel_token: Optional CancelToken, raises Cancelled once it's cancelled
+    """
+    start_time = time.time()
+    map_files = [map_file for map_file in map_files if map_file.lower().endswith(".bsp") and os.path.exists(map_file)]
+    if not map_files:
+        print("Error: No existing .bsp files given.")
+        return 0, 0
+    if not os.path.exists(all_content_folder):
+        print(f"Error: Source content folder does not exist: {all_content_folder}")
+        return 0, 0
+
+    print(f"Finding content for {len(map_files)} maps")
     print("="*60)
-    print(f"Content copying complete. Total size: {total_size / (1024*1024):.2f} MB Total files copied: {len(required_files)}")
+    mounts = gamefolder if isinstance(gamefolder, MountSet) else MountSet.from_gamefolder(gamefolder)
+    vpk_files = mounts.build()
+    fsys = build_content_filesystem(all_content_folder, mounts)
+
+    def analyze(map_file):
+        if is_cancelled(cancel_token):
+            return None
+        try:
+            return get_required_files_from_bsp(all_content_folder, map_file, mounts, fsys)
+        except Exception as e:
+            print(f"Error analyzing {map_file}: {e}")
+            return None
+
+    to_copy = {}
+    manifest = {}
+    total = len(map_files)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for idx, (map_file, required_files) in enumerate(zip(map_files, executor.map(analyze, map_files)), 1):
+            if progress_callback:
+                progress_callback(idx, total)
+            if required_files is None:
+                continue
+            map_base = os.path.splitext(os.path.basename(map_file))[0]
+            map_copy, needed, missing = collect_content(required_files, map_base, vpk_files, all_content_folder, new_content_folder)
+            to_copy.update(map_copy)
+            map_size = sum(os.path.getsize(src_path) for src_path in map_copy.values())
+            manifest[map_base] = {"size": map_size, "files": needed, "missing": missing}
+            print(f"{map_base}: {len(needed)} files ({map_size / (1024*1024):.2f} MB), {len(missing)} missing")
+    check(cancel_token)
+
+    results = copy_files(((src, dest) for dest, src in to_copy.items()), hardlinks, max_workers, cancel_token=cancel_token)
+    total_size = sum(os.path.getsize(src_path) for src_path in to_copy.values())
+
+    if manifest_path is None:
+        manifest_path = os.path.normpath(new_content_folder) + "_manifest.json"
+    write_atomic(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+
+    print("="*60)
+    print(f"Content copying complete. Total size: {total_size / (1024*1024):.2f} MB Total files: {len(to_copy)} "
+          f"(for {len(manifest)} maps)")
+    print(f"Up to date: {results['skipped']}, reflinked: {results['reflinked']}, hardlinked: {results['linked']}, "
+          f"copied: {results['copied']}, failed: {results['failed']}")
     print(f"Files copied to: {new_content_folder}")
+    print(f"Per-map manifest written to: {manifest_path}")
+    print(f"Time taken: {round(time.time() - start_time, 2)} seconds")
+    print("="*60)
+    return total_size, len(to_copy)
@@ -0,0 +1,191 @@
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from io import BytesIO
+from zipfile import ZipFile, ZipInfo
+
+from srctools.bsp import BSP, BSP_LUMPS
+
+from material_compression.resize_and_compress import resize_and_compress
+from material_compression.resize_png import clamp_pngs
+from sound_compression.trim_empty import trim_empty_audio
+from utils import events
+from utils.cancel import check
+from utils.formatting import format_size
+from utils.hashing import crc32_file
+from utils.mounts import MountSet
+from utils.vpk import normalize_path
+
+TEXTURES = "textures"
+IMAGES = "images"
+SOUNDS = "sounds"
+GAME_CONTENT = "game content"
+OTHER = "other"
+
+CATEGORIES = {
+    ".vtf": TEXTURES,
+    ".png": IMAGES,
+    ".wav": SOUNDS,
+    ".mp3": SOUNDS,
+    ".ogg": SOUNDS,
+}
+
+
+def _category(path: str) -> str:
+    return CATEGORIES.get(os.path.splitext(path)[1].lower(), OTHER)
+
+
+def _is_game_file(path: str, info: ZipInfo, vpk_files) -> bool:
+    """True if the mounted game content has this exact file, so the map doesn't need to carry it."""
+    entry = vpk_files.lookup(path)
+    if entry is None:
+        return False
+    crc, size, loose_root = entry
+    if size != info.file_size:
+        return False
+    if crc is None:
+        # Pakfile paths are often lowercase, read the loose copy by the path it has on disk
+        crc = crc32_file(os.path.join(loose_root, vpk_files.loose_path(path)))
+    return crc == info.CRC
+
+
+def optimize_pakfile(bsp_path: str, gamefolder=None, max_size: int = 1024, trim_sounds: bool = False,
+                     progress_callback=None, cancel_token=None):
+    """
+    Optimize the content embedded in a map's pakfile lump.
+
+    Embedded VTFs and PNGs go through the same optimizers as loose files (DXT conversion and
+    clamping to max_size), sounds are optionally trimmed, and entries the mounted game content
+    already provides with identical content are dropped. The pakfile is then repacked and the
+    BSP written back in place.
+
+    Cubemaps and patched materials that vbsp generates (materials/maps/<map>/) are left alone.
+
+    Args:
+        bsp_path: Path to the .bsp map file
+        gamefolder: Path to the game folder or a MountSet, entries it provides are dropped. None keeps them.
+        max_size: Textures and images larger than this (pixels) are resized
+        trim_sounds: Trim silence from the end of embedded sounds
+        progress_callback: Optional callback(current, total) for progress updates
+        cancel_token: Optional CancelToken, raises Cancelled before the BSP is written once it's cancelled
+
+    Returns:
+        (bytes saved, entries changed or dropped)
+    """
+    start_time = time.time()
+    print(f"Loading BSP file: {bsp_path}")
+    old_bsp_size = os.path.getsize(bsp_path)
+    compressed_before = events.measure(bsp_path)
+    bsp = BSP(bsp_path)
+    pakfile_size = len(bsp.lumps[BSP_LUMPS.PAKFILE].data)
+    pakfile = bsp.pakfile
+    infos = [info for info in pakfile.infolist() if not info.is_dir()]
+    print(f"Pakfile contains {len(infos)} files ({format_size(pakfile_size)})")
+
+    vpk_files = None
+    if gamefolder is not None:
+        mounts = gamefolder if isinstance(gamefolder, MountSet) else MountSet.from_gamefolder(gamefolder)
+        vpk_files = mounts.build()
+
+    map_base = os.path.splitext(os.path.basename(bsp_path))[0].lower()
+    generated_prefix = f"materials/maps/{map_base}/"
+
+    steps = 5 if trim_sounds else 4
+    old_sizes = Counter()
+    new_sizes = Counter()
+    counts = Counter()
+    dropped = set()
+    to_optimize = {}
+
+    for info in infos:
+        path = normalize_path(info.filename)
+        category = _category(path)
+        if vpk_files is not None and _is_game_file(path, info, vpk_files):
+            dropped.add(info.filename)
+            old_sizes[GAME_CONTENT] += info.file_size
+            counts[GAME_CONTENT] += 1
+            continue
+        old_sizes[category] += info.file_size
+        if category == OTHER or (category == SOUNDS and not trim_sounds) or path.startswith(generated_prefix):
+            new_sizes[category] += info.file_size
+            continue
+        to_optimize[info.filename] = path
+    if progress_callback:
+        progress_callback(1, steps)
+
+    workspace = tempfile.mkdtemp(prefix="pakfile_")
+    try:
+        # Run the embedded files through the loose file optimizers
+        for name, path in to_optimize.items():
+            dest = os.path.join(workspace, path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(dest, "wb") as f:
+                f.write(pakfile.read(name))
+
+        step = 1
+        optimizers = [
+            lambda: resize_and_compress(workspace, max_size, cancel_token=cancel_token),
+            lambda: clamp_pngs(workspace, max_size, cancel_token=cancel_token),
+        ]
+        if trim_sounds:
+            optimizers.append(lambda: trim_empty_audio(workspace, cancel_token=cancel_token))
+        for optimizer in optimizers:
+            optimizer()
+            check(cancel_token)
+            step += 1
+            if progress_callback:
+                progress_callback(step, steps)
+
+        # Repack, keeping the entry order and compression of the original pakfile
+        new_pakfile = ZipFile(BytesIO(), mode="a")
+        new_pakfile.filename = pakfile.filename
+        for info in infos:
+            if info.filename in dropped:
+                continue
+            data = pakfile.read(info.filename)
+            path = to_optimize.get(info.filename)
+            if path is not None:
+                with open(os.path.join(workspace, path), "rb") as f:
+                    optimized = f.read()
+                category = _category(path)
+                if len(optimized) < len(data):
+                    data = optimized
+                    counts[category] += 1
+                new_sizes[category] += len(data)
+            new_info = ZipInfo(info.filename, info.date_time)
+            new_info.compress_type = info.compress_type
+            new_info.external_attr = info.external_attr
+            new_pakfile.writestr(new_info, data)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    changed_count = sum(counts.values())
+    if changed_count:
+        bsp.pakfile = new_pakfile
+        bsp.save()
+    else:
+        new_pakfile.close()
+    if progress_callback:
+        progress_callback(steps, steps)
+
+    new_bsp_size = os.path.getsize(bsp_path)
+    compressed_after = events.measure(bsp_path) if compressed_before is not None else None
+    events.file_finished(bsp_path, "pakfile optimized" if changed_count else events.SKIPPED, old_bsp_size, new_bsp_size,
+                         time.time() - start_time, compressed_before=compressed_before, compressed_after=compressed_after)
+    print("="*60)
+    print(f"Pakfile of {os.path.basename(bsp_path)}:")
+    for category in (TEXTURES, IMAGES, SOUNDS, GAME_CONTENT, OTHER):
+        if not old_sizes[category]:
+            continue
+        saved = old_sizes[category] - new_sizes[category]
+        print(f"  {category}: {format_size(old_sizes[category])} → {format_size(new_sizes[category])} "
+              f"(saved {format_size(saved)}, {counts[category]} files {'dropped' if category == GAME_CONTENT else 'optimized'})")
+    if changed_count:
+        print(f"BSP size: {format_size(old_bsp_size)} → {format_size(new_bsp_size)}")
+    else:
+        print("Nothing to optimize, the BSP was left untouched.")
+    print(f"Time taken: {round(time.time() - start_time, 2)} seconds")
+    print("="*60)
+    return old_bsp_size - new_bsp_size, changed_count
@@ -1,13 +1,18 @@
 import os
 import time
 from sourcepp import vtfpp
+from utils import events, tracing
+from utils.cancel import is_cancelled
+from utils.manifest import Manifest
 
-def remove_mipmaps(folder, progress_callback=None):
+def remove_mipmaps(folder, progress_callback=None, cancel_token=None, files=None):
     """Remove mipmaps from all VTF files in the specified folder
     
     Args:
         folder: Path to the folder containing VTF files
         progress_callback: Optional callback(current, total) for progress updates
+        cancel_token: Optional CancelToken, remaining files are skipped once it's cancelled
+        files: Optional list of VTF paths to process instead of scanning the folder
     """
     old_size = 0
     new_size = 0
@@ -15,45 +20,60 @@ def remove_mipmaps(folder, progress_callback=None):
     success_count = 0
     start_time = time.time()
     
-    print(f"Scanning for VTF files in: {folder}")
-    
     # First, count total files for progress tracking
-    vtf_files = []
-    for root, dirs, files in os.walk(folder):
-        for filename in files:
-            if filename.endswith(".vtf"):
-                vtf_files.append(os.path.join(root, filename))
+    vtf_files = files
+    if vtf_files is None:
+        print(f"Scanning for VTF files in: {folder}")
+        vtf_files = []
+        for root, dirs, names in os.walk(folder):
+            for filename in names:
+                if filename.endswith(".vtf"):
+                    vtf_files.append(os.path.join(root, filename))
     
     total_files = len(vtf_files)
     print(f"Found {total_files} VTF files")
     print("Removing mipmaps from VTF files...")
     
-    for idx, file_path in enumerate(vtf_files, 1):
-        # Update progress
-        if progress_callback:
-            progress_callback(idx, total_files)
+    with Manifest(folder, "remove_mipmaps") as manifest:
+        for idx, file_path in enumerate(vtf_files, 1):
+            if is_cancelled(cancel_token):
+                print("Cancelled, skipping the remaining files.")
+                break
+
+            # Update progress
+            if progress_callback:
+                progress_callback(idx, total_files)
+            if manifest.is_processed(file_path):
+                continue
         
-        old_file_size = os.path.getsize(file_path)
-        old_size += old_file_size
+            old_file_size = os.path.getsize(file_path)
+            old_size += old_file_size
         
-        vtf = vtfpp.VTF(file_path)
-        old_mipcount = vtf.mip_count
-        if old_mipcount <= 1:
-            new_size += old_file_size
-            processed_count += 1
-            continue
+            with events.track(file_path, "mipmaps removed") as tracked:
+                with tracing.span("vtf.decode"):
+                    vtf = vtfpp.VTF(file_path)
+                old_mipcount = vtf.mip_count
+                if old_mipcount <= 1:
+                    tracked.action = events.SKIPPED
+                else:
+                    vtf.mip_count = 0
+                    with tracing.span("vtf.bake"):
+                        vtf.bake_to_file(file_path)
+            manifest.record(file_path, old_file_size)
+            if old_mipcount <= 1:
+                new_size += old_file_size
+                processed_count += 1
+                continue
         
-        vtf.mip_count = 0
-        vtf.bake_to_file(file_path)
+            success_count += 1
+            new_file_size = os.path.getsize(file_path)
+            new_size += new_file_size
+            saved_bytes = old_file_size - new_file_size
+            saved_mb = saved_bytes / (1024 * 1024)
+            print(f"✓ {file_path} - {old_mipcount} -> 0 (saved {saved_mb:.2f} MB)")
         
-        success_count += 1
-        new_file_size = os.path.getsize(file_path)
-        new_size += new_file_size
-        saved_bytes = old_file_size - new_file_size
-        saved_mb = saved_bytes / (1024 * 1024)
-        print(f"✓ {file_path} - {old_mipcount} -> 0 (saved {saved_mb:.2f} MB)")
-        
-        processed_count += 1
+            processed_count += 1
+        manifest.report()
     
     print("="*60)
     print(f"Files processed: {processed_count}")
@@ -1,40 +1,56 @@
 import os
 import time
 from material_compression.resizelib import cleanupVTF
+from utils import events, tracing
+from utils.cancel import is_cancelled
+from utils.manifest import Manifest
+from utils.output_cache import OutputCache
 
-def resize_and_compress(folder, size, progress_callback=None):
+def resize_and_compress(folder, size, progress_callback=None, cancel_token=None, files=None):
     old_size = 0
     new_size = 0
     replace_count = 0
     start_time = time.time()
 
-    # First pass: count total files
-    total_files = 0
-    if progress_callback:
-        for path, subdirs, files in os.walk(folder):
-            for name in files:
-                if name.endswith(".vtf"):
-                    total_files += 1
-        processed = 0
+    # Collect the files first so progress has a total, unless the caller already has them
+    if files is None:
+        files = []
+        with tracing.span("fs.walk", folder=folder):
+            for path, subdirs, names in os.walk(folder):
+                for name in names:
+                    if name.endswith(".vtf"):
+                        files.append(os.path.join(path, name))
+    total_files = len(files)
 
-    for path, subdirs, files in os.walk(folder):
-        for name in files:
-            if not name.endswith(".vtf"):
+    with Manifest(folder, "resize_and_compress", {"size": size}) as manifest, \
+            OutputCache("resize_and_compress", {"size": size}) as outputs:
+        for processed, filepath in enumerate(files, 1):
+            if is_cancelled(cancel_token):
+                print("Cancelled, skipping the remaining files.")
+                break
+            if manifest.is_processed(filepath):
+                if progress_callback:
+                    progress_callback(processed, total_files)
                 continue
 
-            old_size_temp = os.path.getsize(os.path.join(path, name))
-            converted = cleanupVTF(os.path.join(path, name), size)
+            old_size_temp = os.path.getsize(filepath)
+            with events.track(filepath, events.CONVERTED) as tracked:
+                converted = outputs.process(filepath, lambda: cleanupVTF(filepath, size))
+                if not converted:
+                    tracked.action = events.SKIPPED
+            manifest.record(filepath, old_size_temp)
             if converted:
                 replace_count += 1
-                new_size += os.path.getsize(os.path.join(path, name))
+                new_size += os.path.getsize(filepath)
                 old_size += old_size_temp
             else:
                 new_size += old_size_temp
                 old_size += old_size_temp
-            
+
             if progress_callback:
-                processed += 1
                 progress_callback(processed, total_files)
+        manifest.report()
+        outputs.report()
 
     print("="*60)
     print("Replaced", replace_count, "files.")
@@ -1,44 +1,62 @@
 import os
 from PIL import Image
+from utils import events
+from utils.cancel import is_cancelled
+from utils.manifest import Manifest
 
-def clamp_pngs(folder, max_size, progress_callback=None):
+def clamp_pngs(folder, max_size, progress_callback=None, cancel_token=None, files=None):
     total_size = 0
     total_resized = 0
     total_resized_files = 0
     total_files = 0
     
-    # First pass: count total PNG files
-    png_files = []
-    for path, subdirs, files in os.walk(folder):
-        for name in files:
-            if name.lower().endswith(".png"):
-                png_files.append(os.path.join(path, name))
+    # First pass: count total PNG files, unless the caller already has them
+    png_files = files
+    if png_files is None:
+        png_files = []
+        for path, subdirs, names in os.walk(folder):
+            for name in names:
+                if name.lower().endswith(".png"):
+                    png_files.append(os.path.join(path, name))
     
     total_png_count = len(png_files)
     processed = 0
 
-    for filepath in png_files:
-        total_files += 1
-        original_size = os.path.getsize(filepath)
-        total_size += original_size
-        image = Image.open(filepath)
-        w, h = image.size
-        if w > max_size or h > max_size:
-            maxd = max(w, h)
-            scale = max_size / maxd
-            neww = int(w * scale)
-            newh = int(h * scale)
-            image = image.resize((neww, newh), resample=Image.Resampling.LANCZOS)
-            image.save(filepath, quality=95)
-            total_resized += os.path.getsize(filepath)
-            total_resized_files += 1
-            print(f"Resized {filepath} from {w}x{h} to {neww}x{newh}")
-        else:
-            total_resized += original_size
+    with Manifest(folder, "clamp_pngs", {"size": max_size}) as manifest:
+        for filepath in png_files:
+            if is_cancelled(cancel_token):
+                print("Cancelled, skipping the remaining files.")
+                break
+            if manifest.is_processed(filepath):
+                processed += 1
+                if progress_callback:
+                    progress_callback(processed, total_png_count)
+                continue
+            total_files += 1
+            original_size = os.path.getsize(filepath)
+            total_size += original_size
+            with events.track(filepath, events.RESIZED) as tracked:
+                image = Image.open(filepath)
+                w, h = image.size
+                if w > max_size or h > max_size:
+                    maxd = max(w, h)
+                    scale = max_size / maxd
+                    neww = int(w * scale)
+                    newh = int(h * scale)
+                    image = image.resize((neww, newh), resample=Image.Resampling.LANCZOS)
+                    image.save(filepath, quality=95)
+                    total_resized += os.path.getsize(filepath)
+                    total_resized_files += 1
+                    print(f"Resized {filepath} from {w}x{h} to {neww}x{newh}")
+                else:
+                    total_resized += original_size
+                    tracked.action = events.SKIPPED
+            manifest.record(filepath, original_size)
         
-        if progress_callback:
-            processed += 1
-            progress_callback(processed, total_png_count)
+            if progress_callback:
+                processed += 1
+                progress_callback(processed, total_png_count)
+        manifest.report()
 
     total_saved_mb = round((total_size - total_resized) / 1000000, 2)
     print("="*60)
@@ -1,5 +1,6 @@
 from PIL import Image
 from sourcepp import vtfpp
+from utils import tracing
 
 def resizeVTFImage(vtf: vtfpp.VTF, path: str, max_size: int = 1024, best_format: vtfpp.ImageFormat = vtfpp.ImageFormat.DXT1) -> bool:
     w = vtf.width
@@ -15,8 +16,10 @@ def resizeVTFImage(vtf: vtfpp.VTF, path: str, max_size: int = 1024, best_format:
         newh *= scale
 
     if scale != 1:
-        vtf.set_size(int(neww), int(newh), vtfpp.ImageConversion.ResizeFilter.NICE)
-        vtf.bake_to_file(path)
+        with tracing.span("vtf.resize"):
+            vtf.set_size(int(neww), int(newh), vtfpp.ImageConversion.ResizeFilter.NICE)
+        with tracing.span("vtf.bake"):
+            vtf.bake_to_file(path)
         print(f"✓ {path} - resized from {w}x{h} to {int(neww)}x{int(newh)}")
         return True
     return False
@@ -26,11 +29,12 @@ def cleanupVTF(path: str, max_size: int = 9999) -> bool:
     if not path.endswith(".vtf"):
         return False
     
-    vtf = vtfpp.VTF(path)
+    with tracing.span("vtf.decode"):
+        vtf = vtfpp.VTF(path)
 
-    image_data = vtf.get_image_data_as_rgba8888(0)
-    image = Image.frombytes("RGBA", (vtf.width, vtf.height), image_data)
-    _, _, _, a = image.split()
+        image_data = vtf.get_image_data_as_rgba8888(0)
+        image = Image.frombytes("RGBA", (vtf.width, vtf.height), image_data)
+        _, _, _, a = image.split()
 
     best_format = vtfpp.ImageFormat.DXT1
     if a.getextrema()[0] < 255:
@@ -38,13 +42,15 @@ def cleanupVTF(path: str, max_size: int = 9999) -> bool:
 
     format_changed = False
     if vtf.format != best_format:
-        vtf.set_format(best_format)
+        with tracing.span("vtf.encode", format=best_format.name):
+            vtf.set_format(best_format)
         format_changed = True
 
     if vtf.frame_count > 1:
         print("Skipping", path, "because it has multiple frames.")
         if format_changed:
-            vtf.bake_to_file(path)
+            with tracing.span("vtf.bake"):
+                vtf.bake_to_file(path)
             return True
         return False
 
@@ -52,7 +58,8 @@ def cleanupVTF(path: str, max_size: int = 9999) -> bool:
         return resizeVTFImage(vtf, path, max_size, best_format)
 
     if format_changed:
-        vtf.bake_to_file(path)
+        with tracing.span("vtf.bake"):
+            vtf.bake_to_file(path)
         return True
 
     return False
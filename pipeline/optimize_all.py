@@ -0,0 +1,393 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+
+from utils import events, tracing
+from utils.addons import walk_files
+from utils.cache import get_config_dir, write_atomic
+from utils.cancel import Cancelled, is_cancelled
+from utils.events import EventStats, StatsSink
+from utils.formatting import format_size
+
+# Lanes: cleanup stages add or remove files anywhere and run on their own, texture and audio
+# stages work on disjoint files so a run of them is split into two lanes that run side by side.
+CLEANUP = "cleanup"
+TEXTURES = "textures"
+AUDIO = "audio"
+
+# Stage outcomes in the report
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+NOT_RUN = "not run"
+
+
+class FileIndex:
+    """
+    Files below a folder grouped by extension, walked once and shared between stages.
+
+    Stages that add or remove files invalidate it, the next stage that needs files walks
+    the folder again.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._by_extension: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def files(self, extensions: tuple[str, ...]) -> List[str]:
+        with self._lock:
+            if self._by_extension is None:
+                by_extension = {}
+                with tracing.span("fs.walk", folder=self.folder):
+                    for rel_path, _ in walk_files(self.folder):
+                        extension = os.path.splitext(rel_path)[1].lower()
+                        by_extension.setdefault(extension, []).append(os.path.join(self.folder, rel_path))
+                self._by_extension = by_extension
+            return [path for extension in extensions for path in self._by_extension.get(extension, [])]
+
+    def invalidate(self):
+        with self._lock:
+            self._by_extension = None
+
+
+class PipelineContext(NamedTuple):
+    folder: str
+    mounts: object
+    cancel_token: object
+    # Text files that can reference converted sounds, None to search the whole folder
+    reference_files: Optional[List[str]] = None
+
+
+class Stage(NamedTuple):
+    label: str
+    lane: str
+    # Extensions of the files the stage gets from the shared index, None if it finds its own
+    extensions: Optional[tuple[str, ...]]
+    # Adds or removes files, so the index has to be walked again afterwards
+    changes_files: bool
+    run: Callable
+    # Option name -> type of the options a step of this stage accepts
+    options: Optional[dict] = None
+
+
+class StageResult(NamedTuple):
+    name: str
+    label: str
+    status: str
+    saved: int = 0
+    count: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+
+# Operations are imported when a stage runs, so listing stages and presets stays cheap
+def _unused_model_formats(ctx, options, files):
+    from unused_files.modelformats import unused_model_formats
+    return unused_model_formats(ctx.folder, True, cancel_token=ctx.cancel_token, files=files)
+
+
+def _remove_game_files(ctx, options, files):
+    from unused_files.remove_game_files import remove_game_files
+    return remove_game_files(ctx.folder, ctx.mounts, True, cancel_token=ctx.cancel_token)
+
+
+def _textures(ctx, options, files):
+    from material_compression.resize_and_compress import resize_and_compress
+    return resize_and_compress(ctx.folder, int(options.get("size", 1024)), cancel_token=ctx.cancel_token, files=files)
+
+
+def _mipmaps(ctx, options, files):
+    from material_compression.remove_mipmaps import remove_mipmaps
+    return remove_mipmaps(ctx.folder, cancel_token=ctx.cancel_token, files=files)
+
+
+def _pngs(ctx, options, files):
+    from material_compression.resize_png import clamp_pngs
+    return clamp_pngs(ctx.folder, int(options.get("size", 512)), cancel_token=ctx.cancel_token, files=files)
+
+
+def _wav_to_ogg(ctx, options, files):
+    from sound_compression.wav_to_ogg import wav_to_ogg
+    return wav_to_ogg(ctx.folder, cancel_token=ctx.cancel_token, files=files, reference_files=ctx.reference_files)
+
+
+def _wav_to_mp3(ctx, options, files):
+    from sound_compression.wav_to_mp3 import wav_to_mp3
+    return wav_to_mp3(ctx.folder, cancel_token=ctx.cancel_token, files=files, reference_files=ctx.reference_files)
+
+
+def _mp3_to_ogg(ctx, options, files):
+    from sound_compression.mp3_to_ogg import mp3_to_ogg
+    return mp3_to_ogg(ctx.folder, cancel_token=ctx.cancel_token, files=files, reference_files=ctx.reference_files)
+
+
+def _trim_audio(ctx, options, files):
+    from sound_compression.trim_empty import trim_empty_audio
+    return trim_empty_audio(ctx.folder, cancel_token=ctx.cancel_token, files=files)
+
+
+STAGES = {
+    "unused_model_formats": Stage("Remove unused model formats", CLEANUP, (".vtx",), True, _unused_model_formats),
+    "remove_game_files": Stage("Remove files already in game", CLEANUP, None, True, _remove_game_files),
+    "textures": Stage("Clamp VTFs and use DXT", TEXTURES, (".vtf",), False, _textures, {"size": int}),
+    "mipmaps": Stage("Remove mipmaps", TEXTURES, (".vtf",), False, _mipmaps),
+    "pngs": Stage("Clamp PNGs", TEXTURES, (".png",), False, _pngs, {"size": int}),
+    "wav_to_ogg": Stage(".wav to .ogg", AUDIO, (".wav",), True, _wav_to_ogg),
+    "wav_to_mp3": Stage(".wav to .mp3", AUDIO, (".wav",), True, _wav_to_mp3),
+    "mp3_to_ogg": Stage(".mp3 to .ogg", AUDIO, (".mp3",), True, _mp3_to_ogg),
+    "trim_audio": Stage("Trim empty audio tails", AUDIO, (".wav", ".mp3", ".ogg"), False, _trim_audio),
+}
+
+# Recipes are lists of steps, a step is a stage name plus its options
+STANDARD_RECIPE = [
+    {"stage": "unused_model_formats"},
+    {"stage": "remove_game_files"},
+    {"stage": "textures", "size": 1024},
+    {"stage": "pngs", "size": 512},
+    {"stage": "wav_to_ogg"},
+    {"stage": "trim_audio"},
+]
+
+BUILTIN_PRESETS = {
+    "Standard": STANDARD_RECIPE,
+    "Textures only": [{"stage": "textures", "size": 1024}, {"stage": "pngs", "size": 512}],
+    "Audio only": [{"stage": "wav_to_ogg"}, {"stage": "trim_audio"}],
+}
+
+
+def normalize_recipe(recipe: list) -> List[dict]:
+    """
+    Check a recipe and turn bare stage names into steps, raises ValueError for unknown stages
+    and for options the stage doesn't accept or of the wrong type.
+    """
+    steps = []
+    for step in recipe:
+        if isinstance(step, str):
+            step = {"stage": step}
+        if not isinstance(step, dict) or step.get("stage") not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {step!r}")
+        options = STAGES[step["stage"]].options or {}
+        for key, value in step.items():
+            if key == "stage":
+                continue
+            if key not in options:
+                accepted = ", ".join(options) or "none"
+                raise ValueError(f"Unknown option {key!r} for pipeline stage {step['stage']!r} (accepted: {accepted})")
+            # bool is an int too, but never a valid size
+            if not isinstance(value, options[key]) or isinstance(value, bool):
+                raise ValueError(f"Option {key!r} of pipeline stage {step['stage']!r} must be {options[key].__name__}, got {value!r}")
+        steps.append(dict(step))
+    return steps
+
+
+def needs_mounts(recipe: list) -> bool:
+    return any(step["stage"] == "remove_game_files" for step in normalize_recipe(recipe))
+
+
+def _preset_path(name: str) -> str:
+    file_name = re.sub(r"[^\w\- ]", "_", name).strip() or "preset"
+    return os.path.join(get_config_dir("presets"), file_name + ".json")
+
+
+def list_presets() -> List[str]:
+    """Names of the built-in presets followed by the saved ones."""
+    names = list(BUILTIN_PRESETS)
+    saved = []
+    folder = get_config_dir("presets")
+    for file_name in os.listdir(folder):
+        if not file_name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(folder, file_name), "r", encoding="utf-8") as f:
+                name = json.load(f)["name"]
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        if name not in BUILTIN_PRESETS:
+            saved.append(name)
+    return names + sorted(saved, key=str.lower)
+
+
+def load_preset(name: str) -> List[dict]:
+    if name in BUILTIN_PRESETS:
+        return normalize_recipe(BUILTIN_PRESETS[name])
+    try:
+        with open(_preset_path(name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"No preset named {name!r}") from None
+    return normalize_recipe(data["stages"])
+
+
+def save_preset(name: str, recipe: list) -> str:
+    """Save a recipe under a name, returns the path of the preset file."""
+    if name in BUILTIN_PRESETS:
+        raise ValueError(f"{name!r} is a built-in preset")
+    path = _preset_path(name)
+    data = {"name": name, "stages": normalize_recipe(recipe)}
+    write_atomic(path, json.dumps(data, indent=2).encode("utf-8"))
+    return path
+
+
+def delete_preset(name: str):
+    if name in BUILTIN_PRESETS:
+        raise ValueError(f"{name!r} is a built-in preset")
+    path = _preset_path(name)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _phases(steps: List[dict]) -> List[dict]:
+    """
+    Group steps into phases that run one after another. A cleanup step is a phase of its own,
+    consecutive texture and audio steps form one phase with a lane each, keeping their order.
+    """
+    phases = []
+    for index, step in enumerate(steps):
+        lane = STAGES[step["stage"]].lane
+        if lane == CLEANUP or not phases or CLEANUP in phases[-1]:
+            phases.append({})
+        phases[-1].setdefault(lane, []).append((index, step))
+    return phases
+
+
+def run_stage(ctx: PipelineContext, index, step: dict) -> StageResult:
+    """Run one step on the files of an index (a FileIndex, or anything with files() and invalidate())."""
+    name = step["stage"]
+    stage = STAGES[name]
+    files = index.files(stage.extensions) if stage.extensions is not None else None
+    start_time = time.time()
+    print(f"--- {stage.label} ---")
+    try:
+        with tracing.stage(stage.label):
+            result = stage.run(ctx, step, files)
+    except Cancelled:
+        return StageResult(name, stage.label, CANCELLED, duration=time.time() - start_time)
+    except Exception as e:
+        print(f"✗ {stage.label} failed: {e}")
+        return StageResult(name, stage.label, FAILED, duration=time.time() - start_time, error=str(e))
+    finally:
+        if stage.changes_files:
+            index.invalidate()
+    saved, count = result if isinstance(result, tuple) else (0, 0)
+    status = CANCELLED if is_cancelled(ctx.cancel_token) else DONE
+    return StageResult(name, stage.label, status, saved, count, time.time() - start_time)
+
+
+def _run_lane(ctx: PipelineContext, index: FileIndex, steps: list, results: list, progress):
+    for position, step in steps:
+        if is_cancelled(ctx.cancel_token) or any(r is not None and r.status != DONE for r in results):
+            return
+        results[position] = run_stage(ctx, index, step)
+        progress()
+
+
+def print_report(results: List[StageResult], duration: float, stats: Optional[EventStats] = None):
+    """Print the combined report, with the download size of the processed files if stats measured it."""
+    print("="*60)
+    print("Pipeline report")
+    for result in results:
+        mark = {DONE: "✓", FAILED: "✗", CANCELLED: "!", NOT_RUN: "-"}[result.status]
+        line = f"  {mark} {result.label:<32} {result.count:>6} files  {format_size(result.saved):>10}  {result.duration:6.1f}s"
+        if result.status != DONE:
+            line += f"  ({result.status}{': ' + result.error if result.error else ''})"
+        print(line)
+    saved = sum(result.saved for result in results)
+    count = sum(result.count for result in results)
+    print(f"Total: {count} files, saved {format_size(saved)}")
+    if stats is not None and stats.compressed_files:
+        print(f"Compressed size of the {stats.compressed_files} processed files: "
+              f"{format_size(stats.compressed_before)} → {format_size(stats.compressed_after)} "
+              f"(saved {format_size(stats.compressed_before - stats.compressed_after)} of download)")
+    print(f"Time taken: {round(duration, 2)} seconds")
+    print("="*60)
+
+
+def print_plan(folder: str, steps: List[dict]) -> int:
+    """Print the phases a recipe runs in and how many indexed files each stage starts with."""
+    index = FileIndex(folder)
+    total = 0
+    print(f"Plan for: {folder}")
+    for number, phase in enumerate(_phases(steps), 1):
+        print(f"Phase {number}{' (lanes run in parallel)' if len(phase) > 1 else ''}:")
+        for lane, lane_steps in phase.items():
+            for _, step in lane_steps:
+                stage = STAGES[step["stage"]]
+                options = ", ".join(f"{key}={value}" for key, value in step.items() if key != "stage")
+                files = ""
+                if stage.extensions is not None:
+                    count = len(index.files(stage.extensions))
+                    total += count
+                    files = f", {count} files"
+                print(f"  [{lane}] {stage.label}{' (' + options + ')' if options else ''}{files}")
+    return total
+
+
+def run_pipeline(folder, recipe, mounts=None, progress_callback=None, cancel_token=None, dry_run=False):
+    """
+    Run a recipe of operations on a folder as one job.
+
+    The folder is walked once and the file lists are shared between stages, and game mounts
+    are indexed once for every stage that needs them. Texture and audio stages that follow
+    each other run in parallel, since they never touch the same files. The pipeline stops at
+    the first stage that fails or gets cancelled, stages running in the other lane finish.
+
+    Args:
+        folder: Path to the addon folder
+        recipe: List of steps, eg [{"stage": "textures", "size": 1024}, "trim_audio"]
+        mounts: MountSet (or game folder) for the remove_game_files stage
+        progress_callback: Optional callback(current, total) with the number of finished stages
+        cancel_token: Optional CancelToken, passed on to every stage
+        dry_run: Only print the plan, nothing is changed
+
+    Returns:
+        (bytes saved, files changed) over all stages
+    """
+    start_time = time.time()
+    steps = normalize_recipe(recipe)
+    if dry_run:
+        return 0, print_plan(folder, steps)
+    if mounts is None and needs_mounts(steps):
+        raise ValueError("The recipe removes game files but no game folder was given")
+
+    ctx = PipelineContext(folder, mounts, cancel_token)
+    index = FileIndex(folder)
+    results: List[Optional[StageResult]] = [None] * len(steps)
+    total = len(steps)
+    finished = 0
+    lock = threading.Lock()
+
+    def progress():
+        nonlocal finished
+        with lock:
+            finished += 1
+            if progress_callback:
+                progress_callback(finished, total)
+
+    print(f"Running {total} stages on: {folder}")
+    with events.capture(StatsSink()) as sink:
+        for phase in _phases(steps):
+            if is_cancelled(cancel_token) or any(r is not None and r.status != DONE for r in results):
+                break
+            if len(phase) == 1:
+                (lane_steps,) = phase.values()
+                _run_lane(ctx, index, lane_steps, results, progress)
+                continue
+            with ThreadPoolExecutor(max_workers=len(phase)) as executor:
+                futures = [executor.submit(_run_lane, ctx, index, lane_steps, results, progress)
+                           for lane_steps in phase.values()]
+                for future in futures:
+                    future.result()
+
+    results = [result or StageResult(step["stage"], STAGES[step["stage"]].label, NOT_RUN)
+               for step, result in zip(steps, results)]
+    print_report(results, time.time() - start_time, sink.stats)
+
+    failed = [result for result in results if result.status == FAILED]
+    if failed:
+        raise RuntimeError(f"Stage '{failed[0].label}' failed: {failed[0].error}")
+    return sum(result.saved for result in results), sum(result.count for result in results)
@@ -0,0 +1,248 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from pipeline.optimize_all import DONE, STAGES, PipelineContext, StageResult, normalize_recipe, print_report, run_stage
+from utils.addons import walk_files
+from utils import events
+from utils.cancel import is_cancelled
+from utils.events import StatsSink
+from utils.formatting import format_size
+
+DEFAULT_DEBOUNCE = 2.0
+REFERENCE_EXTENSIONS = (".lua", ".txt", ".json")
+# Converters leave a file with another extension behind, later stages of a batch follow it
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg")
+_SOUND_NAME = re.compile(r"[\w\-. ]+\.(?:wav|mp3)", re.IGNORECASE)
+
+
+def _signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _follow(path: str) -> Optional[str]:
+    """The path a file of the batch lives at now, sounds may have been converted to another format."""
+    if os.path.exists(path):
+        return path
+    base, extension = os.path.splitext(path)
+    if extension.lower() in AUDIO_EXTENSIONS:
+        for other in AUDIO_EXTENSIONS:
+            if os.path.exists(base + other):
+                return base + other
+    return None
+
+
+class ChangedFiles:
+    """Stands in for the FileIndex in watch mode, with only the files of one batch."""
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def files(self, extensions: tuple[str, ...]) -> List[str]:
+        return [path for path in self.paths if os.path.splitext(path)[1].lower() in extensions]
+
+    def invalidate(self):
+        followed = (_follow(path) for path in self.paths)
+        self.paths = list(dict.fromkeys(path for path in followed if path))
+
+
+class ReferenceIndex:
+    """
+    Which lua/txt/json files mention which sound file names, so converting a sound only
+    rewrites the text files that can reference it instead of every text file in the addon.
+    """
+
+    def __init__(self, folder: str):
+        self._names: Dict[str, Set[str]] = {}
+        for rel_path, _ in walk_files(folder):
+            if os.path.splitext(rel_path)[1].lower() in REFERENCE_EXTENSIONS:
+                self.update(os.path.join(folder, rel_path))
+
+    def update(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                names = {name.lower().strip() for name in _SOUND_NAME.findall(f.read())}
+        except OSError:
+            names = set()
+        if names:
+            self._names[path] = names
+        else:
+            self._names.pop(path, None)
+
+    def remove(self, path: str):
+        self._names.pop(path, None)
+
+    def files_referencing(self, file_names) -> List[str]:
+        # The converters replace names anywhere in the text, so "foo.wav" also matches "my_foo.wav"
+        file_names = [name.lower() for name in file_names]
+        return [path for path, names in self._names.items()
+                if any(name.endswith(file_name) for name in names for file_name in file_names)]
+
+
+class _ChangeCollector(FileSystemEventHandler):
+    """Collects changed paths from the observer thread until a batch is taken."""
+
+    def __init__(self):
+        self.changed: Set[str] = set()
+        self.deleted: Set[str] = set()
+        self.last_event = 0.0
+        self.condition = threading.Condition()
+
+    def _add(self, path, deleted=False):
+        with self.condition:
+            if deleted:
+                self.changed.discard(path)
+                self.deleted.add(path)
+            else:
+                self.deleted.discard(path)
+                self.changed.add(path)
+            self.last_event = time.monotonic()
+            self.condition.notify_all()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._add(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._add(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self._add(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._add(event.src_path, deleted=True)
+            self._add(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self._add(event.src_path, deleted=True)
+
+    def take_batch(self, debounce: float, cancel_token=None):
+        """
+        Wait until there are changes and nothing happened for debounce seconds, so a folder
+        being copied in is handled as one batch once it's done. Returns (changed, deleted).
+        """
+        with self.condition:
+            while not is_cancelled(cancel_token):
+                if self.changed or self.deleted:
+                    quiet = time.monotonic() - self.last_event
+                    if quiet >= debounce:
+                        changed, deleted = self.changed, self.deleted
+                        self.changed, self.deleted = set(), set()
+                        return changed, deleted
+                    self.condition.wait(debounce - quiet)
+                else:
+                    # Wake up now and then to notice cancellation
+                    self.condition.wait(0.5)
+        return set(), set()
+
+
+def _run_batch(folder: str, steps: List[dict], paths: List[str], reference_files: List[str], cancel_token) -> List[StageResult]:
+    """Run the recipe on the changed files only, in recipe order, one stage after another."""
+    batch = ChangedFiles(paths)
+    ctx = PipelineContext(folder, None, cancel_token, reference_files)
+    results = []
+    for step in steps:
+        if is_cancelled(cancel_token) or any(result.status != DONE for result in results):
+            break
+        stage = STAGES[step["stage"]]
+        if not batch.files(stage.extensions):
+            continue
+        results.append(run_stage(ctx, batch, step))
+    return results
+
+
+def watch_stages(recipe: list) -> List[dict]:
+    """Steps of a recipe that can run on single files, the others need the whole folder."""
+    return [step for step in normalize_recipe(recipe) if STAGES[step["stage"]].extensions is not None]
+
+
+def watch_folder(folder, recipe, debounce=DEFAULT_DEBOUNCE, cancel_token=None, batch_callback=None):
+    """
+    Watch a folder and run a recipe on new and changed files until cancelled.
+
+    Changes are collected from filesystem notifications and handled in batches once the folder
+    has been quiet for debounce seconds. Only the stages that work on single files run (textures,
+    mipmaps, PNGs, sound conversion and trimming, unused model formats), on the files of the batch,
+    and converted sounds only rewrite the lua/txt/json files that mention them. Files written by
+    a batch don't trigger another one. Existing files are left alone, run the pipeline once first.
+
+    Args:
+        folder: Path to the addon folder
+        recipe: List of steps, see run_pipeline
+        debounce: Seconds without changes before a batch runs
+        cancel_token: CancelToken that stops watching, the batch that is running finishes its current file
+        batch_callback: Optional callback(results) after every batch
+
+    Returns:
+        (bytes saved, files changed) over all batches
+    """
+    steps = watch_stages(recipe)
+    skipped = [STAGES[step["stage"]].label for step in normalize_recipe(recipe) if step not in steps]
+    if skipped:
+        print(f"Not run in watch mode (they need the whole folder): {', '.join(skipped)}")
+    if not steps:
+        raise ValueError("The recipe has no stages that can run on single files")
+
+    references = ReferenceIndex(folder)
+    # Signatures of the files the batches wrote themselves, their events are ignored
+    written: Dict[str, tuple] = {}
+    collector = _ChangeCollector()
+    observer = Observer()
+    observer.schedule(collector, folder, recursive=True)
+    observer.start()
+    print(f"Watching {folder}: {', '.join(STAGES[step['stage']].label for step in steps)}")
+    print("Cancel to stop watching.")
+    saved = 0
+    count = 0
+    try:
+        while not is_cancelled(cancel_token):
+            changed, deleted = collector.take_batch(debounce, cancel_token)
+            for path in deleted:
+                references.remove(path)
+                written.pop(path, None)
+            changed = sorted(path for path in changed
+                             if os.path.isfile(path) and written.get(path) != _signature(path))
+            for path in changed:
+                if os.path.splitext(path)[1].lower() in REFERENCE_EXTENSIONS:
+                    references.update(path)
+            assets = [path for path in changed if os.path.splitext(path)[1].lower() not in REFERENCE_EXTENSIONS]
+            if not assets or is_cancelled(cancel_token):
+                continue
+
+            start_time = time.time()
+            print(f"{len(assets)} changed files")
+            sound_names = [os.path.basename(path) for path in assets if os.path.splitext(path)[1].lower() in (".wav", ".mp3")]
+            reference_files = references.files_referencing(sound_names) if sound_names else []
+            with events.capture(StatsSink()) as sink:
+                results = _run_batch(folder, steps, assets, reference_files, cancel_token)
+            # Everything the batch could have written: the files, converted copies and rewritten references
+            outputs = set(assets) | {_follow(path) for path in assets} | set(reference_files)
+            for path in outputs:
+                if path and os.path.isfile(path):
+                    written[path] = _signature(path)
+                    if os.path.splitext(path)[1].lower() in REFERENCE_EXTENSIONS:
+                        references.update(path)
+            if results:
+                print_report(results, time.time() - start_time, sink.stats)
+            saved += sum(result.saved for result in results)
+            count += sum(result.count for result in results)
+            if batch_callback:
+                batch_callback(results)
+    finally:
+        observer.stop()
+        observer.join()
+    print(f"Stopped watching, saved {format_size(saved)} over {count} files.")
+    return saved, count
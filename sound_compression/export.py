@@ -0,0 +1,37 @@
+import os
+import tempfile
+from pydub import AudioSegment
+from utils.cancel import run_process
+
+
+def export_audio(sound: AudioSegment, path: str, export_format: str, cancel_token=None):
+    """
+    Export a sound like AudioSegment.export, but cancellable and without half-written files.
+
+    The encoder writes to a temporary file next to the destination, which only replaces it
+    once encoding succeeded. Once cancel_token is cancelled ffmpeg is stopped within a fraction
+    of a second and Cancelled is raised, the destination is left as it was.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+    os.close(fd)
+    wav_path = None
+    try:
+        if export_format == "wav":
+            # Written directly by pydub, no ffmpeg involved
+            sound.export(temp_path, format="wav")
+        else:
+            fd, wav_path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            sound.export(wav_path, format="wav")
+            command = [AudioSegment.converter, "-y", "-f", "wav", "-i", wav_path]
+            codec = AudioSegment.DEFAULT_CODECS.get(export_format)
+            if codec:
+                command += ["-acodec", codec]
+            command += ["-f", export_format, temp_path]
+            run_process(command, cancel_token)
+        os.replace(temp_path, path)
+    finally:
+        for leftover in (temp_path, wav_path):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
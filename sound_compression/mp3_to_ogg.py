@@ -2,64 +2,104 @@ import pydub
 import pydub.exceptions
 import os
 import re
+from utils import events, tracing
+from utils.cache import write_atomic
+from utils.cancel import Cancelled, is_cancelled
+from utils.output_cache import OutputCache
+from sound_compression.export import export_audio
 
 # Requires ffmpeg to be installed and added to PATH
 # https://github.com/jiaaro/pydub?tab=readme-ov-file#getting-ffmpeg-set-up
 
-def mp3_to_ogg(folder):
+def mp3_to_ogg(folder, cancel_token=None, files=None, reference_files=None):
     replaced_files = {}
     old_size = 0
     new_size = 0
     replace_count = 0
 
-    for path, subdirs, files in os.walk(folder):
-        for name in files:
-            filepath = os.path.join(path, name)
-            filetype = name.split(".")[-1]
-            if filetype == "mp3":
-                old_size += os.path.getsize(filepath)
+    # Collect the files first, unless the caller already has them
+    if files is None:
+        files = []
+        for path, subdirs, names in os.walk(folder):
+            for name in names:
+                if name.split(".")[-1] == "mp3":
+                    files.append(os.path.join(path, name))
+
+    # Once cancelled the remaining files are skipped, references to the files converted so far still get updated
+    with OutputCache("mp3_to_ogg") as outputs:
+        for filepath in files:
+            if is_cancelled(cancel_token):
+                print("Cancelled, skipping the remaining files.")
+                break
+            file_size = os.path.getsize(filepath)
+            key = outputs.key(filepath)
+            cached = outputs.get(key)
+            if cached is None:
                 try:
-                    sound = pydub.AudioSegment.from_mp3(filepath)
+                    with tracing.span("audio.load"):
+                        sound = pydub.AudioSegment.from_mp3(filepath)
                 except pydub.exceptions.CouldntDecodeError as e:
                     print(f"Skipping corrupted MP3 file: {filepath} - Error: {e}")
+                    events.file_finished(filepath, events.FAILED, error=str(e))
                     continue
                 except Exception as e:
                     print(f"Skipping MP3 file due to unexpected error: {filepath} - Error: {e}")
+                    events.file_finished(filepath, events.FAILED, error=str(e))
                     continue
 
-                new_filepath = filepath.replace(".mp3", ".ogg")
-                sound.export(new_filepath, format="ogg")
-                new_size += os.path.getsize(new_filepath)
+            new_filepath = os.path.splitext(filepath)[0] + ".ogg"
+            try:
+                with events.track(filepath, events.CONVERTED) as tracked:
+                    if cached is not None:
+                        write_atomic(new_filepath, cached)
+                    else:
+                        with tracing.span("audio.export", format="ogg"):
+                            export_audio(sound, new_filepath, "ogg", cancel_token)
+                        outputs.put(key, new_filepath)
+                    tracked.bytes_after = os.path.getsize(new_filepath)
+                    tracked.output_path = new_filepath
+            except Cancelled:
+                # Stopped in the middle of the file, it's left as it was
+                print("Cancelled, skipping the remaining files.")
+                break
+            old_size += file_size
+            new_size += tracked.bytes_after
+
+            file_name = os.path.basename(filepath)
+            replace_count += 1
+            replaced_files[file_name] = os.path.splitext(file_name)[0] + ".ogg"
+            os.remove(filepath)
 
-                file_name = os.path.basename(filepath)
-                replace_count += 1
-                replaced_files[file_name] = file_name.replace(".mp3", ".ogg")
-                os.remove(filepath)
+            print("Converted", filepath, "to ogg successfully.")
+        outputs.report()
 
-                print("Converted", filepath, "to ogg successfully.")
+    # Callers that know which text files reference the converted files (watch mode) pass only those
+    if reference_files is None:
+        reference_files = []
+        for path, subdirs, names in os.walk(folder):
+            for name in names:
+                if name.split(".")[-1] in ("lua", "txt", "json"):
+                    reference_files.append(os.path.join(path, name))
 
-    for path, subdirs, files in os.walk(folder):
-        for name in files:
-            filepath = os.path.join(path, name)
-            filetype = name.split(".")[-1]
-            if filetype == "lua" or filetype == "txt" or filetype == "json":
-                with open(filepath, "r", encoding="utf-8") as f:
-                    contents = f.read()
+    for filepath in reference_files:
+        with open(filepath, "r", encoding="utf-8") as f:
+            contents = f.read()
                 
-                replaced = False
-                for old, new in replaced_files.items():
-                    pattern = re.escape(old)
-                    new_contents = re.sub(pattern, new, contents, flags=re.IGNORECASE)
-                    if new_contents != contents:
-                        replaced = True
-                    contents = new_contents
+        replaced = False
+        with tracing.span("lua.rewrite"):
+            for old, new in replaced_files.items():
+                pattern = re.escape(old)
+                new_contents = re.sub(pattern, new, contents, flags=re.IGNORECASE)
+                if new_contents != contents:
+                    replaced = True
+                contents = new_contents
 
-                if not replaced:
-                    continue
+        if not replaced:
+            continue
 
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(contents)
-                print("Replaced", filepath, "successfully.")
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(contents)
+        print("Replaced", filepath, "successfully.")
 
     print("="*60)
     print("Replaced", replace_count, "files.")
@@ -69,3 +109,4 @@ def mp3_to_ogg(folder):
         print("Reduced size by ", round((1 - new_size / old_size) * 100, 2), "%")
         print("Reduced size by ", round((old_size - new_size) / 1000000, 2), "mbs")
     print("="*60)
+    return old_size - new_size, replace_count
@@ -1,9 +1,20 @@
 import os
 import time
 from pydub import AudioSegment, silence
+from utils import events, tracing
+from utils.cancel import Cancelled, is_cancelled
+from utils.cache import write_atomic
+from utils.manifest import Manifest
+from utils.output_cache import UNCHANGED, OutputCache
+from sound_compression.export import export_audio
 
+# Status returned by trim_single_audio_file
+TRIMMED = "trimmed"
+NOT_TRIMMED = "unchanged"
+FAILED = "failed"
 
-def trim_single_audio_file(input_file, silence_thresh=-55, min_silence_len=50, fade_duration=200):
+
+def trim_single_audio_file(input_file, silence_thresh=-55, min_silence_len=50, fade_duration=200, cancel_token=None):
     """
     Trim silence from the end of a single audio file (WAV, MP3, or OGG) and apply fade-out.
 
@@ -12,9 +23,10 @@ def trim_single_audio_file(input_file, silence_thresh=-55, min_silence_len=50, f
         silence_thresh (int): Silence threshold in dBFS. Default -55 dB.
         min_silence_len (int): Minimum length of silence (ms) to trim. Default 50 ms.
         fade_duration (int): Duration of fade-out effect in milliseconds. Default 200 ms.
+        cancel_token: Optional CancelToken, stops encoding and raises Cancelled, the file is left as it was.
     
     Returns:
-        tuple: (success, message, bytes_saved)
+        tuple: (status, message, bytes_saved), status is TRIMMED, NOT_TRIMMED (nothing to trim) or FAILED
     """
     try:
         # Get original file size
@@ -22,23 +34,25 @@ def trim_single_audio_file(input_file, silence_thresh=-55, min_silence_len=50, f
         
         # Determine file format and load audio file
         file_ext = os.path.splitext(input_file)[1].lower()
-        if file_ext == '.wav':
-            audio = AudioSegment.from_wav(input_file)
-            export_format = "wav"
-        elif file_ext == '.mp3':
-            audio = AudioSegment.from_mp3(input_file)
-            export_format = "mp3"
-        elif file_ext == '.ogg':
-            audio = AudioSegment.from_ogg(input_file)
-            export_format = "ogg"
-        else:
-            return False, f"Unsupported file format: {file_ext}", 0
+        with tracing.span("audio.load"):
+            if file_ext == '.wav':
+                audio = AudioSegment.from_wav(input_file)
+                export_format = "wav"
+            elif file_ext == '.mp3':
+                audio = AudioSegment.from_mp3(input_file)
+                export_format = "mp3"
+            elif file_ext == '.ogg':
+                audio = AudioSegment.from_ogg(input_file)
+                export_format = "ogg"
+            else:
+                return FAILED, f"Unsupported file format: {file_ext}", 0
         original_duration = len(audio)
 
         # Detect non-silent chunks
-        non_silence_ranges = silence.detect_nonsilent(audio, 
-                                                      min_silence_len=min_silence_len, 
-                                                      silence_thresh=silence_thresh)
+        with tracing.span("audio.detect_silence"):
+            non_silence_ranges = silence.detect_nonsilent(audio, 
+                                                          min_silence_len=min_silence_len, 
+                                                          silence_thresh=silence_thresh)
 
         if non_silence_ranges:
             # Get the last non-silent segment (only trim from end)
@@ -47,7 +61,7 @@ def trim_single_audio_file(input_file, silence_thresh=-55, min_silence_len=50, f
             # Check if any trimming is needed from the end
             end_silence = original_duration - end_trim
             if end_silence <= min_silence_len:
-                return False, f"No significant silence to trim from end ({end_silence}ms)", 0
+                return NOT_TRIMMED, f"No significant silence to trim from end ({end_silence}ms)", 0
             
             # Only trim from the end, keep the start intact
             trimmed_audio = audio[0:end_trim]
@@ -62,21 +76,25 @@ def trim_single_audio_file(input_file, silence_thresh=-55, min_silence_len=50, f
             new_duration = len(trimmed_audio)
             
             # Export result with original format (overwrite original)
-            trimmed_audio.export(input_file, format=export_format)
+            with tracing.span("audio.export", format=export_format):
+                export_audio(trimmed_audio, input_file, export_format, cancel_token)
             
             # Calculate savings
             new_size = os.path.getsize(input_file)
             bytes_saved = original_size - new_size
             time_saved = original_duration - new_duration
             
-            return True, f"Trimmed {time_saved/1000:.1f}s of silence from end + fade-out", bytes_saved
+            return TRIMMED, f"Trimmed {time_saved/1000:.1f}s of silence from end + fade-out", bytes_saved
         else:
-            return False, "No non-silent audio detected", 0
+            return NOT_TRIMMED, "No non-silent audio detected", 0
             
+    except Cancelled:
+        raise
     except Exception as e:
-        return False, f"Error processing file: {str(e)}", 0
+        return FAILED, f"Error processing file: {str(e)}", 0
 
-def trim_empty_audio(folder, silence_thresh=-55, min_silence_len=50, fade_duration=200, progress_callback=None):
+def trim_empty_audio(folder, silence_thresh=-55, min_silence_len=50, fade_duration=200, progress_callback=None,
+                     cancel_token=None, files=None):
     """
     Trim silence from the end of all audio files (WAV, MP3, OGG) in the specified folder and apply fade-out.
     
@@ -86,6 +104,11 @@ def trim_empty_audio(folder, silence_thresh=-55, min_silence_len=50, fade_durati
         min_silence_len (int): Minimum length of silence (ms) to trim. Default 50 ms.
         fade_duration (int): Duration of fade-out effect in milliseconds. Default 200 ms.
         progress_callback: Optional callback function for progress updates (current, total).
+        cancel_token: Optional CancelToken, remaining files are skipped once it's cancelled.
+        files: Optional list of audio file paths to process instead of scanning the folder.
+
+    Returns:
+        (bytes saved, files modified)
     """
     old_size = 0
     new_size = 0
@@ -96,51 +119,79 @@ def trim_empty_audio(folder, silence_thresh=-55, min_silence_len=50, fade_durati
     print(f"Scanning for audio files in: {folder}")
     print("Trimming silence from end of audio files (WAV, MP3, OGG) with fade-out...")
     
-    # First pass: collect all audio files
-    audio_files = []
-    if progress_callback:
-        for root, dirs, files in os.walk(folder):
-            for filename in files:
+    # First pass: collect all audio files, unless the caller already has them
+    audio_files = files
+    if audio_files is None:
+        audio_files = []
+        for root, dirs, names in os.walk(folder):
+            for filename in names:
                 file_ext = filename.lower()
                 if file_ext.endswith(".wav") or file_ext.endswith(".mp3") or file_ext.endswith(".ogg"):
                     audio_files.append(os.path.join(root, filename))
-        total_files = len(audio_files)
-        current_file = 0
+    total_files = len(audio_files)
     
     # Process all audio files
-    for root, dirs, files in os.walk(folder):
-        for filename in files:
-            file_ext = filename.lower()
-            if not (file_ext.endswith(".wav") or file_ext.endswith(".mp3") or file_ext.endswith(".ogg")):
-                continue
-                
-            file_path = os.path.join(root, filename)
-            
+    params = {"silence_thresh": silence_thresh, "min_silence_len": min_silence_len, "fade_duration": fade_duration}
+    with Manifest(folder, "trim_empty_audio", params) as manifest, OutputCache("trim_empty_audio", params) as outputs:
+        for current_file, file_path in enumerate(audio_files, 1):
+            if is_cancelled(cancel_token):
+                print("Cancelled, skipping the remaining files.")
+                break
+        
             if progress_callback:
-                current_file += 1
                 progress_callback(current_file, total_files)
-            
+            if manifest.is_processed(file_path):
+                continue
+        
             try:
                 # Get original file size
                 old_file_size = os.path.getsize(file_path)
                 old_size += old_file_size
-                
+            
                 # Process the file
-                success, message, bytes_saved = trim_single_audio_file(file_path, silence_thresh, min_silence_len, fade_duration)
+                with events.track(file_path, "trimmed") as tracked:
+                    key = outputs.key(file_path)
+                    cached = outputs.get(key)
+                    if cached is UNCHANGED:
+                        status, message, bytes_saved = NOT_TRIMMED, "No silence to trim (cached)", 0
+                    elif cached is not None:
+                        write_atomic(file_path, cached)
+                        status, message, bytes_saved = TRIMMED, "Trimmed (cached)", old_file_size - len(cached)
+                    else:
+                        status, message, bytes_saved = trim_single_audio_file(file_path, silence_thresh, min_silence_len, fade_duration, cancel_token)
+                    if status == FAILED:
+                        tracked.action = events.FAILED
+                        tracked.error = message
+                    elif status == NOT_TRIMMED:
+                        tracked.action = events.SKIPPED
+                # Files that failed to load (eg no ffmpeg for mp3/ogg) are tried again next time
+                if status != FAILED:
+                    if cached is None:
+                        outputs.put(key, file_path if status == TRIMMED else None)
+                    manifest.record(file_path, old_file_size)
                 processed_count += 1
-                
-                if success:
+            
+                if status == TRIMMED:
                     success_count += 1
                     new_file_size = os.path.getsize(file_path)
                     new_size += new_file_size
                     saved_mb = bytes_saved / (1024 * 1024)
                     print(f"✓ {file_path} - {message} (saved {saved_mb:.2f} MB)")
                 else:
+                    if status == FAILED:
+                        print(f"✗ {file_path} - {message}")
                     new_size += old_file_size  # No change in size
-                
+            
+            except Cancelled:
+                # Stopped in the middle of the file, it's left as it was
+                print("Cancelled, skipping the remaining files.")
+                old_size -= old_file_size
+                break
             except Exception as e:
                 print(f"✗ {file_path} - Error: {str(e)}")
                 new_size += old_file_size  # No change in size
+        manifest.report()
+        outputs.report()
     
     # Print summary
     print("="*60)
@@ -160,3 +211,4 @@ def trim_empty_audio(folder, silence_thresh=-55, min_silence_len=50, fade_durati
     
     print(f"Time taken: {round(time.time() - start_time, 2)} seconds")
     print("="*60)
+    return old_size - new_size, success_count
@@ -2,83 +2,110 @@ import pydub
 import os
 import re
 from wavinfo import WavInfoReader
+from utils import events, tracing
+from utils.cache import write_atomic
+from utils.cancel import Cancelled, is_cancelled
+from utils.output_cache import OutputCache
+from sound_compression.export import export_audio
 
 # Requires ffmpeg to be installed and added to PATH
 # https://github.com/jiaaro/pydub?tab=readme-ov-file#getting-ffmpeg-set-up
 
-def wav_to_mp3(folder, progress_callback=None):
+def wav_to_mp3(folder, progress_callback=None, cancel_token=None, files=None, reference_files=None):
     replaced_files = {}
     old_size = 0
     new_size = 0
     replace_count = 0
 
-    # First pass: count WAV files
-    wav_files = []
-    if progress_callback:
-        for path, subdirs, files in os.walk(folder):
-            for name in files:
+    # Collect the files first so progress has a total, unless the caller already has them
+    if files is None:
+        files = []
+        for path, subdirs, names in os.walk(folder):
+            for name in names:
                 if name.split(".")[-1] == "wav":
-                    wav_files.append(os.path.join(path, name))
-        total_wavs = len(wav_files)
-        processed = 0
-
-    for path, subdirs, files in os.walk(folder):
-        for name in files:
-            filepath = os.path.join(path, name)
-            filetype = name.split(".")[-1]
-            if filetype == "wav":
-                if progress_callback:
-                    processed += 1
-                    progress_callback(processed, total_wavs)
-                
-                wav_info = WavInfoReader(filepath)
-                if wav_info.cues == None:
-                    continue
-
-                if len(wav_info.cues.cues) > 0:
-                    print("File", filepath, "contains cues skipping.")
-                    continue
-
-                if wav_info.smpl != None and len(wav_info.smpl.sample_loops) > 0:
-                    print("File", filepath, "contains loops skipping.")
-                    continue
-
-                old_size += os.path.getsize(filepath)
-                sound = pydub.AudioSegment.from_wav(filepath)
-
-                new_filepath = filepath.replace(".wav", ".mp3")
-                sound.export(new_filepath, format="mp3")
-                new_size += os.path.getsize(new_filepath)
-
-                file_name = os.path.basename(filepath)
-                replace_count += 1
-                replaced_files[file_name] = file_name.replace(".wav", ".mp3")
-                os.remove(filepath)
-
-                print("Converted", filepath, "to mp3 successfully.")
-
-    for path, subdirs, files in os.walk(folder):
-        for name in files:
-            filepath = os.path.join(path, name)
-            filetype = name.split(".")[-1]
-            if filetype == "lua" or filetype == "txt" or filetype == "json":
-                with open(filepath, "r", encoding="utf-8") as f:
-                    contents = f.read()
+                    files.append(os.path.join(path, name))
+    total_wavs = len(files)
+
+    # Once cancelled the remaining files are skipped, references to the files converted so far still get updated
+    with OutputCache("wav_to_mp3") as outputs:
+        for processed, filepath in enumerate(files, 1):
+            if is_cancelled(cancel_token):
+                print("Cancelled, skipping the remaining files.")
+                break
+            if progress_callback:
+                progress_callback(processed, total_wavs)
+
+            wav_info = WavInfoReader(filepath)
+            if wav_info.cues == None:
+                continue
+
+            if len(wav_info.cues.cues) > 0:
+                print("File", filepath, "contains cues skipping.")
+                continue
+
+            if wav_info.smpl != None and len(wav_info.smpl.sample_loops) > 0:
+                print("File", filepath, "contains loops skipping.")
+                continue
+
+            file_size = os.path.getsize(filepath)
+            try:
+                with events.track(filepath, events.CONVERTED) as tracked:
+                    new_filepath = os.path.splitext(filepath)[0] + ".mp3"
+                    key = outputs.key(filepath)
+                    cached = outputs.get(key)
+                    if cached is not None:
+                        write_atomic(new_filepath, cached)
+                    else:
+                        with tracing.span("audio.load"):
+                            sound = pydub.AudioSegment.from_wav(filepath)
+
+                        with tracing.span("audio.export", format="mp3"):
+                            export_audio(sound, new_filepath, "mp3", cancel_token)
+                        outputs.put(key, new_filepath)
+                    tracked.bytes_after = os.path.getsize(new_filepath)
+                    tracked.output_path = new_filepath
+            except Cancelled:
+                # Stopped in the middle of the file, it's left as it was
+                print("Cancelled, skipping the remaining files.")
+                break
+            old_size += file_size
+            new_size += tracked.bytes_after
+
+            file_name = os.path.basename(filepath)
+            replace_count += 1
+            replaced_files[file_name] = os.path.splitext(file_name)[0] + ".mp3"
+            os.remove(filepath)
+
+            print("Converted", filepath, "to mp3 successfully.")
+        outputs.report()
+
+    # Callers that know which text files reference the converted files (watch mode) pass only those
+    if reference_files is None:
+        reference_files = []
+        for path, subdirs, names in os.walk(folder):
+            for name in names:
+                if name.split(".")[-1] in ("lua", "txt", "json"):
+                    reference_files.append(os.path.join(path, name))
+
+    for filepath in reference_files:
+        with open(filepath, "r", encoding="utf-8") as f:
+            contents = f.read()
                 
-                replaced = False
-                for old, new in replaced_files.items():
-                    pattern = re.escape(old)
-                    new_contents = re.sub(pattern, new, contents, flags=re.IGNORECASE)
-                    if new_contents != contents:
-                        replaced = True
-                    contents = new_contents
+        replaced = False
+        with tracing.span("lua.rewrite"):
+            for old, new in replaced_files.items():
+                pattern = re.escape(old)
+                new_contents = re.sub(pattern, new, contents, flags=re.IGNORECASE)
+                if new_contents != contents:
+                    replaced = True
+                contents = new_contents
 
-                if not replaced:
-                    continue
+        if not replaced:
+            continue
 
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(contents)
-                print("Replaced", filepath, "successfully.")
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(contents)
+        print("Replaced", filepath, "successfully.")
 
     print("="*60)
     print("Replaced", replace_count, "files.")
@@ -88,3 +115,4 @@ def wav_to_mp3(folder, progress_callback=None):
         print("Reduced size by ", round((1 - new_size / old_size) * 100, 2), "%")
         print("Reduced size by ", round((old_size - new_size) / 1000000, 2), "mbs")
     print("="*60)
+    return old_size - new_size, replace_count
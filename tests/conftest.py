@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep the hash, index and output caches out of the user's cache dir."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def addons_folder(tmp_path):
+    """Two addons that both ship addon.json, LICENSE and the same materials/x.vmt."""
+    folder = tmp_path / "addons"
+    for name in ("a", "b"):
+        addon = folder / name
+        (addon / "materials").mkdir(parents=True)
+        (addon / "addon.json").write_text('{"title": "test"}')
+        (addon / "LICENSE").write_text("MIT")
+        (addon / "materials" / "x.vmt").write_text('"LightmappedGeneric" {}')
+    return folder
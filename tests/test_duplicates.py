@@ -0,0 +1,18 @@
+from unused_files.duplicates import duplicate_content
+
+
+def test_addon_metadata_is_not_a_duplicate(addons_folder, capsys):
+    size, count = duplicate_content(str(addons_folder))
+    output = capsys.readouterr().out
+    assert count == 1
+    assert "b/materials/x.vmt" in output
+    assert "addon.json" not in output
+    assert "LICENSE" not in output
+
+
+def test_remove_keeps_addon_metadata(addons_folder):
+    duplicate_content(str(addons_folder), remove=True)
+    for name in ("a", "b"):
+        assert (addons_folder / name / "addon.json").exists()
+        assert (addons_folder / name / "LICENSE").exists()
+    assert not (addons_folder / "b" / "materials" / "x.vmt").exists()
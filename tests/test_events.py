@@ -0,0 +1,38 @@
+from utils import events
+from utils.compressed_size import CompressedSizer, compressed_size
+from utils.events import StatsSink
+
+
+def test_compressed_sizes_before_and_after(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"abc" * 10000)
+    before = compressed_size(str(path))
+    removed = tmp_path / "b.txt"
+    removed.write_bytes(b"xyz" * 5000)
+    removed_size = compressed_size(str(removed))
+
+    with CompressedSizer() as sizer, events.capture(StatsSink()) as sink:
+        events.set_compressed_sizes(sizer)
+        try:
+            with events.track(str(path)):
+                path.write_bytes(b"abc")
+            compressed = events.measure(str(removed))
+            removed.unlink()
+            events.file_finished(str(removed), events.REMOVED, 15000, 0, compressed_before=compressed, compressed_after=0)
+        finally:
+            events.set_compressed_sizes(None)
+
+    stats = sink.stats
+    assert stats.compressed_files == 2
+    assert stats.compressed_before == before + removed_size
+    assert stats.compressed_after == compressed_size(str(path))
+
+
+def test_no_compressed_sizes_by_default(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"abc")
+    with events.capture(StatsSink()) as sink:
+        with events.track(str(path)):
+            pass
+    assert sink.stats.files == 1
+    assert sink.stats.compressed_files == 0
@@ -0,0 +1,33 @@
+from utils.filesystem import MountedFileSystem
+from utils.mounts import MountSet
+
+
+def test_open_loose_file_with_different_case(tmp_path):
+    game = tmp_path / "legacy"
+    (game / "Materials").mkdir(parents=True)
+    (game / "Materials" / "Foo.vmt").write_text('"LightmappedGeneric" {}')
+    mounts = MountSet()
+    mounts.add_folder(str(game))
+    fsys = MountedFileSystem(mounts)
+
+    with fsys.open_bin("materials/foo.vmt") as f:
+        assert f.read() == b'"LightmappedGeneric" {}'
+    with fsys.open_str(fsys["Materials\\FOO.vmt"]) as f:
+        assert f.read() == '"LightmappedGeneric" {}'
+
+
+def test_walk_mixed_case_folder(tmp_path):
+    game = tmp_path / "legacy"
+    (game / "Materials" / "Sub").mkdir(parents=True)
+    (game / "Materials" / "Sub" / "Foo.vmt").write_text('"LightmappedGeneric" {}')
+    (game / "sound").mkdir()
+    (game / "sound" / "a.wav").write_bytes(b"RIFF")
+    mounts = MountSet()
+    mounts.add_folder(str(game))
+    fsys = MountedFileSystem(mounts)
+
+    files = list(fsys.walk_folder("materials"))
+    assert [file.path for file in files] == ["materials/sub/foo.vmt"]
+    assert [file.path for file in fsys.walk_folder("Materials/SUB")] == ["materials/sub/foo.vmt"]
+    with fsys.open_bin(files[0]) as f:
+        assert f.read() == b'"LightmappedGeneric" {}'
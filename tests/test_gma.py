@@ -0,0 +1,103 @@
+import os
+import struct
+import zlib
+
+import pytest
+
+from utils.gma import GMAHeader, GMAReader, gma_workspace, write_gma
+
+
+def _addon(folder):
+    (folder / "materials" / "sub").mkdir(parents=True)
+    (folder / "materials" / "sub" / "a.vmt").write_bytes(b'"LightmappedGeneric" {}')
+    (folder / "lua").mkdir()
+    (folder / "lua" / "init.lua").write_bytes(b"print('hi')" * 1000)
+    return folder
+
+
+def _craft_gma(path, files):
+    """A minimal .gma with the given (name, data, crc) entries, names aren't checked."""
+    head = bytearray(b"GMAD" + bytes([3]) + struct.pack("<QQ", 0, 0) + b"\0" + b"name\0desc\0author\0" + struct.pack("<i", 1))
+    for number, (name, data, crc) in enumerate(files, 1):
+        head += struct.pack("<I", number) + name.encode() + b"\0" + struct.pack("<qI", len(data), crc)
+    head += struct.pack("<I", 0)
+    body = head + b"".join(data for _, data, _ in files)
+    path.write_bytes(bytes(body) + struct.pack("<I", zlib.crc32(body)))
+
+
+def test_round_trip(tmp_path):
+    folder = _addon(tmp_path / "addon")
+    gma = tmp_path / "addon.gma"
+    header = GMAHeader(name="Test", description="desc", author="me", steamid=7, required_content=("x",))
+    size = write_gma(str(folder), str(gma), header, order=["lua/init.lua"])
+    assert size == gma.stat().st_size
+
+    with GMAReader(str(gma)) as reader:
+        assert reader.header._replace(timestamp=0) == header
+        assert [entry.name for entry in reader.entries] == ["lua/init.lua", "materials/sub/a.vmt"]
+        for entry in reader.entries:
+            data = reader.read(entry)
+            assert data == (folder / entry.name).read_bytes()
+            assert entry.crc == zlib.crc32(data)
+        out = tmp_path / "out"
+        assert reader.extract(str(out)) == 2
+    assert (out / "materials" / "sub" / "a.vmt").read_bytes() == b'"LightmappedGeneric" {}'
+
+    # The trailing CRC covers everything before it
+    data = gma.read_bytes()
+    assert struct.unpack("<I", data[-4:])[0] == zlib.crc32(data[:-4])
+
+
+@pytest.mark.parametrize("name", ["../evil.lua", "lua/../../evil.lua", "/etc/evil.lua", "C:/evil.lua", "lua//x.lua", ""])
+def test_unsafe_names_are_rejected(tmp_path, name):
+    gma = tmp_path / "evil.gma"
+    _craft_gma(gma, [(name, b"x", zlib.crc32(b"x"))])
+    with GMAReader(str(gma)) as reader:
+        with pytest.raises(ValueError, match="Unsafe"):
+            reader.extract(str(tmp_path / "out"))
+    assert not (tmp_path / "evil.lua").exists()
+
+
+def test_crc_mismatch_fails_extraction(tmp_path):
+    gma = tmp_path / "corrupt.gma"
+    _craft_gma(gma, [("lua/a.lua", b"data", zlib.crc32(b"other"))])
+    with GMAReader(str(gma)) as reader:
+        with pytest.raises(ValueError, match="CRC mismatch"):
+            reader.extract(str(tmp_path / "out"))
+
+
+def test_workspace_packs_changes_back(tmp_path):
+    gma = tmp_path / "addon.gma"
+    write_gma(str(_addon(tmp_path / "addon")), str(gma))
+    with gma_workspace(str(gma)) as folder:
+        with open(f"{folder}/lua/init.lua", "wb") as f:
+            f.write(b"-- smaller")
+    with GMAReader(str(gma)) as reader:
+        entries = {entry.name: entry for entry in reader.entries}
+        assert reader.read(entries["lua/init.lua"]) == b"-- smaller"
+    assert not os.path.exists(folder)
+
+
+def test_workspace_keeps_caller_folder(tmp_path):
+    gma = tmp_path / "addon.gma"
+    write_gma(str(_addon(tmp_path / "addon")), str(gma))
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    with gma_workspace(str(gma), str(workspace)):
+        pass
+    assert workspace.is_dir()
+
+    # A folder it creates itself is removed again
+    created = tmp_path / "created"
+    with gma_workspace(str(gma), str(created)):
+        assert created.is_dir()
+    assert not created.exists()
+
+
+def test_workspace_refuses_non_empty_folder(tmp_path):
+    gma = tmp_path / "addon.gma"
+    write_gma(str(_addon(tmp_path / "addon")), str(gma))
+    with pytest.raises(ValueError, match="empty folder"):
+        with gma_workspace(str(gma), str(tmp_path / "addon")):
+            pass
+    assert (tmp_path / "addon" / "lua" / "init.lua").exists()
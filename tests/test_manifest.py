@@ -0,0 +1,53 @@
+import os
+
+from utils import manifest
+from utils.manifest import Manifest
+
+
+def test_skips_unchanged_and_reprocesses_changed(tmp_path):
+    folder = tmp_path / "addon"
+    folder.mkdir()
+    a = folder / "a.png"
+    b = folder / "b.png"
+    a.write_bytes(b"aaaa")
+    b.write_bytes(b"bbbb")
+    db_path = str(tmp_path / "manifest.sqlite")
+
+    with Manifest(str(folder), "clamp_pngs", {"size": 1024}, db_path=db_path) as first:
+        assert not first.is_processed(str(a))
+        first.record(str(a), 8)
+        first.record(str(b), 8)
+
+    # Changed size, then changed mtime with the same size
+    b.write_bytes(b"bbbbbb")
+    stat = os.stat(a)
+    with Manifest(str(folder), "clamp_pngs", {"size": 1024}, db_path=db_path) as second:
+        assert second.is_processed(str(a))
+        assert not second.is_processed(str(b))
+        second.record(str(b))
+        os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert not second.is_processed(str(a))
+        assert second.skipped == 1
+
+    with Manifest(str(folder), "clamp_pngs", {"size": 1024}, db_path=db_path) as third:
+        assert third.is_processed(str(b))
+    with Manifest(str(folder), "clamp_pngs", {"size": 512}, db_path=db_path) as other_params:
+        assert not other_params.is_processed(str(b))
+    with Manifest(str(folder), "clamp_vtfs", {"size": 1024}, db_path=db_path) as other_operation:
+        assert not other_operation.is_processed(str(b))
+
+
+def test_disabled(tmp_path, monkeypatch):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"a")
+    db_path = str(tmp_path / "manifest.sqlite")
+    # Temporary folders have no manifest unless it's given a path
+    with Manifest(str(tmp_path), "clamp_pngs") as temporary:
+        temporary.record(str(path))
+        assert not temporary.is_processed(str(path))
+
+    with Manifest(str(tmp_path), "clamp_pngs", db_path=db_path) as enabled:
+        enabled.record(str(path))
+    monkeypatch.setattr(manifest, "_enabled", False)
+    with Manifest(str(tmp_path), "clamp_pngs", db_path=db_path) as disabled:
+        assert not disabled.is_processed(str(path))
@@ -0,0 +1,78 @@
+import itertools
+import os
+import threading
+from types import SimpleNamespace
+
+from utils import output_cache
+from utils.cache import write_atomic
+from utils.output_cache import UNCHANGED, OutputCache
+
+
+def _file(folder, name, data):
+    path = folder / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_hit_and_unchanged(tmp_path):
+    folder = tmp_path / "outputs"
+    folder.mkdir()
+    changed = _file(tmp_path, "a.png", b"input a")
+    unchanged = _file(tmp_path, "b.png", b"input b")
+    with OutputCache("clamp_pngs", {"size": 1024}, max_size=1024, folder=str(folder)) as cache:
+        key = cache.key(changed)
+        assert cache.get(key) is None
+        _file(tmp_path, "a.png", b"output a")
+        cache.put(key, changed)
+        cache.put(cache.key(unchanged), None)
+
+    # Same content in another addon
+    copy = _file(tmp_path, "copy.png", b"input a")
+    with OutputCache("clamp_pngs", {"size": 1024}, max_size=1024, folder=str(folder)) as cache:
+        assert cache.get(cache.key(copy)) == b"output a"
+        assert cache.get(cache.key(unchanged)) is UNCHANGED
+        assert cache.hits == 2
+    with OutputCache("clamp_pngs", {"size": 512}, max_size=1024, folder=str(folder)) as cache:
+        assert cache.get(cache.key(copy)) is None
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(output_cache, "time", SimpleNamespace(time=lambda: next(clock)))
+    folder = tmp_path / "outputs"
+    folder.mkdir()
+    inputs = [_file(tmp_path, f"{i}.png", b"input %d" % i) for i in range(4)]
+    with OutputCache("clamp_pngs", max_size=250, folder=str(folder)) as cache:
+        keys = [cache.key(path) for path in inputs]
+        output = _file(tmp_path, "output.png", b"x" * 100)
+        cache.put(keys[0], output)
+        cache.put(keys[1], output)
+        assert cache.get(keys[0]) is not None
+        # Over the cap, the entry used longest ago goes
+        cache.put(keys[2], output)
+        assert cache.get(keys[1]) is None
+        assert not os.path.exists(cache._blob_path(keys[1]))
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[2]) is not None
+        # Outputs bigger than the whole cache aren't stored
+        cache.put(keys[3], _file(tmp_path, "big.png", b"x" * 300))
+        assert cache.get(keys[3]) is None
+
+
+def test_disabled(tmp_path):
+    path = _file(tmp_path, "a.png", b"a")
+    with OutputCache("clamp_pngs", max_size=0, folder=str(tmp_path)) as cache:
+        assert cache.key(path) is None
+        assert cache.process(path, lambda: True)
+
+
+def test_write_atomic_from_threads(tmp_path):
+    path = str(tmp_path / "a.bin")
+    threads = [threading.Thread(target=write_atomic, args=(path, bytes([i]) * 100000)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    data = open(path, "rb").read()
+    assert len(data) == 100000 and data == data[:1] * 100000
+    assert os.listdir(tmp_path) == ["a.bin"]
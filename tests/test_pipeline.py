@@ -0,0 +1,20 @@
+import pytest
+
+from pipeline.optimize_all import normalize_recipe
+
+
+def test_bare_names_become_steps():
+    assert normalize_recipe(["mipmaps", {"stage": "pngs", "size": 64}]) == [
+        {"stage": "mipmaps"}, {"stage": "pngs", "size": 64}]
+
+
+@pytest.mark.parametrize("step", [
+    {"stage": "pngs", "max_size": 64},
+    {"stage": "trim_audio", "size": 64},
+    {"stage": "textures", "size": "1024"},
+    {"stage": "textures", "size": True},
+    {"stage": "nope"},
+])
+def test_invalid_steps_are_rejected(step):
+    with pytest.raises(ValueError):
+        normalize_recipe([step])
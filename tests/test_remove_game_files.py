@@ -0,0 +1,17 @@
+from unused_files.remove_game_files import remove_game_files
+from utils.mounts import MountSet
+
+
+def test_loose_content_with_different_case(tmp_path):
+    game = tmp_path / "legacy"
+    (game / "Materials").mkdir(parents=True)
+    (game / "Materials" / "Foo.vmt").write_text('"LightmappedGeneric" {}')
+    addon = tmp_path / "addon"
+    (addon / "materials").mkdir(parents=True)
+    (addon / "materials" / "foo.vmt").write_text('"LightmappedGeneric" {}')
+    mounts = MountSet()
+    mounts.add_folder(str(game))
+
+    size, count = remove_game_files(str(addon), mounts)
+    assert count == 1
+    assert not (addon / "materials" / "foo.vmt").exists()
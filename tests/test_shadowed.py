@@ -0,0 +1,16 @@
+from unused_files.shadowed import shadowed_files
+
+
+def test_only_mounted_paths_are_shadowed(addons_folder):
+    size, count = shadowed_files(str(addons_folder))
+    assert count == 1
+    assert size == len('"LightmappedGeneric" {}')
+
+
+def test_remove_keeps_addon_metadata(addons_folder):
+    shadowed_files(str(addons_folder), remove=True)
+    for name in ("a", "b"):
+        assert (addons_folder / name / "addon.json").exists()
+        assert (addons_folder / name / "LICENSE").exists()
+    assert (addons_folder / "a" / "materials" / "x.vmt").exists()
+    assert not (addons_folder / "b" / "materials" / "x.vmt").exists()
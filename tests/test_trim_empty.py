@@ -0,0 +1,20 @@
+from sound_compression.trim_empty import FAILED, trim_empty_audio, trim_single_audio_file
+from utils import events
+from utils.events import EventBuffer
+
+
+def test_unreadable_file_is_reported_as_failed(tmp_path):
+    path = tmp_path / "sound" / "broken.wav"
+    path.parent.mkdir()
+    path.write_bytes(b"not a wav file")
+
+    status, message, saved = trim_single_audio_file(str(path))
+    assert status == FAILED
+    assert saved == 0
+
+    with events.capture(EventBuffer()) as sink:
+        assert trim_empty_audio(str(tmp_path)) == (0, 0)
+    finished = [event for event in sink.drain() if event.kind == events.FINISHED]
+    assert [event.action for event in finished] == [events.FAILED]
+    assert finished[0].error
+    assert path.read_bytes() == b"not a wav file"
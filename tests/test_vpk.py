@@ -0,0 +1,70 @@
+import os
+from array import array
+
+from utils import vpk
+from utils.vpk import VPKIndex, path_hash
+
+
+def _index(entries):
+    hashes, crcs, sizes = array("Q"), array("I"), array("Q")
+    for path, crc, size in entries:
+        hashes.append(path_hash(path))
+        crcs.append(crc)
+        sizes.append(size)
+    return VPKIndex.from_entries(hashes, crcs, sizes)
+
+
+def test_sorted_lookup():
+    paths = [f"materials/foo{i}.vmt" for i in range(50)]
+    index = _index([(path, i, 100 + i) for i, path in enumerate(paths)])
+    assert list(index.hashes) == sorted(index.hashes)
+    assert len(index) == 50
+    for i, path in enumerate(paths):
+        assert index.lookup(path) == (i, 100 + i, None)
+    assert "Materials\\Foo7.VMT" in index
+    assert "materials/foo50.vmt" not in index
+    assert index.lookup("materials/foo50.vmt") is None
+    assert index.loose_path("materials/foo7.vmt") is None
+
+
+def test_duplicate_paths_keep_first_entry():
+    index = _index([("sound/a.wav", 1, 10), ("Sound/A.wav", 2, 20), ("sound/b.wav", 3, 30)])
+    assert len(index) == 2
+    assert index.lookup("sound/a.wav") == (1, 10, None)
+
+    later = _index([("sound/a.wav", 4, 40), ("sound/c.wav", 5, 50)])
+    merged = VPKIndex.merge([index, later])
+    assert len(merged) == 3
+    assert merged.lookup("sound/a.wav") == (1, 10, None)
+    assert merged.lookup("sound/c.wav") == (5, 50, None)
+
+
+def test_cached_listing_is_invalidated(tmp_path, monkeypatch):
+    path = tmp_path / "pak01_dir.vpk"
+    path.write_bytes(b"vpk")
+    parsed = []
+
+    def fake_parse(vpk_path):
+        parsed.append(vpk_path)
+        return _index([("materials/a.vmt", len(parsed), os.path.getsize(vpk_path))])
+
+    monkeypatch.setattr(vpk, "parse_vpk", fake_parse)
+
+    index, cached = vpk.load_vpk_index(str(path))
+    assert not cached and index.lookup("materials/a.vmt") == (1, 3, None)
+    index, cached = vpk.load_vpk_index(str(path))
+    assert cached and index.lookup("materials/a.vmt") == (1, 3, None)
+
+    # Same size, different mtime
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    index, cached = vpk.load_vpk_index(str(path))
+    assert not cached and index.lookup("materials/a.vmt") == (2, 3, None)
+
+    # Different size, same mtime
+    stat = os.stat(path)
+    path.write_bytes(b"vpk2")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    index, cached = vpk.load_vpk_index(str(path))
+    assert not cached and index.lookup("materials/a.vmt") == (3, 4, None)
+    assert len(parsed) == 3
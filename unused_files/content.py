@@ -2,6 +2,8 @@ import os
 from srctools.mdl import Model
 from srctools.vmt import Material
 from srctools.filesys import RawFileSystem
+from utils import events, tracing
+from utils.cancel import check
 
 model_formats = [
     ".mdl",
@@ -15,7 +17,7 @@ model_formats = [
     ".xbox.vtx",
 ]
 
-def unused_content(path, remove=False):
+def unused_content(path, remove=False, cancel_token=None):
     unused_sizes = 0
     unused_count = 0
     fs = RawFileSystem(path)
@@ -26,11 +28,13 @@ def unused_content(path, remove=False):
     vmt_used_count = {}
     vmf_used_count = {}
     for file in fs.walk_folder(''):
+        check(cancel_token)
         if file.path.endswith('.mdl'):
             all_models.append(file.path)
 
             all_model_vmts[file.path] = all_model_vmts.get(file.path, [])
-            model = Model(fs, fs[file.path])
+            with tracing.span("mdl.parse"):
+                model = Model(fs, fs[file.path])
             for tex in model.iter_textures():
                 # append path relative to the input path
                 all_model_vmts[file.path].append(tex)
@@ -56,6 +60,7 @@ def unused_content(path, remove=False):
     # Find all the models used in lua files
     all_lua_used_models = []
     for file in fs.walk_folder('lua'):
+        check(cancel_token)
         if file.path.endswith('.lua'):
             lua_file_path = os.path.join(path, file.path)
             if os.path.exists(lua_file_path):
@@ -70,6 +75,7 @@ def unused_content(path, remove=False):
     print("Unused models:")
     unused_models = []
     for model in all_models:
+        check(cancel_token)
         if model not in all_lua_used_models:
             no_ext_model = os.path.splitext(model)[0]
             for ext in model_formats:
@@ -85,37 +91,55 @@ def unused_content(path, remove=False):
                             vmf_used_count[vtf] -= 1
 
                     print("Found unused file:", format_path)
-                    unused_sizes += os.path.getsize(format_path)
+                    file_size = os.path.getsize(format_path)
+                    unused_sizes += file_size
                     unused_count += 1
                     if remove:
+                        compressed = events.measure(format_path)
                         os.remove(format_path)
                         print("Removed", format_path)
+                        events.file_finished(format_path, events.REMOVED, file_size, 0, compressed_before=compressed, compressed_after=0)
+                    else:
+                        events.file_finished(format_path, events.FOUND, file_size, file_size)
 
     # Find all the vmts that no longer get used
     unused_vmts = []
     for vmt_used in vmt_used_count:
+        check(cancel_token)
         if vmt_used_count[vmt_used] == 0:
             vmt_file_path = os.path.join(path, vmt_used)
             if os.path.exists(vmt_file_path):
                 unused_vmts.append(vmt_used)
-                unused_sizes += os.path.getsize(vmt_file_path)
+                file_size = os.path.getsize(vmt_file_path)
+                unused_sizes += file_size
                 unused_count += 1
                 print("Found unused file:", vmt_file_path)
                 if remove:
+                    compressed = events.measure(vmt_file_path)
                     os.remove(vmt_file_path)
                     print("Removed", vmt_used)
+                    events.file_finished(vmt_file_path, events.REMOVED, file_size, 0, compressed_before=compressed, compressed_after=0)
+                else:
+                    events.file_finished(vmt_file_path, events.FOUND, file_size, file_size)
     
     unused_vtfs = []
     for vtf_used in vmf_used_count:
+        check(cancel_token)
         if vmf_used_count[vtf_used] == 0:
             vtf_used = "materials/" + vtf_used + ".vtf"
             if os.path.exists(os.path.join(path, vtf_used)):
                 unused_vtfs.append(vtf_used)
-                unused_sizes += os.path.getsize(os.path.join(path, vtf_used))
+                file_size = os.path.getsize(os.path.join(path, vtf_used))
+                unused_sizes += file_size
                 unused_count += 1
                 print("Found unused file:", os.path.join(path, vtf_used))
+                vtf_path = os.path.join(path, vtf_used)
                 if remove:
-                    os.remove(os.path.join(path, vtf_used))
+                    compressed = events.measure(vtf_path)
+                    os.remove(vtf_path)
                     print("Removed", vtf_used)
+                    events.file_finished(vtf_path, events.REMOVED, file_size, 0, compressed_before=compressed, compressed_after=0)
+                else:
+                    events.file_finished(vtf_path, events.FOUND, file_size, file_size)
             
     return unused_sizes, unused_count
@@ -0,0 +1,128 @@
+import os
+import time
+from collections import defaultdict
+from itertools import combinations
+
+from utils import events
+from utils.addons import is_mounted_path, list_addons, walk_files
+from utils.cancel import check
+from utils.formatting import format_size
+from utils.hashing import HashCache, hash_files
+
+# Number of addon pairs shown in the report
+TOP_PAIRS = 25
+
+
+def duplicate_content(addons_folder, remove=False, progress_callback=None, max_workers=None, cancel_token=None):
+    """
+    Find files with identical content in several addons of an addons folder.
+
+    Files are bucketed by size first so only same-size candidates get hashed, and
+    hashes are cached on disk so reruns only hash new or changed files. When removing,
+    only copies that live at the same relative path as the copy that wins the mount
+    order are removed, since the mounted path still resolves to identical content. Files
+    outside the mounted folders (addon.json, LICENSE...) are left out entirely.
+
+    Args:
+        addons_folder: Path to the garrysmod/addons folder
+        remove: If True, remove redundant copies. If False, just report them.
+        progress_callback: Optional callback(current, total) for progress updates
+        max_workers: Number of hashing threads, defaults to the executor default
+        cancel_token: Optional CancelToken, raises Cancelled between files once it's cancelled
+
+    Returns:
+        (redundant bytes removed or found, redundant files removed or found)
+    """
+    start_time = time.time()
+    addons = list_addons(addons_folder)
+    print(f"Scanning {len(addons)} addons in: {addons_folder}")
+
+    # addon index, relative path, full path per file size
+    by_size = defaultdict(list)
+    file_count = 0
+    for addon_index, addon in enumerate(addons):
+        check(cancel_token)
+        for rel_path, stat in walk_files(addon):
+            if not is_mounted_path(rel_path):
+                continue
+            file_count += 1
+            if stat.st_size == 0:
+                continue
+            by_size[stat.st_size].append((addon_index, rel_path, os.path.join(addon, rel_path)))
+
+    # Only sizes found in more than one addon can be duplicated across addons
+    candidates = []
+    for size, files in by_size.items():
+        if len({addon_index for addon_index, _, _ in files}) > 1:
+            candidates.extend((size, file) for file in files)
+
+    print(f"Found {file_count} files, hashing {len(candidates)} same-size candidates...")
+
+    with HashCache() as cache:
+        digests = hash_files((file[2] for _, file in candidates), cache, max_workers, progress_callback, cancel_token)
+
+    groups = defaultdict(list)
+    for size, (addon_index, rel_path, full_path) in candidates:
+        digest = digests.get(full_path)
+        if digest is not None:
+            groups[(size, digest)].append((addon_index, rel_path, full_path))
+
+    pair_bytes = defaultdict(int)
+    redundant_size = 0
+    redundant_count = 0
+    removed_size = 0
+    removed_count = 0
+
+    for (size, _), copies in groups.items():
+        addon_indexes = sorted({addon_index for addon_index, _, _ in copies})
+        if len(addon_indexes) < 2:
+            continue
+
+        for pair in combinations(addon_indexes, 2):
+            pair_bytes[pair] += size
+        redundant_size += size * (len(copies) - 1)
+        redundant_count += len(copies) - 1
+
+        # Copies at the same mounted path: the first addon in mount order wins, the others are dead weight
+        by_path = defaultdict(list)
+        for copy in copies:
+            by_path[copy[1].lower()].append(copy)
+        for same_path in by_path.values():
+            same_path.sort()
+            for addon_index, rel_path, full_path in same_path[1:]:
+                check(cancel_token)
+                removed_size += size
+                removed_count += 1
+                if remove:
+                    try:
+                        compressed = events.measure(full_path)
+                        os.remove(full_path)
+                        print(f"Removed: {os.path.basename(addons[addon_index])}/{rel_path}")
+                        events.file_finished(full_path, events.REMOVED, size, 0, compressed_before=compressed, compressed_after=0)
+                    except OSError as e:
+                        print(f"Failed to remove {full_path}: {e}")
+                        events.file_finished(full_path, events.FAILED, size, size, error=str(e))
+                else:
+                    events.file_finished(full_path, events.FOUND, size, size)
+                    print(f"Redundant copy: {os.path.basename(addons[addon_index])}/{rel_path} "
+                          f"(same as {os.path.basename(addons[same_path[0][0]])})")
+
+    print("="*60)
+    print(f"Duplicated content between addon pairs (top {TOP_PAIRS}):")
+    for (a, b), size in sorted(pair_bytes.items(), key=lambda item: item[1], reverse=True)[:TOP_PAIRS]:
+        print(f"  {format_size(size):>10}  {os.path.basename(addons[a])} <-> {os.path.basename(addons[b])}")
+    if not pair_bytes:
+        print("  No duplicated content found.")
+
+    print("="*60)
+    print(f"Redundant copies: {redundant_count} files, {format_size(redundant_size)}")
+    if remove:
+        print(f"Removed {removed_count} copies at identical mounted paths, saving {format_size(removed_size)}")
+    else:
+        print(f"Removable copies at identical mounted paths: {removed_count} files, {format_size(removed_size)}")
+    print(f"Time taken: {round(time.time() - start_time, 2)} seconds")
+    print("="*60)
+
+    if remove:
+        return removed_size, removed_count
+    return redundant_size, redundant_count
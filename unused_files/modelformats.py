@@ -1,7 +1,9 @@
 import os
+from utils import events
+from utils.cancel import check
 
 
-def unused_model_formats(folder, remove=True, progress_callback=None):
+def unused_model_formats(folder, remove=True, progress_callback=None, cancel_token=None, files=None):
     total_size = 0
     count = 0
 
@@ -12,33 +14,31 @@ def unused_model_formats(folder, remove=True, progress_callback=None):
         ".360.vtx"
     ]
 
-    # First pass: count files to remove
-    files_to_process = []
-    if progress_callback:
-        for root, _, files in os.walk(folder):
-            for file in files:
-                for fmt in formats_to_remove:
-                    if file.endswith(fmt):
-                        files_to_process.append((root, file))
-        total_count = len(files_to_process)
-        processed = 0
-
-    for root, _, files in os.walk(folder):
-        for file in files:
-            for fmt in formats_to_remove:
-                if file.endswith(fmt):
-                    file_path = os.path.join(root, file)
-                    total_size += os.path.getsize(file_path)
-                    if remove:
-                        os.remove(file_path)
-                        print("Removed", file_path)
-                    else:
-                        print("Found unused file:", file_path)
-                    count += 1
-                    
-                    if progress_callback:
-                        processed += 1
-                        progress_callback(processed, total_count)
+    # First pass: collect files to remove, from the caller's file list if there is one
+    if files is None:
+        files = []
+        for root, _, names in os.walk(folder):
+            for name in names:
+                files.append(os.path.join(root, name))
+    files_to_process = [file_path for file_path in files if file_path.endswith(tuple(formats_to_remove))]
+    total_count = len(files_to_process)
+
+    for processed, file_path in enumerate(files_to_process, 1):
+        check(cancel_token)
+        file_size = os.path.getsize(file_path)
+        total_size += file_size
+        if remove:
+            compressed = events.measure(file_path)
+            os.remove(file_path)
+            print("Removed", file_path)
+            events.file_finished(file_path, events.REMOVED, file_size, 0, compressed_before=compressed, compressed_after=0)
+        else:
+            print("Found unused file:", file_path)
+            events.file_finished(file_path, events.FOUND, file_size, file_size)
+        count += 1
+
+        if progress_callback:
+            progress_callback(processed, total_count)
 
 
     return total_size, count
@@ -1,52 +1,110 @@
+import filecmp
 import os
-from utils.vpk import get_vpk_files
+from concurrent.futures import ThreadPoolExecutor
+from utils import events
+from utils.cancel import check, is_cancelled
+from utils.hashing import crc32_file
+from utils.mounts import get_mounted_files
 
-def remove_game_files(folder, gamefolder, remove=True):
+
+def _matches_game_file(file_path, expected_crc, loose_path):
+    """
+    Check a file against the CRC32 stored in the VPK directory, without extracting anything.
+    Files provided by a loose mounted folder are compared byte for byte instead.
+    """
+    try:
+        if loose_path is not None:
+            return filecmp.cmp(file_path, loose_path, shallow=False)
+        return crc32_file(file_path) == expected_crc
+    except OSError as e:
+        print(f"Failed to read {file_path}: {e}")
+        return False
+
+
+def remove_game_files(folder, gamefolder, remove=True, max_workers=None, cancel_token=None):
     """
-    Remove files that exist in the game's VPK files from the addon folder.
-    
+    Remove files that exist in the mounted game content from the addon folder.
+
+    Only files that are byte-identical to the game's copy (same size and CRC32 as
+    stored in the VPK directory) are removed. Files with the same path but different
+    content override the game's file and are reported separately.
+
     Args:
         folder: Path to the addon folder to clean
-        gamefolder: Path to the game folder containing VPK files
+        gamefolder: Path to the game folder containing VPK files, or a MountSet
         remove: If True, actually remove files. If False, just report what would be removed.
+        max_workers: Number of threads used to checksum files, defaults to the executor default
+        cancel_token: Optional CancelToken, raises Cancelled between files once it's cancelled
+
+    Returns:
+        (bytes removed, files removed)
     """
     print("Removing game files...")
-    
-    # Get all files from VPK archives
-    vpk_files = get_vpk_files(gamefolder)
-    
+
+    # Get all files from the mounted VPK archives and folders
+    vpk_files = get_mounted_files(gamefolder)
+
     if not vpk_files:
-        print("No files found in VPK archives. Nothing to remove.")
-        return
-    
+        print("No files found in mounted game content. Nothing to remove.")
+        return 0, 0
+
     # Find files in the addon folder that match VPK files
     removed_count = 0
     removed_size = 0
-    
+    overrides = []
+    candidates = []
+
     print(f"Scanning addon folder: {folder}")
-    
+
     for root, dirs, files in os.walk(folder):
+        check(cancel_token)
         for file in files:
             file_path = os.path.join(root, file)
-            
+
             # Get relative path from the addon folder
             rel_path = os.path.relpath(file_path, folder)
             rel_path = os.path.normpath(rel_path)
-            
-            # Check if this file exists in any VPK
-            if rel_path in vpk_files:
-                file_size = os.path.getsize(file_path)
-                removed_size += file_size
-                removed_count += 1
-                
-                if remove:
-                    try:
-                        os.remove(file_path)
-                        print(f"Removed: {rel_path}")
-                    except Exception as e:
-                        print(f"Failed to remove {rel_path}: {e}")
-                else:
-                    print(f"Would remove: {rel_path}")
+
+            # Check if this file exists in the mounted content
+            entry = vpk_files.lookup(rel_path)
+            if entry is None:
+                continue
+
+            expected_crc, expected_size, loose_root = entry
+            file_size = os.path.getsize(file_path)
+            if file_size != expected_size:
+                overrides.append((rel_path, file_size))
+                continue
+
+            # The mounted copy's own path, its case can differ from the addon's
+            loose_path = os.path.join(loose_root, vpk_files.loose_path(rel_path)) if loose_root is not None else None
+            candidates.append((file_path, rel_path, file_size, expected_crc, loose_path))
+
+    # Checksum the candidates that have the same size as the game's copy
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        matches = executor.map(lambda candidate: not is_cancelled(cancel_token) and _matches_game_file(candidate[0], candidate[3], candidate[4]), candidates)
+
+        for (file_path, rel_path, file_size, _, _), identical in zip(candidates, matches):
+            check(cancel_token)
+            if not identical:
+                overrides.append((rel_path, file_size))
+                continue
+
+            removed_size += file_size
+            removed_count += 1
+
+            if remove:
+                try:
+                    compressed = events.measure(file_path)
+                    os.remove(file_path)
+                    print(f"Removed: {rel_path}")
+                    events.file_finished(file_path, events.REMOVED, file_size, 0, compressed_before=compressed, compressed_after=0)
+                except Exception as e:
+                    print(f"Failed to remove {rel_path}: {e}")
+                    events.file_finished(file_path, events.FAILED, file_size, file_size, error=str(e))
+            else:
+                print(f"Would remove: {rel_path}")
+                events.file_finished(file_path, events.FOUND, file_size, file_size)
 
     # check for empty directories and remove them
     for root, dirs, files in os.walk(folder, topdown=False):
@@ -61,15 +119,23 @@ def remove_game_files(folder, gamefolder, remove=True):
                         print(f"Failed to remove directory {dir_path}: {e}")
                 else:
                     print("Would remove empty directory: %s" % os.path.relpath(dir_path, folder).replace('\\', '/'))
-    
+
+    if overrides:
+        print("="*60)
+        print(f"Kept {len(overrides)} file(s) that override game files with different content:")
+        for rel_path, file_size in sorted(overrides):
+            print(f"  Override: {rel_path} ({round(file_size / 1000, 2)} KB)")
+
     print("="*60)
     if remove:
         print(f"Removed {removed_count} game files.")
     else:
         print(f"Would remove {removed_count} game files.")
-    
+
     if removed_count == 0:
         print("No game files were found in the addon folder.")
     else:
         print(f"Freed up {round(removed_size / 1000000, 2)} MB of space")
     print("="*60)
+
+    return removed_size, removed_count
@@ -0,0 +1,87 @@
+import os
+import time
+from collections import defaultdict
+
+from utils import events
+from utils.addons import is_mounted_path, list_addons, walk_files
+from utils.cancel import check
+from utils.formatting import format_size
+
+
+def shadowed_files(addons_folder, remove=False, progress_callback=None, cancel_token=None):
+    """
+    Find files that are shadowed by the same path in an addon that mounts earlier.
+
+    Only one copy of a path is used once addons are mounted, the others still get
+    sent to clients. Paths are compared case-insensitively like the game does. Only mounted
+    content counts, addon metadata like addon.json is in every addon and never shadowed.
+
+    Args:
+        addons_folder: Path to the garrysmod/addons folder
+        remove: If True, remove shadowed copies. If False, just report them.
+        progress_callback: Optional callback(current, total) for progress updates
+        cancel_token: Optional CancelToken, raises Cancelled between files once it's cancelled
+
+    Returns:
+        (bytes removed or found, files removed or found)
+    """
+    start_time = time.time()
+    addons = list_addons(addons_folder)
+    total_addons = len(addons)
+    print(f"Scanning {total_addons} addons in: {addons_folder}")
+
+    # lowercase relative path -> index of the addon whose copy is used
+    effective = {}
+    shadowed_size = 0
+    shadowed_count = 0
+    per_addon = defaultdict(lambda: [0, 0])
+
+    for addon_index, addon in enumerate(addons):
+        addon_name = os.path.basename(addon)
+        for rel_path, stat in walk_files(addon):
+            check(cancel_token)
+            if not is_mounted_path(rel_path):
+                continue
+            key = rel_path.lower()
+            winner = effective.setdefault(key, addon_index)
+            if winner == addon_index:
+                continue
+
+            shadowed_size += stat.st_size
+            shadowed_count += 1
+            per_addon[addon_name][0] += stat.st_size
+            per_addon[addon_name][1] += 1
+
+            file_path = os.path.join(addon, rel_path)
+            winner_name = os.path.basename(addons[winner])
+            if remove:
+                try:
+                    compressed = events.measure(file_path)
+                    os.remove(file_path)
+                    print(f"Removed: {addon_name}/{rel_path} (shadowed by {winner_name})")
+                    events.file_finished(file_path, events.REMOVED, stat.st_size, 0, compressed_before=compressed, compressed_after=0)
+                except OSError as e:
+                    print(f"Failed to remove {file_path}: {e}")
+                    events.file_finished(file_path, events.FAILED, stat.st_size, stat.st_size, error=str(e))
+            else:
+                events.file_finished(file_path, events.FOUND, stat.st_size, stat.st_size)
+                print(f"Shadowed: {addon_name}/{rel_path} ({format_size(stat.st_size)}) by {winner_name}")
+
+        if progress_callback:
+            progress_callback(addon_index + 1, total_addons)
+
+    print("="*60)
+    if per_addon:
+        print("Shadowed content per addon:")
+        for addon_name, (size, count) in sorted(per_addon.items(), key=lambda item: item[1][0], reverse=True):
+            print(f"  {format_size(size):>10}  {count} files  {addon_name}")
+        print("="*60)
+
+    if remove:
+        print(f"Removed {shadowed_count} shadowed files, saving {format_size(shadowed_size)}")
+    else:
+        print(f"Found {shadowed_count} shadowed files, taking up {format_size(shadowed_size)}")
+    print(f"Checked {len(effective)} unique paths in {round(time.time() - start_time, 2)} seconds")
+    print("="*60)
+
+    return shadowed_size, shadowed_count
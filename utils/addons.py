@@ -0,0 +1,49 @@
+import os
+from typing import Iterator, List
+
+# Top level folders of an addon that the game mounts, everything else (addon.json, LICENSE,
+# README.md, .git...) is metadata or ignored by gmad and never ends up in the game's filesystem
+MOUNTED_FOLDERS = frozenset({
+    "backgrounds", "data_static", "gamemodes", "lua", "maps", "materials", "models", "particles",
+    "resource", "scenes", "scripts", "shaders", "sound",
+})
+
+
+def is_mounted_path(rel_path: str) -> bool:
+    """Whether a relative path inside an addon (forward slashes) is part of the mounted content."""
+    folder, separator, _ = rel_path.partition("/")
+    return bool(separator) and folder.lower() in MOUNTED_FOLDERS
+
+
+def list_addons(addons_folder: str) -> List[str]:
+    """
+    Get the legacy addon folders in an addons folder, in mount order.
+
+    Garry's Mod mounts legacy addons alphabetically and the first addon that
+    provides a path wins, so earlier folders in the list take priority.
+    """
+    if not os.path.isdir(addons_folder):
+        return []
+    addons = []
+    for name in sorted(os.listdir(addons_folder), key=str.lower):
+        path = os.path.join(addons_folder, name)
+        if os.path.isdir(path):
+            addons.append(path)
+    return addons
+
+
+def walk_files(root: str, prefix: str = "") -> Iterator[tuple[str, os.stat_result]]:
+    """Yield (relative path with forward slashes, stat) for every file below root, using scandir for speed."""
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        rel_path = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_files(entry.path, rel_path + "/")
+        elif entry.is_file():
+            try:
+                yield rel_path, entry.stat()
+            except OSError:
+                pass
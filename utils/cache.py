@@ -0,0 +1,80 @@
+import hashlib
+import os
+import sys
+import tempfile
+
+APP_NAME = "gm_addon_optimization_tricks"
+
+# Read once, os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def get_cache_dir(*parts: str) -> str:
+    """
+    Get (and create) a folder inside the per-user cache directory.
+
+    Args:
+        *parts: Optional sub folders inside the cache directory
+
+    Returns:
+        Absolute path to the cache folder
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+
+    path = os.path.join(base, APP_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_config_dir(*parts: str) -> str:
+    """
+    Get (and create) a folder inside the per-user config directory, for things that
+    shouldn't disappear when the cache is cleared (eg saved presets).
+
+    Args:
+        *parts: Optional sub folders inside the config directory
+
+    Returns:
+        Absolute path to the config folder
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~\\AppData\\Roaming")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+
+    path = os.path.join(base, APP_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_key(*values) -> str:
+    """Short stable file name for a set of values (eg an absolute path)."""
+    text = "\0".join(str(value) for value in values)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def write_atomic(path: str, data: bytes):
+    """
+    Write a file through a temporary file so readers never see half-written data.
+
+    The temporary file has a unique name, so threads writing the same path don't clobber each
+    other's, and the file keeps its permissions (new files get the usual ones, not mkstemp's 0600).
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,73 @@
+import subprocess
+import threading
+
+# How often a running subprocess looks at the token, in seconds
+POLL_INTERVAL = 0.2
+
+
+class Cancelled(Exception):
+    """Raised by CancelToken.check once cancellation was requested."""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag shared between the UI and a running operation.
+
+    Operations check it between files, never in the middle of writing one. Where stopping
+    halfway would leave things inconsistent (eg sounds converted but references not updated
+    yet) they look at `cancelled`, skip the remaining files and finish up; otherwise they
+    call `check()`, which raises Cancelled. Long running subprocesses (ffmpeg) go through
+    run_process, which stops them as soon as the token is cancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled("Cancelled")
+
+
+def is_cancelled(cancel_token) -> bool:
+    """True if the optional token was cancelled."""
+    return cancel_token is not None and cancel_token.cancelled
+
+
+def check(cancel_token):
+    """Raise Cancelled if the optional token was cancelled."""
+    if cancel_token is not None:
+        cancel_token.check()
+
+
+def run_process(args, cancel_token=None) -> bytes:
+    """
+    Run a command to completion and return its stderr, for long running tools like ffmpeg.
+
+    The token is looked at while the command runs and the process is terminated once it's
+    cancelled, then Cancelled is raised. Raises CalledProcessError if the command fails.
+    """
+    process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    while True:
+        try:
+            _, stderr = process.communicate(timeout=POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            if is_cancelled(cancel_token):
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                process.stderr.close()
+                raise Cancelled("Cancelled")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stderr=stderr)
+    return stderr
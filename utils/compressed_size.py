@@ -0,0 +1,184 @@
+import bz2
+import lzma
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from utils.addons import walk_files
+from utils.cache import get_cache_dir
+from utils.cancel import check, is_cancelled
+from utils.hashing import CHUNK_SIZE, HashCache, hash_file, hash_files
+
+# Workshop downloads are LZMA compressed, FastDL serves bzip2 files
+LZMA = "lzma"
+BZ2 = "bz2"
+
+
+def _new_compressor(method: str):
+    if method == LZMA:
+        return lzma.LZMACompressor(format=lzma.FORMAT_ALONE)
+    if method == BZ2:
+        return bz2.BZ2Compressor(9)
+    raise ValueError(f"Unknown compression method: {method}")
+
+
+def compressed_size(path: str, method: str = LZMA) -> int:
+    """Size of a file after compression, streamed so large files aren't loaded at once."""
+    compressor = _new_compressor(method)
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            size += len(compressor.compress(chunk))
+    return size + len(compressor.flush())
+
+
+class CompressedSizeCache:
+    """Persistent cache of compressed sizes keyed by content hash and method."""
+
+    def __init__(self, db_path: Optional[str] = None, check_same_thread: bool = True):
+        if db_path is None:
+            db_path = os.path.join(get_cache_dir(), "compressed_sizes.sqlite")
+        self.db = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sizes (digest TEXT, method TEXT, size INTEGER, PRIMARY KEY (digest, method))"
+        )
+
+    def get(self, digest: str, method: str) -> Optional[int]:
+        row = self.db.execute("SELECT size FROM sizes WHERE digest = ? AND method = ?", (digest, method)).fetchone()
+        return row[0] if row else None
+
+    def put(self, digest: str, method: str, size: int):
+        self.db.execute("INSERT OR REPLACE INTO sizes (digest, method, size) VALUES (?, ?, ?)", (digest, method, size))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompressedSizer:
+    """
+    Compressed size of single files as operations process them, for before/after reports.
+
+    Sizes come from the same CompressedSizeCache as the download size estimate, keyed by
+    content hash, so files the estimate already measured aren't compressed again. Safe to
+    share between threads.
+    """
+
+    def __init__(self, method: str = LZMA, db_path: Optional[str] = None):
+        self.method = method
+        self.cache = CompressedSizeCache(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def measure(self, path: str) -> Optional[int]:
+        """Compressed size of a file, None if it can't be read."""
+        try:
+            digest = hash_file(path)
+            with self._lock:
+                size = self.cache.get(digest, self.method)
+            if size is not None:
+                return size
+            size = compressed_size(path, self.method)
+        except OSError:
+            return None
+        with self._lock:
+            try:
+                self.cache.put(digest, self.method, size)
+                self.cache.db.commit()
+            except sqlite3.OperationalError:
+                # The download size estimate is writing, the size just isn't cached this time
+                pass
+        return size
+
+    def close(self):
+        with self._lock:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compressed_sizes(paths: Iterable[str], method: str = LZMA, max_workers: Optional[int] = None,
+                     progress_callback=None, cancel_token=None) -> Dict[str, int]:
+    """
+    Compressed size of many files, computed in parallel.
+
+    Results are cached by content hash, so only new or changed content gets compressed.
+    Once cancel_token is cancelled the remaining files are skipped and Cancelled is raised,
+    sizes computed so far stay cached.
+
+    Returns:
+        Dict of path -> compressed size, files that couldn't be read are left out
+    """
+    with HashCache() as hash_cache:
+        digests = hash_files(paths, hash_cache, max_workers, cancel_token=cancel_token)
+
+    sizes = {}
+    with CompressedSizeCache() as cache:
+        to_compress = {}
+        for path, digest in digests.items():
+            size = cache.get(digest, method)
+            if size is not None:
+                sizes[path] = size
+            else:
+                to_compress.setdefault(digest, []).append(path)
+
+        def compress(digest):
+            if is_cancelled(cancel_token):
+                return None
+            path = to_compress[digest][0]
+            try:
+                return compressed_size(path, method)
+            except OSError as e:
+                print(f"Failed to read {path}: {e}")
+                return None
+
+        total = len(to_compress)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for idx, (digest, size) in enumerate(zip(to_compress, executor.map(compress, to_compress)), 1):
+                if size is not None:
+                    cache.put(digest, method, size)
+                    for path in to_compress[digest]:
+                        sizes[path] = size
+                if progress_callback:
+                    progress_callback(idx, total)
+
+    check(cancel_token)
+    return sizes
+
+
+def estimate_download_size(folder: str, method: str = LZMA, max_workers: Optional[int] = None,
+                           progress_callback=None, cancel_token=None) -> tuple[int, int]:
+    """
+    Estimate how much clients download for a folder (or a single file like a .gma).
+
+    Every file is compressed on its own, so this slightly overestimates archives that
+    are compressed as a whole.
+
+    Returns:
+        (raw bytes, compressed bytes)
+    """
+    if os.path.isfile(folder):
+        paths = [folder]
+    else:
+        paths = [os.path.join(folder, rel_path) for rel_path, _ in walk_files(folder)]
+
+    raw_size = 0
+    for path in paths:
+        try:
+            raw_size += os.path.getsize(path)
+        except OSError:
+            pass
+
+    sizes = compressed_sizes(paths, method, max_workers, progress_callback, cancel_token)
+    return raw_size, sum(sizes.values())
@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional, TextIO
+
+from utils.cancel import Cancelled
+
+# Event kinds
+STARTED = "started"
+FINISHED = "finished"
+
+# Common actions, operations can use their own too
+CONVERTED = "converted"
+RESIZED = "resized"
+COMPRESSED = "compressed"
+COPIED = "copied"
+REMOVED = "removed"
+FOUND = "found"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class FileEvent(NamedTuple):
+    kind: str
+    path: str
+    action: str = ""
+    bytes_before: int = 0
+    bytes_after: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+    time: float = 0.0
+    # Only measured when compressed sizes are turned on, see set_compressed_sizes
+    compressed_before: Optional[int] = None
+    compressed_after: Optional[int] = None
+
+
+class EventBuffer:
+    """Collects events from any thread until a consumer drains them in a batch."""
+
+    def __init__(self):
+        self._events: List[FileEvent] = []
+        self._lock = threading.Lock()
+
+    def emit(self, event: FileEvent):
+        with self._lock:
+            self._events.append(event)
+
+    def drain(self) -> List[FileEvent]:
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+
+class JsonLinesWriter:
+    """Writes every event as one JSON object per line, for scripts consuming the results."""
+
+    def __init__(self, fp: TextIO):
+        self.fp = fp
+        self._lock = threading.Lock()
+
+    def emit(self, event: FileEvent):
+        line = json.dumps(event._asdict())
+        with self._lock:
+            self.fp.write(line + "\n")
+
+
+_sinks = []
+_sizer = None
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+@contextmanager
+def capture(sink):
+    """Send events emitted by operations to a sink while the block runs."""
+    add_sink(sink)
+    try:
+        yield sink
+    finally:
+        remove_sink(sink)
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+def set_compressed_sizes(sizer):
+    """
+    Also report the compressed (download) size of files before and after processing them,
+    measured by a CompressedSizer. None turns it off. Costs compressing every processed file
+    whose content isn't in the compressed size cache yet.
+    """
+    global _sizer
+    _sizer = sizer
+
+
+def measure(path: str) -> Optional[int]:
+    """Compressed size of a file if compressed sizes are reported, call it before removing a file."""
+    if _sizer is None or not _sinks:
+        return None
+    return _sizer.measure(path)
+
+
+def _emit(event: FileEvent):
+    for sink in list(_sinks):
+        sink.emit(event)
+
+
+def file_started(path: str, bytes_before: int = 0):
+    if _sinks:
+        _emit(FileEvent(STARTED, path, bytes_before=bytes_before, time=time.time()))
+
+
+def file_finished(path: str, action: str, bytes_before: int = 0, bytes_after: int = 0,
+                  duration: float = 0.0, error: Optional[str] = None,
+                  compressed_before: Optional[int] = None, compressed_after: Optional[int] = None):
+    if _sinks:
+        _emit(FileEvent(FINISHED, path, action, bytes_before, bytes_after, duration, error, time.time(),
+                        compressed_before, compressed_after))
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class Tracked:
+    """Result of a tracked file, the block can change the action, the size or the error afterwards."""
+
+    def __init__(self, action: str):
+        self.action = action
+        self.bytes_after: Optional[int] = None
+        # The replacement file, if processing replaced the file with another one
+        self.output_path: Optional[str] = None
+        # Set with action FAILED when the file failed without raising
+        self.error: Optional[str] = None
+
+
+@contextmanager
+def track(path: str, action: str = ""):
+    """
+    Emit started/finished events around processing a single file.
+
+    The sizes before and after are taken from the file itself. If processing replaces the
+    file with another one (eg a .wav converted to .ogg), set bytes_after and output_path on
+    the yielded Tracked to the size and path of the replacement. Output written somewhere else shouldn't be
+    tracked on the source path, the size difference would count against its folder.
+    Exceptions are reported as a failed file and re-raised, cancelling as a skipped one.
+    """
+    tracked = Tracked(action)
+    if not _sinks:
+        yield tracked
+        return
+    bytes_before = _size(path)
+    compressed_before = measure(path)
+    file_started(path, bytes_before)
+    start = time.perf_counter()
+    try:
+        yield tracked
+    except Cancelled:
+        # Stopped in the middle of the file, which is left as it was
+        file_finished(path, SKIPPED, bytes_before, bytes_before, time.perf_counter() - start,
+                      compressed_before=compressed_before, compressed_after=compressed_before)
+        raise
+    except Exception as e:
+        file_finished(path, FAILED, bytes_before, bytes_before, time.perf_counter() - start, str(e),
+                      compressed_before, compressed_before)
+        raise
+    duration = time.perf_counter() - start
+    bytes_after = tracked.bytes_after if tracked.bytes_after is not None else _size(path)
+    compressed_after = measure(tracked.output_path or path) if compressed_before is not None else None
+    file_finished(path, tracked.action, bytes_before, bytes_after, duration, tracked.error,
+                  compressed_before=compressed_before, compressed_after=compressed_after)
+
+
+class EventStats:
+    """
+    Running totals over finished events, used to show rates and an ETA.
+
+    If a root folder is given, size_delta tracks how much the files below it grew or shrank,
+    so the folder size can be kept up to date without walking it again.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.normcase(os.path.abspath(root)) + os.sep if root else None
+        self.size_delta = 0
+        self.start = time.time()
+        self.files = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        # Totals over the files whose compressed sizes were measured
+        self.compressed_files = 0
+        self.compressed_before = 0
+        self.compressed_after = 0
+        self.actions = {}
+
+    def add(self, events: List[FileEvent]):
+        for event in events:
+            if event.kind != FINISHED:
+                continue
+            self.files += 1
+            self.bytes_before += event.bytes_before
+            self.bytes_after += event.bytes_after
+            if event.compressed_before is not None and event.compressed_after is not None:
+                self.compressed_files += 1
+                self.compressed_before += event.compressed_before
+                self.compressed_after += event.compressed_after
+            self.actions[event.action] = self.actions.get(event.action, 0) + 1
+            if self.root is not None and os.path.normcase(os.path.abspath(event.path)).startswith(self.root):
+                self.size_delta += event.bytes_after - event.bytes_before
+            if event.error is not None:
+                self.failed += 1
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.time() - self.start, 1e-6)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_before / self.elapsed
+
+    def eta(self, current: int, total: int) -> Optional[float]:
+        """Seconds left, extrapolated from progress so far."""
+        if current <= 0 or total <= 0 or current > total:
+            return None
+        return self.elapsed * (total - current) / current
+
+
+class StatsSink:
+    """Event sink that only keeps the running totals."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.stats = EventStats(root)
+        self._lock = threading.Lock()
+
+    def emit(self, event: FileEvent):
+        with self._lock:
+            self.stats.add([event])
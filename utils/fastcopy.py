@@ -0,0 +1,117 @@
+import os
+import shutil
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from utils import events
+from utils.cancel import check, is_cancelled
+
+SKIPPED = "skipped"
+REFLINKED = "reflinked"
+LINKED = "linked"
+COPIED = "copied"
+
+# ioctl that clones file extents on Linux (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+def is_up_to_date(src: str, dest: str) -> bool:
+    """A destination is up to date if it has the same size and isn't older than the source."""
+    try:
+        src_stat = os.stat(src)
+        dest_stat = os.stat(dest)
+    except OSError:
+        return False
+    return src_stat.st_size == dest_stat.st_size and dest_stat.st_mtime_ns >= src_stat.st_mtime_ns
+
+
+def _reflink(src: str, dest: str) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    tmp_path = dest + ".tmp"
+    try:
+        with open(src, "rb") as src_file, open(tmp_path, "wb") as dest_file:
+            fcntl.ioctl(dest_file.fileno(), _FICLONE, src_file.fileno())
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dest)
+        return True
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def _hardlink(src: str, dest: str) -> bool:
+    try:
+        if os.path.lexists(dest):
+            os.remove(dest)
+        os.link(src, dest)
+        return True
+    except OSError:
+        return False
+
+
+def link_or_copy(src: str, dest: str, hardlinks: bool = False) -> str:
+    """
+    Put a copy of src at dest as cheaply as the filesystem allows.
+
+    Skips destinations that are already up to date, then tries a reflink (copy-on-write
+    clone), then a hardlink if allowed, and falls back to a regular copy.
+
+    Args:
+        src: File to copy
+        dest: Destination path, parent folders are created
+        hardlinks: Allow hardlinks. Hardlinked files share their content, so editing
+            the copy also edits the original.
+
+    Returns:
+        What was done: SKIPPED, REFLINKED, LINKED or COPIED
+    """
+    if is_up_to_date(src, dest):
+        return SKIPPED
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if _reflink(src, dest):
+        return REFLINKED
+    if hardlinks and _hardlink(src, dest):
+        return LINKED
+    shutil.copy2(src, dest)
+    return COPIED
+
+
+def copy_files(pairs: Iterable[tuple[str, str]], hardlinks: bool = False, max_workers: Optional[int] = None,
+               progress_callback=None, cancel_token=None) -> Counter:
+    """
+    Copy many (src, dest) pairs concurrently with link_or_copy.
+
+    Once cancel_token is cancelled the remaining pairs are skipped and Cancelled is raised
+    after the copies in flight are done.
+
+    Returns:
+        Counter of how many files were skipped, reflinked, linked, copied or failed
+    """
+    pairs = list(pairs)
+    total = len(pairs)
+    results = Counter()
+
+    def copy(pair):
+        if is_cancelled(cancel_token):
+            return SKIPPED
+        try:
+            with events.track(pair[0], events.COPIED) as tracked:
+                tracked.action = link_or_copy(pair[0], pair[1], hardlinks)
+            return tracked.action
+        except OSError as e:
+            print(f"Failed to copy {pair[0]}: {e}")
+            return events.FAILED
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for idx, result in enumerate(executor.map(copy, pairs), 1):
+            results[result] += 1
+            if progress_callback:
+                progress_callback(idx, total)
+    check(cancel_token)
+    return results
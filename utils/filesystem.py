@@ -0,0 +1,106 @@
+import io
+import os
+import threading
+from typing import BinaryIO, Dict, Iterator, List, TextIO, Union
+
+import sourcepp
+from srctools.filesys import CACHE_KEY_INVALID, File, FileSystem
+
+from utils.mounts import FOLDER, MountSet
+from utils.vpk import normalize_path
+
+
+class MountedFileSystem(FileSystem[tuple]):
+    """
+    srctools filesystem that reads from the VPKs and loose folders of a MountSet.
+
+    Lookups go through the MountSet's per-root path hash indexes, so finding which
+    VPK provides a file doesn't open any VPK. VPKs are opened with sourcepp.vpkpp
+    the first time a file is read from them and entries are read without extracting
+    anything to disk. Safe to share between threads.
+
+    Files keep the lowercase normalized path as their name, loose folder files also
+    remember the path they have on disk, which is the one they're opened by.
+    """
+
+    def __init__(self, mounts: MountSet):
+        super().__init__(f"<mounted content: {len(mounts.roots)} roots>")
+        self.mounts = mounts
+        self.mounts.build()
+        self._vpks: Dict[str, object] = {}
+        # Entry paths of every VPK walked so far, the index only keeps their hashes
+        self._vpk_listings: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _open_vpk(self, vpk_path: str):
+        vpk = self._vpks.get(vpk_path)
+        if vpk is None:
+            vpk = sourcepp.vpkpp.VPK.open(vpk_path)
+            if vpk is None:
+                raise OSError(f"Couldn't open VPK: {vpk_path}")
+            self._vpks[vpk_path] = vpk
+        return vpk
+
+    def _file_exists(self, name: str) -> bool:
+        return self.mounts.locate(name) is not None
+
+    def _get_file(self, name: str) -> File:
+        root = self.mounts.locate(name)
+        if root is None:
+            raise FileNotFoundError(name)
+        path = normalize_path(name)
+        if root[0] == FOLDER:
+            return File(self, path, root + (self.mounts.build().loose_path(name) or path,))
+        return File(self, path, root + (path,))
+
+    def _read(self, file: File) -> bytes:
+        kind, root_path, disk_path = self._get_data(file)
+        if kind == FOLDER:
+            with open(os.path.join(root_path, disk_path), "rb") as f:
+                return f.read()
+        with self._lock:
+            data = self._open_vpk(root_path).read_entry(file.path)
+        if data is None:
+            raise FileNotFoundError(file.path)
+        return data
+
+    def _resolve(self, name: Union[str, File]) -> File:
+        if isinstance(name, File):
+            return name
+        return self._get_file(name)
+
+    def open_bin(self, name: Union[str, File]) -> BinaryIO:
+        return io.BytesIO(self._read(self._resolve(name)))
+
+    def open_str(self, name: Union[str, File], encoding: str = "utf8") -> TextIO:
+        return io.TextIOWrapper(io.BytesIO(self._read(self._resolve(name))), encoding)
+
+    def _listing(self, kind: str, root_path: str, index) -> List[str]:
+        """Paths of every file in a root, as found on disk for loose folders."""
+        if kind == FOLDER:
+            return list(index.loose_paths.values())
+        with self._lock:
+            paths = self._vpk_listings.get(root_path)
+            if paths is None:
+                paths = []
+                self._open_vpk(root_path).run_for_all_entries(lambda path, entry: paths.append(path))
+                self._vpk_listings[root_path] = paths
+        return paths
+
+    def walk_folder(self, folder: str = "") -> Iterator[File]:
+        """Yield files in a folder, files provided by several roots are only yielded once."""
+        folder = normalize_path(folder).rstrip("/")
+        prefix = folder + "/" if folder else ""
+        seen = set()
+        for (kind, root_path), index in self.mounts.build_roots():
+            for disk_path in self._listing(kind, root_path, index):
+                path = normalize_path(disk_path)
+                if path.startswith(prefix) and path not in seen:
+                    seen.add(path)
+                    yield File(self, path, (kind, root_path, disk_path))
+
+    def _get_cache_key(self, file: File) -> int:
+        entry = self.mounts.build().lookup(file.path)
+        if entry is None or entry[0] is None:
+            return CACHE_KEY_INVALID
+        return entry[0]
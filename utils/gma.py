@@ -0,0 +1,305 @@
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+
+from utils.addons import walk_files
+from utils.hashing import CHUNK_SIZE, crc32_combine
+
+GMA_IDENT = b"GMAD"
+GMA_VERSION = 3
+
+
+class GMAHeader(NamedTuple):
+    name: str = ""
+    description: str = ""
+    author: str = "Author Name"
+    steamid: int = 0
+    timestamp: int = 0
+    required_content: tuple = ()
+    addon_version: int = 1
+    version: int = GMA_VERSION
+
+
+class GMAEntry(NamedTuple):
+    name: str
+    size: int
+    crc: int
+    offset: int  # absolute offset of the file data in the .gma
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of GMA file")
+    return data
+
+
+def _read_cstring(f: BinaryIO) -> str:
+    data = bytearray()
+    while True:
+        char = f.read(1)
+        if not char:
+            raise ValueError("Unexpected end of GMA file")
+        if char == b"\0":
+            return data.decode("utf-8", errors="replace")
+        data += char
+
+
+def _cstring(text: str) -> bytes:
+    return text.encode("utf-8") + b"\0"
+
+
+def _entry_path(dest_folder: str, name: str) -> str:
+    """
+    Destination of an entry below dest_folder. .gma files are untrusted, names that could
+    write anywhere else (absolute, drive letters, empty or .. parts, symlinks out) raise ValueError.
+    """
+    parts = re.split(r"[/\\]", name)
+    if not name or re.match(r"^[A-Za-z]:", name) or any(part in ("", "..") for part in parts):
+        raise ValueError(f"Unsafe file name in GMA: {name!r}")
+    dest_path = os.path.join(dest_folder, *parts)
+    root = os.path.realpath(dest_folder)
+    if os.path.commonpath([root, os.path.realpath(dest_path)]) != root:
+        raise ValueError(f"Unsafe file name in GMA: {name!r}")
+    return dest_path
+
+
+class GMAReader:
+    """
+    Reads a Garry's Mod .gma archive without loading file data into memory.
+
+    Use as a context manager, entries are available right after opening and their
+    data can be streamed out with iter_chunks or extract.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.header, self.entries = self._read_index()
+        except Exception:
+            self.file.close()
+            raise
+
+    def _read_index(self) -> tuple[GMAHeader, List[GMAEntry]]:
+        f = self.file
+        if _read_exact(f, 4) != GMA_IDENT:
+            raise ValueError(f"Not a GMA file: {self.path}")
+        version = _read_exact(f, 1)[0]
+        steamid, timestamp = struct.unpack("<QQ", _read_exact(f, 16))
+
+        required_content = []
+        if version > 1:
+            while content := _read_cstring(f):
+                required_content.append(content)
+
+        name = _read_cstring(f)
+        description = _read_cstring(f)
+        author = _read_cstring(f)
+        addon_version = struct.unpack("<i", _read_exact(f, 4))[0]
+
+        files = []
+        while struct.unpack("<I", _read_exact(f, 4))[0] != 0:
+            file_name = _read_cstring(f)
+            size, crc = struct.unpack("<qI", _read_exact(f, 12))
+            files.append((file_name, size, crc))
+
+        entries = []
+        offset = f.tell()
+        for file_name, size, crc in files:
+            entries.append(GMAEntry(file_name, size, crc, offset))
+            offset += size
+
+        header = GMAHeader(name, description, author, steamid, timestamp, tuple(required_content), addon_version, version)
+        return header, entries
+
+    def iter_chunks(self, entry: GMAEntry, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream the data of an entry."""
+        self.file.seek(entry.offset)
+        remaining = entry.size
+        while remaining > 0:
+            chunk = self.file.read(min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError(f"Unexpected end of GMA file while reading {entry.name}")
+            remaining -= len(chunk)
+            yield chunk
+
+    def read(self, entry: GMAEntry) -> bytes:
+        return b"".join(self.iter_chunks(entry))
+
+    def extract(self, dest_folder: str, progress_callback=None) -> int:
+        """
+        Extract all entries to a folder, checking the CRC of every file.
+
+        Raises ValueError for entry names that would end up outside the folder and for
+        CRC mismatches, a corrupt archive must not be packed again with fresh CRCs.
+
+        Returns:
+            Number of files extracted
+        """
+        total = len(self.entries)
+        for idx, entry in enumerate(self.entries, 1):
+            dest_path = _entry_path(dest_folder, entry.name)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            crc = 0
+            with open(dest_path, "wb") as out:
+                for chunk in self.iter_chunks(entry):
+                    crc = zlib.crc32(chunk, crc)
+                    out.write(chunk)
+            if crc != entry.crc:
+                raise ValueError(f"CRC mismatch for {entry.name} in {os.path.basename(self.path)}, the archive is corrupt")
+            if progress_callback:
+                progress_callback(idx, total)
+        return total
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_gma(folder: str, out_path: str, header: Optional[GMAHeader] = None, order: Optional[List[str]] = None,
+              progress_callback=None) -> int:
+    """
+    Pack a folder into a .gma archive in one streaming pass.
+
+    The file table is written with placeholder CRCs, the file data is streamed in while
+    computing each file's CRC, and the table is patched afterwards. The trailing CRC of
+    the whole archive is combined from the CRC of the header and of the data section.
+
+    Args:
+        folder: Folder to pack
+        out_path: Path of the .gma to write
+        header: Addon info, defaults to an empty header
+        order: Optional list of relative paths that should come first (eg the original order)
+        progress_callback: Optional callback(current, total) for progress updates
+
+    Returns:
+        Size of the written .gma
+    """
+    if header is None:
+        header = GMAHeader()
+
+    files = {rel_path: stat.st_size for rel_path, stat in walk_files(folder)}
+    names = [name for name in (order or []) if name in files]
+    known = set(names)
+    names += sorted(name for name in files if name not in known)
+
+    head = bytearray()
+    head += GMA_IDENT
+    head += bytes([GMA_VERSION])
+    head += struct.pack("<QQ", header.steamid, header.timestamp or int(time.time()))
+    for content in header.required_content:
+        head += _cstring(content)
+    head += b"\0"
+    head += _cstring(header.name)
+    head += _cstring(header.description)
+    head += _cstring(header.author)
+    head += struct.pack("<i", header.addon_version)
+
+    crc_offsets = []
+    for number, name in enumerate(names, 1):
+        head += struct.pack("<I", number)
+        head += _cstring(name)
+        head += struct.pack("<q", files[name])
+        crc_offsets.append(len(head))
+        head += struct.pack("<I", 0)
+    head += struct.pack("<I", 0)
+
+    total = len(names)
+    data_crc = 0
+    data_size = 0
+    with open(out_path, "wb") as out:
+        out.write(head)
+        for idx, name in enumerate(names):
+            crc = 0
+            written = 0
+            with open(os.path.join(folder, *name.split("/")), "rb") as f:
+                while written < files[name] and (chunk := f.read(min(CHUNK_SIZE, files[name] - written))):
+                    crc = zlib.crc32(chunk, crc)
+                    data_crc = zlib.crc32(chunk, data_crc)
+                    out.write(chunk)
+                    written += len(chunk)
+            if written != files[name]:
+                raise ValueError(f"{name} changed size while packing")
+            data_size += written
+            struct.pack_into("<I", head, crc_offsets[idx], crc)
+            if progress_callback:
+                progress_callback(idx + 1, total)
+
+        for offset in crc_offsets:
+            out.seek(offset)
+            out.write(head[offset:offset + 4])
+
+        out.seek(0, os.SEEK_END)
+        addon_crc = crc32_combine(zlib.crc32(head), data_crc, data_size)
+        out.write(struct.pack("<I", addon_crc))
+        return out.tell()
+
+
+def _snapshot(folder: str) -> dict:
+    return {rel_path: (stat.st_size, stat.st_mtime_ns) for rel_path, stat in walk_files(folder)}
+
+
+@contextmanager
+def gma_workspace(gma_path: str, folder: Optional[str] = None):
+    """
+    Extract a .gma to a temporary folder, yield the folder and pack it back afterwards.
+
+    The archive is only rewritten if a file was changed, added or removed, and it is
+    replaced atomically so a failure never leaves a half-written .gma behind. If the
+    body raises the original archive is left untouched.
+
+    Args:
+        gma_path: Path to the .gma to work on
+        folder: Folder to extract to, a temporary folder is created if not given. It must not
+            exist yet or be empty. Only a folder created here is removed afterwards.
+    """
+    created = folder is None or not os.path.exists(folder)
+    if folder is None:
+        folder = tempfile.mkdtemp(prefix="gma_")
+    elif not created and (not os.path.isdir(folder) or os.listdir(folder)):
+        raise ValueError(f"Can't extract {os.path.basename(gma_path)} to {folder}, it isn't an empty folder")
+    os.makedirs(folder, exist_ok=True)
+    try:
+        with GMAReader(gma_path) as reader:
+            print(f"Extracting {len(reader.entries)} files from {os.path.basename(gma_path)}...")
+            reader.extract(folder)
+            header = reader.header
+            order = [entry.name for entry in reader.entries]
+        before = _snapshot(folder)
+
+        yield folder
+
+        if _snapshot(folder) == before:
+            print(f"No files changed, {os.path.basename(gma_path)} was left as is.")
+            return
+
+        print(f"Packing {os.path.basename(gma_path)}...")
+        tmp_path = gma_path + ".tmp"
+        try:
+            size = write_gma(folder, tmp_path, header._replace(timestamp=0), order)
+            os.replace(tmp_path, gma_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        print(f"Wrote {os.path.basename(gma_path)} ({round(size / 1000000, 2)} MB)")
+    finally:
+        if created:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_on_gma(gma_path: str, folder: Optional[str], fn, *args, **kwargs):
+    """Run an operation on the extracted contents of a .gma, packing the result back in place."""
+    with gma_workspace(gma_path, folder):
+        return fn(*args, **kwargs)
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from utils.cache import get_cache_dir
+from utils.cancel import check, is_cancelled
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def crc32_file(path: str) -> int:
+    """Streaming CRC32 of a file, matches the checksums stored in VPK and GMA entries."""
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def hash_file(path: str) -> str:
+    """Streaming content hash of a file (BLAKE2b, 128 bit hex digest)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    Persistent cache of file content hashes, keyed by absolute path, size and mtime.
+
+    Only use it from the thread that created it, hash in worker threads and store
+    the results from the owning thread (see hash_files).
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        if db_path is None:
+            db_path = os.path.join(get_cache_dir(), "hashes.sqlite")
+        self.db = sqlite3.connect(db_path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+        )
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[str]:
+        row = self.db.execute(
+            "SELECT digest FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (os.path.abspath(path), stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, path: str, stat: os.stat_result, digest: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+            (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest),
+        )
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def hash_files(paths: Iterable[str], cache: Optional[HashCache] = None, max_workers: Optional[int] = None,
+               progress_callback=None, cancel_token=None) -> Dict[str, str]:
+    """
+    Hash many files in parallel, only hashing files that aren't in the cache yet.
+
+    Args:
+        paths: Files to hash
+        cache: Optional HashCache to read from and store new hashes in
+        max_workers: Number of hashing threads, defaults to the executor default
+        progress_callback: Optional callback(current, total) for progress updates
+        cancel_token: Optional CancelToken. Hashes finished so far are still cached, then Cancelled is raised.
+
+    Returns:
+        Dict of path -> hex digest, files that couldn't be read are left out
+    """
+    paths = list(paths)
+    total = len(paths)
+    digests = {}
+    to_hash = []
+
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        digest = cache.get(path, stat) if cache else None
+        if digest is not None:
+            digests[path] = digest
+        else:
+            to_hash.append((path, stat))
+
+    done = len(digests)
+    if progress_callback and total:
+        progress_callback(done, total)
+
+    def hash_one(item):
+        if is_cancelled(cancel_token):
+            return None
+        try:
+            return hash_file(item[0])
+        except OSError as e:
+            print(f"Failed to read {item[0]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (path, stat), digest in zip(to_hash, executor.map(hash_one, to_hash)):
+            done += 1
+            if progress_callback:
+                progress_callback(done, total)
+            if digest is None:
+                continue
+            digests[path] = digest
+            if cache:
+                cache.put(path, stat, digest)
+
+    if cache:
+        cache.commit()
+    check(cancel_token)
+    return digests
+
+
+def _gf2_matrix_times(matrix, vector: int) -> int:
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def _gf2_matrix_square(matrix):
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """
+    CRC32 of two concatenated blocks, given the CRC32 of each and the length of the second.
+    Port of zlib's crc32_combine, which the zlib module doesn't expose.
+    """
+    if len2 <= 0:
+        return crc1
+
+    # Operator for one zero bit
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    # Operators for two and four zero bits
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+
+    # Apply len2 zero bytes to crc1
+    while True:
+        even = _gf2_matrix_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+
+        odd = _gf2_matrix_square(even)
+        if len2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+
+    return crc1 ^ crc2
@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+from typing import Optional, TextIO
+
+# Chunks (print fragments) kept until the UI drains them, older ones are dropped
+DEFAULT_MAX_CHUNKS = 20_000
+
+
+class LogBuffer:
+    """
+    Thread-safe ring buffer between a worker writing log output and a UI draining it.
+
+    Writing is just an append under a lock, so the speed of an operation doesn't depend on
+    how fast the UI repaints. When the UI falls behind the oldest chunks are dropped and
+    counted instead of growing without limit. The complete log can be spilled to a file.
+    """
+
+    def __init__(self, max_chunks: int = DEFAULT_MAX_CHUNKS):
+        self._chunks = deque(maxlen=max_chunks)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._spill: Optional[TextIO] = None
+
+    def write(self, text: str):
+        if not text:
+            return
+        with self._lock:
+            if len(self._chunks) == self._chunks.maxlen:
+                self._dropped += 1
+            self._chunks.append(text)
+            if self._spill is not None:
+                self._spill.write(text)
+
+    def flush(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.flush()
+
+    def drain(self) -> str:
+        """Everything written since the last drain as one string."""
+        with self._lock:
+            if not self._chunks:
+                return ""
+            text = "".join(self._chunks)
+            self._chunks.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            text = f"[... {dropped} log messages skipped, the full log is only kept in the log file ...]\n" + text
+        return text
+
+    def spill_to(self, path: Optional[str]):
+        """Also write everything to a file from now on, None stops writing to the file."""
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            if path:
+                self._spill = open(path, "a", encoding="utf-8")
+
+    @property
+    def spill_path(self) -> Optional[str]:
+        return self._spill.name if self._spill is not None else None
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Optional
+
+from utils.cache import cache_key, get_cache_dir
+
+# Records are committed in batches, an interrupted run loses at most this many
+COMMIT_EVERY = 20
+
+_enabled = True
+
+
+def set_enabled(enabled: bool):
+    """Turn skipping files processed by earlier runs on or off, eg to force a full rerun."""
+    global _enabled
+    _enabled = enabled
+
+
+def manifest_path(folder: str) -> str:
+    return os.path.join(get_cache_dir("manifests"), cache_key(os.path.abspath(folder)) + ".sqlite")
+
+
+def _is_temporary(folder: str) -> bool:
+    # .gma and pakfile workspaces are extracted again every run, a manifest for them would only pile up
+    temp = os.path.abspath(tempfile.gettempdir())
+    return os.path.abspath(folder).startswith(temp + os.sep)
+
+
+class Manifest:
+    """
+    Per-folder record of which files an operation already processed, with which parameters.
+
+    A file counts as processed while its size and mtime still match what they were right after
+    the operation ran on it, so reruns skip those files without decoding them again and an
+    interrupted run resumes where it stopped. Files the operation looked at but didn't need to
+    change are recorded as well. Disabled (nothing is skipped or stored) for temporary folders
+    and when turned off with set_enabled(False).
+
+    Only use it from the thread that created it.
+    """
+
+    def __init__(self, folder: str, operation: str, params: Optional[dict] = None, db_path: Optional[str] = None):
+        self.root = os.path.abspath(folder)
+        self.operation = operation
+        self.params = json.dumps(params or {}, sort_keys=True)
+        self.skipped = 0
+        self._pending = 0
+        self.db = None
+        if not _enabled or (db_path is None and _is_temporary(folder)):
+            return
+        if db_path is None:
+            db_path = manifest_path(folder)
+        # Pipeline lanes open their own manifest on the same folder at the same time
+        self.db = sqlite3.connect(db_path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS processed (path TEXT, operation TEXT, params TEXT, size INTEGER, "
+            "mtime_ns INTEGER, size_before INTEGER, time REAL, PRIMARY KEY (path, operation, params))"
+        )
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root).replace("\\", "/")
+
+    def is_processed(self, path: str) -> bool:
+        """Whether the file is unchanged since the operation processed it with the same parameters."""
+        if self.db is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        row = self.db.execute(
+            "SELECT 1 FROM processed WHERE path = ? AND operation = ? AND params = ? AND size = ? AND mtime_ns = ?",
+            (self._key(path), self.operation, self.params, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row:
+            self.skipped += 1
+        return row is not None
+
+    def record(self, path: str, size_before: int = 0):
+        """Remember that the operation processed the file, call it after the file was written."""
+        if self.db is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        self.db.execute(
+            "INSERT OR REPLACE INTO processed (path, operation, params, size, mtime_ns, size_before, time) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self._key(path), self.operation, self.params, stat.st_size, stat.st_mtime_ns, size_before, time.time()),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def report(self):
+        if self.skipped:
+            print(f"Skipped {self.skipped} files already processed with the same settings (use --force or untick "
+                  f"\"Skip files optimized before\" to redo them).")
+
+    def commit(self):
+        if self.db is not None:
+            self.db.commit()
+            self._pending = 0
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
@@ -0,0 +1,177 @@
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from srctools.keyvalues import Keyvalues
+
+from utils import tracing
+from utils.addons import list_addons, walk_files
+from utils.vpk import VPKIndex, find_vpks, load_vpk_index, path_hash
+
+VPK = "vpk"
+FOLDER = "folder"
+
+
+def index_folder(folder: str) -> VPKIndex:
+    """Index all files in a loose content folder (eg a legacy addon)."""
+    hashes, sizes = array("Q"), array("Q")
+    paths = {}
+    with tracing.span("fs.walk", folder=folder):
+        for rel_path, stat in walk_files(folder):
+            value = path_hash(rel_path)
+            hashes.append(value)
+            sizes.append(stat.st_size)
+            paths.setdefault(value, rel_path)
+    count = len(hashes)
+    return VPKIndex.from_entries(hashes, array("I", bytes(4 * count)), sizes,
+                                 array("H", [1]) * count, [os.path.abspath(folder)], paths)
+
+
+def read_mount_cfg(gamefolder: str) -> List[str]:
+    """Get the game folders mounted through garrysmod/cfg/mount.cfg."""
+    cfg_path = os.path.join(gamefolder, "garrysmod", "cfg", "mount.cfg")
+    if not os.path.exists(cfg_path):
+        return []
+
+    with open(cfg_path, "r", encoding="utf-8", errors="replace") as f:
+        kv = Keyvalues.parse(f, cfg_path)
+
+    folders = []
+    for mount in kv.find_children("mountcfg"):
+        if mount.has_children() or not mount.value:
+            continue
+        if os.path.isdir(mount.value):
+            folders.append(mount.value)
+        else:
+            print(f"Mounted folder for {mount.real_name} doesn't exist: {mount.value}")
+    return folders
+
+
+class MountSet:
+    """
+    Ordered list of content roots (VPK files and loose folders) that make up the mounted game content.
+
+    Earlier roots take priority when several of them provide the same path. The merged
+    index is built once and reused, so a mount set can be shared between operations.
+    """
+
+    def __init__(self):
+        self.roots: List[tuple[str, str]] = []
+        self._index: Optional[VPKIndex] = None
+        # Index of every root that could be read, in priority order
+        self._root_indexes: List[tuple[tuple[str, str], VPKIndex]] = []
+
+    @classmethod
+    def from_gamefolder(cls, gamefolder: str, mount_cfg: bool = True, legacy_addons: bool = False,
+                        exclude: Optional[str] = None) -> "MountSet":
+        """
+        Mount set for a Garry's Mod install.
+
+        Args:
+            gamefolder: Path to the game folder (the one containing gmod.exe)
+            mount_cfg: Also add the VPKs of games mounted through garrysmod/cfg/mount.cfg
+            legacy_addons: Also add the loose folders in garrysmod/addons
+            exclude: Folder to leave out of the legacy addons, eg the addon being cleaned
+        """
+        mounts = cls()
+        mounts.add_game(gamefolder)
+        if mount_cfg:
+            for folder in read_mount_cfg(gamefolder):
+                mounts.add_game(folder)
+        if legacy_addons:
+            mounts.add_addons(os.path.join(gamefolder, "garrysmod", "addons"), exclude=exclude)
+        return mounts
+
+    def add_vpk(self, path: str):
+        self.roots.append((VPK, path))
+        self._index = None
+
+    def add_folder(self, path: str):
+        self.roots.append((FOLDER, path))
+        self._index = None
+
+    def add_game(self, gamefolder: str):
+        """Add every VPK found in a game folder."""
+        for vpk_path in find_vpks(gamefolder):
+            self.add_vpk(vpk_path)
+
+    def add_addons(self, addons_folder: str, exclude: Optional[str] = None):
+        """Add every legacy (loose folder) addon in an addons folder, in mount order."""
+        excluded = os.path.normcase(os.path.abspath(exclude)) if exclude else None
+        for path in list_addons(addons_folder):
+            if excluded and os.path.normcase(os.path.abspath(path)) == excluded:
+                continue
+            self.add_folder(path)
+
+    def _index_root(self, root: tuple[str, str]) -> tuple[Optional[VPKIndex], bool]:
+        kind, path = root
+        if kind == VPK:
+            return load_vpk_index(path)
+        return index_folder(path), False
+
+    def build(self, max_workers: Optional[int] = None) -> VPKIndex:
+        """Index all roots in parallel and merge them into one lookup structure."""
+        if self._index is not None:
+            return self._index
+
+        print("Indexing mounted game content...")
+
+        if not self.roots:
+            print("No mounted content roots.")
+            self._index = VPKIndex()
+            self._root_indexes = []
+            return self._index
+
+        print(f"Found {len(self.roots)} content root(s) to process:")
+
+        def index_root(root):
+            try:
+                return self._index_root(root)
+            except Exception as e:
+                print(f"  Error processing {os.path.basename(root[1])}: {e}")
+                return None, False
+
+        indexes = []
+        root_indexes = []
+        cached_count = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for (kind, path), (index, cached) in zip(self.roots, executor.map(index_root, self.roots)):
+                if index is None:
+                    print(f"  Error processing {os.path.basename(path)}: couldn't open {kind}")
+                    continue
+                indexes.append(index)
+                root_indexes.append(((kind, path), index))
+                if cached:
+                    cached_count += 1
+                else:
+                    print(f"  Found {len(index)} files in {os.path.basename(path)}")
+
+        self._index = VPKIndex.merge(indexes)
+        self._root_indexes = root_indexes
+
+        print("="*60)
+        print(f"Processed {len(indexes)} content root(s) successfully ({cached_count} from cache).")
+        print(f"Total files found: {len(self._index)}")
+        print("="*60)
+
+        return self._index
+
+    def locate(self, path: str) -> Optional[tuple[str, str]]:
+        """Get the (kind, path) of the root that provides a file, None if no root has it."""
+        value = path_hash(path)
+        for root, index in self.build_roots():
+            if index.contains_hash(value):
+                return root
+        return None
+
+    def build_roots(self) -> List[tuple[tuple[str, str], VPKIndex]]:
+        """The index of every readable root in priority order, building them if needed."""
+        self.build()
+        return self._root_indexes
+
+
+def get_mounted_files(mounts) -> VPKIndex:
+    """Get the merged index for a MountSet, or for a game folder path."""
+    if not isinstance(mounts, MountSet):
+        mounts = MountSet.from_gamefolder(mounts)
+    return mounts.build()
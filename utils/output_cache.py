@@ -0,0 +1,173 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Union
+
+from utils import tracing
+from utils.cache import cache_key, get_cache_dir, write_atomic
+from utils.hashing import hash_file
+
+# Bump when an operation's output changes for the same input, so old outputs aren't used any more
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+# Returned by get() when the operation left the input as it was
+UNCHANGED = object()
+
+_max_size = DEFAULT_MAX_SIZE
+
+
+def set_max_size(max_size: int):
+    """Size cap of the cache in bytes, 0 turns the cache off."""
+    global _max_size
+    _max_size = max_size
+
+
+class OutputCache:
+    """
+    Content-addressed cache of operation outputs, shared between addons and runs.
+
+    Entries are keyed by the content hash of the input file plus the operation and its
+    parameters and hold the bytes the operation produced, or a marker that it left the file
+    as it was. The same texture or sound found in another addon is then written straight from
+    the cache without decoding or encoding it. The least recently used entries are evicted
+    once the cache grows past its size cap.
+
+    Only use it from the thread that created it.
+    """
+
+    def __init__(self, operation: str, params: Optional[dict] = None, max_size: Optional[int] = None,
+                 folder: Optional[str] = None):
+        self.max_size = _max_size if max_size is None else max_size
+        self.hits = 0
+        self.db = None
+        # Running total of the stored outputs, summed from the database on the first put
+        self._total = None
+        if self.max_size <= 0:
+            return
+        self.folder = folder or get_cache_dir("outputs")
+        self.prefix = json.dumps([CACHE_VERSION, operation, params or {}], sort_keys=True)
+        # Pipeline lanes and map workers open their own cache at the same time
+        self.db = sqlite3.connect(os.path.join(self.folder, "outputs.sqlite"), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY, size INTEGER, unchanged INTEGER, last_used REAL)"
+        )
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key)
+
+    def key(self, path: str) -> Optional[str]:
+        """Cache key of an input file, None if the cache is off or the file can't be read."""
+        if self.db is None:
+            return None
+        try:
+            with tracing.span("cache.hash"):
+                return cache_key(self.prefix, hash_file(path))
+        except OSError:
+            return None
+
+    def get(self, key: Optional[str]) -> Union[bytes, object, None]:
+        """The cached output bytes, UNCHANGED, or None on a miss."""
+        if self.db is None or key is None:
+            return None
+        row = self.db.execute("SELECT unchanged FROM outputs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[0]:
+            result = UNCHANGED
+        else:
+            try:
+                with open(self._blob_path(key), "rb") as f:
+                    result = f.read()
+            except OSError:
+                # Blob removed behind our back, treat it as a miss and let put() store it again
+                self.db.execute("DELETE FROM outputs WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+        self.db.execute("UPDATE outputs SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        self.hits += 1
+        return result
+
+    def put(self, key: Optional[str], output_path: Optional[str]):
+        """Store the output file for a key, output_path None means the input was left unchanged."""
+        if self.db is None or key is None:
+            return
+        size = 0
+        if output_path is not None:
+            try:
+                with open(output_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return
+            size = len(data)
+            if size > self.max_size:
+                return
+            os.makedirs(os.path.dirname(self._blob_path(key)), exist_ok=True)
+            write_atomic(self._blob_path(key), data)
+        self.db.execute(
+            "INSERT OR REPLACE INTO outputs (key, size, unchanged, last_used) VALUES (?, ?, ?, ?)",
+            (key, size, int(output_path is None), time.time()),
+        )
+        self.db.commit()
+        if size:
+            if self._total is None:
+                self._total = self._stored_size()
+            else:
+                self._total += size
+            if self._total > self.max_size:
+                self._evict()
+
+    def _stored_size(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM outputs").fetchone()[0]
+
+    def _evict(self):
+        # Other lanes and processes store outputs too, so sum again before evicting
+        total = self._stored_size()
+        self._total = total
+        if total <= self.max_size:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM outputs WHERE size > 0 ORDER BY last_used").fetchall():
+            try:
+                os.remove(self._blob_path(key))
+            except OSError:
+                pass
+            self.db.execute("DELETE FROM outputs WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_size:
+                break
+        self.db.commit()
+        self._total = total
+
+    def process(self, path: str, fn) -> bool:
+        """
+        Run an in-place operation on a file unless its output is cached, then write the cached
+        output instead. fn() processes the file and returns whether it changed it.
+        """
+        key = self.key(path)
+        cached = self.get(key)
+        if cached is UNCHANGED:
+            return False
+        if cached is not None:
+            write_atomic(path, cached)
+            return True
+        changed = fn()
+        self.put(key, path if changed else None)
+        return changed
+
+    def report(self):
+        if self.hits:
+            print(f"Reused {self.hits} cached results instead of processing the files again.")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import List, NamedTuple, Optional
+
+from utils.formatting import format_size
+
+# Categories in the trace
+STAGE = "stage"
+SPAN = "span"
+
+_NULL_SPAN = nullcontext()
+_tracer: Optional["Tracer"] = None
+
+
+class Span(NamedTuple):
+    name: str
+    category: str
+    start: int  # perf_counter_ns
+    duration: int  # ns
+    thread: int
+    args: dict
+    peak_memory: Optional[int] = None
+
+
+class SpanStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.peak_memory: Optional[int] = None
+
+    def add(self, span: Span):
+        self.count += 1
+        self.total += span.duration
+        self.max = max(self.max, span.duration)
+        if span.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, span.peak_memory)
+
+
+class Tracer:
+    """
+    Records timed spans around the hot paths of operations while it's active.
+
+    Stages (a task, a pipeline stage or a CLI command) can also record their tracemalloc peak
+    when memory tracking is on. tracemalloc is process-wide, so stages running in parallel
+    see each other's allocations, and it slows Python allocations down noticeably.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.spans: List[Span] = []
+        self.start = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        # Peaks of the open memory spans, tracemalloc only keeps a single peak
+        self._memory_peaks: List[list] = []
+
+    def _fold_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_peak in self._memory_peaks:
+            open_peak[0] = max(open_peak[0], peak)
+
+    @contextmanager
+    def span(self, name: str, category: str = SPAN, args: Optional[dict] = None, memory: bool = False):
+        memory = memory and self.memory and tracemalloc.is_tracing()
+        peak = None
+        if memory:
+            with self._lock:
+                self._fold_peak()
+                tracemalloc.reset_peak()
+                peak = [tracemalloc.get_traced_memory()[0]]
+                self._memory_peaks.append(peak)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            with self._lock:
+                if memory:
+                    self._fold_peak()
+                    self._memory_peaks.remove(peak)
+                self.spans.append(Span(name, category, start, duration, threading.get_ident(), args or {},
+                                       peak[0] if memory else None))
+
+    def stats(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        stats = {}
+        for span in spans:
+            stats.setdefault((span.category, span.name), SpanStats()).add(span)
+        return stats
+
+    def summary(self) -> str:
+        """Table of the time spent per span name, stages first."""
+        stats = self.stats()
+        if not stats:
+            return "No spans were recorded."
+        wall = max(time.perf_counter_ns() - self.start, 1)
+        lines = [f"{'Span':<36} {'Count':>7} {'Total':>9} {'Mean':>9} {'Max':>9} {'Wall':>6}  Peak memory"]
+        for (category, name), span_stats in sorted(stats.items(), key=lambda item: (item[0][0] != STAGE, -item[1].total)):
+            label = f"[{name}]" if category == STAGE else name
+            lines.append(f"{label[:36]:<36} {span_stats.count:>7} {span_stats.total / 1e9:>8.2f}s "
+                         f"{span_stats.total / span_stats.count / 1e6:>7.1f}ms {span_stats.max / 1e6:>7.1f}ms "
+                         f"{span_stats.total / wall * 100:>5.1f}%  "
+                         f"{format_size(span_stats.peak_memory) if span_stats.peak_memory is not None else ''}")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path: str):
+        """Write the spans in the Chrome trace event format (chrome://tracing, Perfetto, speedscope)."""
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        trace_events = []
+        for span in spans:
+            args = dict(span.args)
+            if span.peak_memory is not None:
+                args["peak_memory"] = span.peak_memory
+            trace_events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start - self.start) / 1000,
+                "dur": span.duration / 1000,
+                "pid": pid,
+                "tid": span.thread,
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def tracing(tracer: Tracer):
+    """Record spans into tracer while the block runs."""
+    global _tracer
+    started_tracemalloc = tracer.memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    previous, _tracer = _tracer, tracer
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **args):
+    """Time a block if tracing is on, costs next to nothing otherwise."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, SPAN, args)
+
+
+def stage(name: str, **args):
+    """Time a whole operation or pipeline stage, including its memory peak if that's tracked."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, STAGE, args, memory=True)
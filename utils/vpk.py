@@ -1,68 +1,297 @@
 import glob
-from typing import List, Set
+import hashlib
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional
 import sourcepp
 import os
 
-def get_vpk_files(gamefolder: str) -> Set[str]:
+from utils import tracing
+from utils.cache import cache_key, get_cache_dir, write_atomic
+
+# Cached VPK listings are stored as a small header followed by the sorted path hashes
+# and the CRC32 and size of every entry, in the same order
+INDEX_MAGIC = b"GMVI"
+INDEX_VERSION = 2
+INDEX_HEADER = struct.Struct("<4sIqqI")  # magic, version, vpk size, vpk mtime_ns, entry count
+
+# Numbered data archives (pak01_000.vpk) belong to a pak01_dir.vpk and hold no listing of their own
+_ARCHIVE_PATTERN = re.compile(r"_\d{3}\.vpk$", re.IGNORECASE)
+
+
+def normalize_path(path: str) -> str:
+    """Normalize a content path for case-insensitive lookups (lowercase, forward slashes)."""
+    path = path.replace("\\", "/").lower()
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+
+def path_hash(path: str) -> int:
+    """64 bit hash of a normalized content path."""
+    digest = hashlib.blake2b(normalize_path(path).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class VPKIndex:
     """
-    Get all file paths from VPK files in the game folder.
-    
-    Args:
-        gamefolder: Path to the game folder containing VPK files
-        
+    Compact set of file paths, stored as a sorted array of 64 bit path hashes.
+
+    Membership tests are case-insensitive and don't care about path separators,
+    so both "materials/foo.vmt" and "Materials\\Foo.vmt" are found. The CRC32
+    and size the VPK directory stores for each entry are kept alongside the hashes.
+
+    Entries can also come from loose folders (see utils.mounts), those have no stored
+    CRC32 and remember which folder they were found in instead, and the path they have
+    on disk, which can differ in case from the one looked up.
+    """
+
+    def __init__(self, hashes: Optional[array] = None, crcs: Optional[array] = None, sizes: Optional[array] = None,
+                 sources: Optional[array] = None, loose_roots: Optional[List[str]] = None,
+                 loose_paths: Optional[Dict[int, str]] = None):
+        self.hashes = hashes if hashes is not None else array("Q")
+        self.crcs = crcs if crcs is not None else array("I", bytes(4 * len(self.hashes)))
+        self.sizes = sizes if sizes is not None else array("Q", bytes(8 * len(self.hashes)))
+        # 0 for VPK entries, otherwise 1 + the position of the entry's folder in loose_roots
+        self.sources = sources if sources is not None else array("H", bytes(2 * len(self.hashes)))
+        self.loose_roots = loose_roots if loose_roots is not None else []
+        # Path hash -> relative path as found on disk, for loose folder entries
+        self.loose_paths = loose_paths if loose_paths is not None else {}
+
+    @classmethod
+    def from_entries(cls, hashes: array, crcs: array, sizes: array,
+                     sources: Optional[array] = None, loose_roots: Optional[List[str]] = None,
+                     loose_paths: Optional[Dict[int, str]] = None) -> "VPKIndex":
+        """Build an index from unsorted entries, the first entry wins for duplicate paths."""
+        if sources is None:
+            sources = array("H", bytes(2 * len(hashes)))
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        index = cls(loose_roots=loose_roots, loose_paths=loose_paths)
+        last = None
+        for i in order:
+            value = hashes[i]
+            if value == last:
+                continue
+            last = value
+            index.hashes.append(value)
+            index.crcs.append(crcs[i])
+            index.sizes.append(sizes[i])
+            index.sources.append(sources[i])
+        return index
+
+    @classmethod
+    def merge(cls, indexes: Iterable["VPKIndex"]) -> "VPKIndex":
+        """Merge indexes, earlier indexes take priority for paths found in several of them."""
+        indexes = [index for index in indexes if index]
+        if len(indexes) == 1:
+            return indexes[0]
+        hashes, crcs, sizes, sources = array("Q"), array("I"), array("Q"), array("H")
+        loose_roots = []
+        loose_paths = {}
+        for index in indexes:
+            offset = len(loose_roots)
+            loose_roots.extend(index.loose_roots)
+            for value, path in index.loose_paths.items():
+                loose_paths.setdefault(value, path)
+            hashes.extend(index.hashes)
+            crcs.extend(index.crcs)
+            sizes.extend(index.sizes)
+            sources.extend(source + offset if source else 0 for source in index.sources)
+        return cls.from_entries(hashes, crcs, sizes, sources, loose_roots, loose_paths)
+
+    def __contains__(self, path: str) -> bool:
+        return self.contains_hash(path_hash(path))
+
+    def _find(self, value: int) -> int:
+        pos = bisect_left(self.hashes, value)
+        if pos < len(self.hashes) and self.hashes[pos] == value:
+            return pos
+        return -1
+
+    def contains_hash(self, value: int) -> bool:
+        return self._find(value) >= 0
+
+    def lookup(self, path: str) -> Optional[tuple[Optional[int], int, Optional[str]]]:
+        """
+        Get the (crc32, size, loose folder) of a path, None if it isn't in the index.
+
+        For entries from loose folders the CRC32 is None and the folder containing the
+        file is returned instead, for VPK entries the folder is None.
+        """
+        pos = self._find(path_hash(path))
+        if pos < 0:
+            return None
+        source = self.sources[pos]
+        if source:
+            return None, self.sizes[pos], self.loose_roots[source - 1]
+        return self.crcs[pos], self.sizes[pos], None
+
+    def loose_path(self, path: str) -> Optional[str]:
+        """
+        Get the relative path a loose folder entry has on disk, None for VPK entries and missing paths.
+
+        Join it with the folder from lookup() to open the file, the path that was looked up may
+        differ in case, which matters on case-sensitive filesystems.
+        """
+        pos = self._find(path_hash(path))
+        if pos < 0 or not self.sources[pos]:
+            return None
+        return self.loose_paths.get(self.hashes[pos])
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __bool__(self) -> bool:
+        return len(self.hashes) > 0
+
+
+def _index_cache_path(vpk_path: str) -> str:
+    return os.path.join(get_cache_dir("vpk"), cache_key(os.path.abspath(vpk_path)) + ".idx")
+
+
+def _read_cached_index(vpk_path: str, stat: os.stat_result) -> Optional[VPKIndex]:
+    try:
+        with open(_index_cache_path(vpk_path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < INDEX_HEADER.size:
+        return None
+    magic, version, size, mtime_ns, count = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        return None
+    if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+        return None
+
+    arrays = [array("Q"), array("I"), array("Q")]
+    offset = INDEX_HEADER.size
+    for values in arrays:
+        end = offset + count * values.itemsize
+        values.frombytes(data[offset:end])
+        if len(values) != count:
+            return None
+        offset = end
+    return VPKIndex(*arrays)
+
+
+def _write_cached_index(vpk_path: str, stat: os.stat_result, index: VPKIndex):
+    header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, len(index))
+    try:
+        write_atomic(_index_cache_path(vpk_path), b"".join((header, index.hashes.tobytes(), index.crcs.tobytes(), index.sizes.tobytes())))
+    except OSError as e:
+        print(f"  Couldn't write VPK cache for {os.path.basename(vpk_path)}: {e}")
+
+
+def parse_vpk(vpk_path: str) -> Optional[VPKIndex]:
+    """Read the directory of a single VPK into an index, None if it can't be opened."""
+    hashes, crcs, sizes = array("Q"), array("I"), array("Q")
+
+    def collect_files(path: str, entry) -> None:
+        hashes.append(path_hash(path))
+        crcs.append(entry.crc32)
+        sizes.append(entry.length)
+
+    with tracing.span("vpk.list", vpk=os.path.basename(vpk_path)):
+        vpk = sourcepp.vpkpp.VPK.open(vpk_path, collect_files)
+    if vpk is None:
+        return None
+    return VPKIndex.from_entries(hashes, crcs, sizes)
+
+
+def load_vpk_index(vpk_path: str) -> tuple[Optional[VPKIndex], bool]:
+    """
+    Get the index of a single VPK, re-parsing it only if it changed since it was cached.
+
     Returns:
-        Set of file paths found in all VPK files
+        (index or None if the VPK couldn't be read, whether the cached listing was used)
     """
-    print("Getting files from VPK archives...")
-    
-    vpk_files = set()
-    vpk_count = 0
-    
-    # Find all VPK files in the game folder
+    stat = os.stat(vpk_path)
+    index = _read_cached_index(vpk_path, stat)
+    if index is not None:
+        return index, True
+
+    index = parse_vpk(vpk_path)
+    if index is not None:
+        _write_cached_index(vpk_path, stat, index)
+    return index, False
+
+
+def find_vpks(gamefolder: str) -> List[str]:
+    """Find all VPK directory files in the game folder."""
     vpk_patterns = [
         os.path.join(gamefolder, "**", "*.vpk"),
         os.path.join(gamefolder, "*.vpk")
     ]
-    
+
     found_vpks = []
     for pattern in vpk_patterns:
         found_vpks.extend(glob.glob(pattern, recursive=True))
-    
-    # Remove duplicates and sort
-    found_vpks = sorted(list(set(found_vpks)))
-    
+
+    # Numbered archives are read through their _dir.vpk
+    found_vpks = set(found_vpks)
+    dir_vpks = {path for path in found_vpks if path.lower().endswith("_dir.vpk")}
+    found_vpks = {
+        path for path in found_vpks
+        if not _ARCHIVE_PATTERN.search(path) or _ARCHIVE_PATTERN.sub("_dir.vpk", path) not in dir_vpks
+    }
+
+    return sorted(found_vpks)
+
+
+def get_vpk_files(gamefolder: str) -> VPKIndex:
+    """
+    Get all file paths from VPK files in the game folder.
+
+    Listings are cached on disk per VPK (keyed by path, size and mtime), so only
+    VPKs that changed since the last run get parsed again.
+
+    Args:
+        gamefolder: Path to the game folder containing VPK files
+
+    Returns:
+        Index of file paths found in all VPK files, supports case-insensitive `path in index`
+    """
+    print("Getting files from VPK archives...")
+
+    found_vpks = find_vpks(gamefolder)
+
     if not found_vpks:
         print("No VPK files found in", gamefolder)
-        return vpk_files
-    
+        return VPKIndex()
+
     print(f"Found {len(found_vpks)} VPK file(s) to process:")
-    
+
+    indexes = []
+    vpk_count = 0
+    cached_count = 0
+
     # Process each VPK file
     for vpk_path in found_vpks:
         try:
-            # Counter for this VPK
-            file_count = 0
-            
-            # Callback function to collect file paths
-            def collect_files(path: str, entry) -> None:
-                nonlocal file_count
-                path = os.path.normpath(path)
-                vpk_files.add(path)
-                file_count += 1
-            
-            # Open the VPK and iterate through all files
-            vpk = sourcepp.vpkpp.VPK.open(vpk_path, collect_files)
-            
-            vpk_count += 1
-            print(f"  Found {file_count} files in {os.path.basename(vpk_path)}")
-            
+            index, cached = load_vpk_index(vpk_path)
         except Exception as e:
             print(f"  Error processing {os.path.basename(vpk_path)}: {e}")
             continue
-    
+
+        if index is None:
+            print(f"  Error processing {os.path.basename(vpk_path)}: couldn't open VPK")
+            continue
+
+        indexes.append(index)
+        vpk_count += 1
+        if cached:
+            cached_count += 1
+        else:
+            print(f"  Found {len(index)} files in {os.path.basename(vpk_path)}")
+
+    vpk_files = VPKIndex.merge(indexes)
+
     print("="*60)
-    print(f"Processed {vpk_count} VPK file(s) successfully.")
+    print(f"Processed {vpk_count} VPK file(s) successfully ({cached_count} from cache).")
     print(f"Total files found: {len(vpk_files)}")
     print("="*60)
-    
-    return vpk_files
\ No newline at end of file
+
+    return vpk_files